@@ -0,0 +1,58 @@
+#! /usr/bin/python
+#-*- coding: utf-8 -*-
+
+from __future__ import print_function
+import sys
+import argparse
+from pystrain.iotools.strainout import strain_npz2txt
+
+Version = 'StrainNpz2Txt.py Version: 1.0-r1'
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawTextHelpFormatter,
+    description='Convert a (binary) strain npz file, as written by \'StrainTensor.py --output-format=npz\', to the text strain output layout (aka \'strain_info.dat\').',
+    epilog=('''National Technical University of Athens,
+    Dionysos Satellite Observatory\n
+    Send bug reports to:
+    Xanthos Papanikolaou, xanthos@mail.ntua.gr
+    Dimitris Anastasiou,danast@mail.ntua.gr
+    September, 2018'''))
+
+parser.add_argument('-i', '--input-file',
+    default='strain_info.npz',
+    metavar='INPUT_FILE',
+    dest='npz_file',
+    required=False,
+    help='The strain npz file to convert.')
+
+parser.add_argument('-o', '--output-file',
+    default='strain_info.dat',
+    metavar='OUTPUT_FILE',
+    dest='txt_file',
+    required=False,
+    help='The text file to write.')
+
+parser.add_argument('--left-align-missing',
+    dest='left_align_missing',
+    help='Print missing standard deviations left-aligned, as StrainTensor.py does for \'--barycenter\' and \'--method=veis\' runs (grid estimates print them right-aligned).',
+    action='store_true')
+
+parser.add_argument('-v',
+    dest='version',
+    help='Display version and exit.',
+    action='store_true')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    if args.version:
+        print('{}'.format(Version))
+        sys.exit(0)
+
+    novar = '{:7s}'.format('-') if args.left_align_missing else '-'
+    try:
+        n = strain_npz2txt(args.npz_file, args.txt_file, novar)
+    except (IOError, RuntimeError) as e:
+        print('{}'.format(e), file=sys.stderr)
+        sys.exit(1)
+    print('[DEBUG] {} Strain Tensors written in file: {}'.format(n, args.txt_file))
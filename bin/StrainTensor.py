@@ -5,20 +5,32 @@ from __future__ import print_function
 import sys
 import os
 import time
+import shutil
+import tempfile
 from datetime import datetime
-from copy import deepcopy
-from math import degrees, radians, floor, ceil
+from math import degrees, radians, ceil
 import numpy
 from scipy.spatial import Delaunay
 import argparse
+from pystrain.station import StationArray, as_station_array, load_station_array
 from pystrain.strain import *
 from pystrain.geodesy.utm import *
 from pystrain.iotools.iparser import *
+from pystrain.iotools.strainout import StrainResultsWriter, STRAIN_NPZ_COLUMNS, STRAIN_NPZ_UNITS, \
+    read_veis_cache, write_veis_cache
+from pystrain.iotools.gmtgrid import GmtGridWriter
+from pystrain.iotools.stationcache import StationCache
+from pystrain.estimate import iter_grid, utm_zone_of, GRID_BATCH_NODES
 import pystrain.grid
 
 Version = 'StrainTensor.py Version: 1.0-r1'
 STRAIN_OUT_FILE = 'strain_info.dat'
+STRAIN_NPZ_FILE = 'strain_info.npz'
 STATISTICS_FILE = 'strain_stats.dat'
+##  GMT (native binary) grid files, one per quantity (see --gmt-grids)
+GMT_GRID_FILE = 'strain_{:}.grd'
+##  Max number of triangles in each chunk handed out to a worker process (veis)
+POOL_CHUNK_SIMPLICES = 4096
 
 def cut_rectangle(xmin, xmax, ymin, ymax, sta_lst, sta_list_to_degrees=False):
     """ Filter stations that are located within a rectange. The rectangle is
@@ -27,25 +39,29 @@ def cut_rectangle(xmin, xmax, ymin, ymax, sta_lst, sta_list_to_degrees=False):
         +-------+--ymin
         |       |
         xmin    xmax 
-        The function will return a new list, where for each of the stations,
-        the following is true:
+        The function will return a new StationArray, where for each of the
+        stations, the following is true:
             * xmin <= station.lon <= xmax and
             * ymin <= station.lat <= ymax
         If the argument 'sta_list_to_degrees' is set to True, then before
         comaring, each of the station's lon and lat are transformed to degrees
         (they are supposed to be in radians).
     """
-    new_sta_lst = []
-    for sta in sta_lst:
-        if sta_list_to_degrees:
-            slon = degrees(sta.lon)
-            slat = degrees(sta.lat)
-        else:
-            slon = sta.lon
-            slat = sta.lat
-        if slon >= xmin and slon <= xmax and slat >= ymin and slat <= ymax:
-            new_sta_lst.append(sta)
-    return new_sta_lst
+    sta_arr = as_station_array(sta_lst)
+    return sta_arr[in_rectangle(xmin, xmax, ymin, ymax, sta_arr, sta_list_to_degrees)]
+
+def in_rectangle(xmin, xmax, ymin, ymax, sta_lst, sta_list_to_degrees=False):
+    """ Boolean mask of the stations located within a rectangle; see
+        cut_rectangle.
+    """
+    sta_arr = as_station_array(sta_lst)
+    if sta_list_to_degrees:
+        slon = numpy.degrees(sta_arr.lon)
+        slat = numpy.degrees(sta_arr.lat)
+    else:
+        slon = sta_arr.lon
+        slat = sta_arr.lat
+    return (slon >= xmin) & (slon <= xmax) & (slat >= ymin) & (slat <= ymax)
 
 def write_station_info(sta_lst, filename='station_info.dat'):
     """ Write station information to an output file. sta_list if a list of
@@ -79,28 +95,64 @@ def print_model_info(fout, cmd, clargs):
         print('\t{:20s} -> {:}'.format(key, clargs[key]), file=fout)
     return
 
-def compute__(grd, sta_list_utm, utmzone, fout, fstats, vprint_fun, **dargs):
+def write_node__(result, x, y, fout, fstats):
+    """ Write the result of a grid node (a tuple with the fields of a
+        NODE_RESULT_DTYPE record) to the strain (fout, a StrainResultsWriter)
+        and statistics (fstats) outputs; either may be None. Nothing is written
+        if no tensor was estimated for the node; returns True if it was.
+    """
+    if result[0] != NODE_ESTIMATED: return False
+    if fout: fout.write(result)
+    if fstats:
+        print('{:+9.4f} {:+10.4f} {:6d} {:14.2f} {:10.2f} {:12.3f}'.format(x, y, int(result[1]), result[2], result[3], result[4]), file=fstats)
+    return True
+
+def write_delaunay__(fout, simplices, sta_list_ell):
+    """ Write Delaunay triangles to an (open) output stream; for each triangle,
+        a header line with the names of its stations is written, followed by
+        the ellipsoidal coordinates (lon, lat in degrees) of its vertices (the
+        first vertex is repeated to close the polygon). sta_list_ell is a
+        StationArray (coordinates in radians) and simplices a (K,3) array of
+        indexes into it.
+    """
+    names = sta_list_ell.name
+    lon, lat = numpy.degrees(sta_list_ell.lon), numpy.degrees(sta_list_ell.lat)
+    fmt = '> {:}, {:}, {:}\n{:+8.5f} {:8.5f}\n{:+8.5f} {:8.5f}\n{:+8.5f} {:8.5f}\n{:+8.5f} {:8.5f}\n'
+    for start in range(0, len(simplices), 4096):
+        block = simplices[start:start+4096]
+        rows = numpy.column_stack((lon[block], lat[block])).tolist()
+        fout.write(''.join(fmt.format(names[t[0]], names[t[1]], names[t[2]],
+            r[0], r[3], r[1], r[4], r[2], r[5], r[0], r[3]) for t, r in zip(block, rows)))
+
+def compute__(grd, sta_list_ell, utmzone, utm_crd, fout, fstats, grid_writers=None, **dargs):
     """ Function to perform the bulk of a Strain Tensor estimation.
-        For each of the grid cells, a ShenStrain object will be created, using
-        the list of stations and the **dargs options.
+        The Strain Tensors of all grid cells are estimated via
+        pystrain.estimate.iter_grid (using the list of stations and the
+        **dargs options; if dargs['workers'] is larger than one, a pool of
+        worker processes is used) and the results are written to the output
+        streams batch by batch, in grid (iteration) order, as they are
+        computed.
+        If grid_writers is given, it should be a dictionary with keys any of
+        the NODE_RESULT_DTYPE field names, and values GmtGridWriter instances
+        (for grd); each batch of results is written to them (the respective
+        field of each node's result, NaN where nothing was estimated), so
+        that no per-node array is kept.
 
         Args:
             grd (pystrain::Grid): The grid; one straintensor per cell is
                                   estimated (at the centre of the grid)
-            sta_list_utm (list of Station): The list of stations to be used for
-                                  strain tensor estimation
+            sta_list_ell (StationArray): The stations to be used for strain
+                                  tensor estimation (ellipsoidal coordinates)
             utmzone (float):      The UTM zone used to convert ellipsoidal to
                                   UTM coordinates.
-            fout (output stream): An (open) output stream where estimation results
-                                  (aka strain information) are to be written
+            utm_crd (tuple):      Northings and Eastings of the stations (or
+                                  None to compute them)
+            fout (StrainResultsWriter): Where estimation results (aka strain
+                                  information) are to be written
             fstats (output stream): An (open) output stream where estimation
                                   statistics are written
-            vprint_fun (function) : A function that handles printing. Based on
-                                  user options we may want or not to print
-                                  verbose information. This function does exactly
-                                  that. Normally, this function is just the
-                                  normal print function or a no-opt, see vprint(...)
-                                  defined in __main__
+            grid_writers (dictionary): GMT grids to write (per node) results
+                                  to, see above; may be None
             **dargs (dictionary)  : A list of parameters to use when constructing
                                   the individual Strain Tensors
 
@@ -111,36 +163,71 @@ def compute__(grd, sta_list_utm, utmzone, fout, fstats, vprint_fun, **dargs):
             not flushed before returning or something). Anyway, always close the 
             streams before exiting.
     """
-    node_nr, nodes_estim = 0, 0
-    for x, y in grd:
-        clat, clon =  radians(y), radians(x)
-        N, E, ZN, _ = ell2utm(clat, clon, Ellipsoid("wgs84"), utmzone)
-        assert ZN == utmzone
-        vprint_fun('[DEBUG] Grid point at {:+8.4f}, {:8.4f} or E={:}, N={:}'.format(
-            x, y, E, N))
-        if not dargs['multiproc_mode']:
-            print('[DEBUG] {:5d}/{:7d}'.format(node_nr+1, grd.xpts*grd.ypts), end="\r")
-        ## Construct the Strain instance, with all args (from input)
-        sstr = ShenStrain(E, N, sta_list_utm, **dargs)
-        ## check azimouth coverage (aka max β angle)
-        if degrees(max(sstr.beta_angles())) <= dargs['max_beta_angle']:
-            try:
-                sstr.estimate()
-                vprint_fun('[DEBUG] Computed tensor at {:+8.4f} {:+8.4f} for node {:3d}/{:3d}'.format(x, y, node_nr+1, grd.xpts*grd.ypts))
-                sstr.print_details_v2(fout, utmzone)
-                if fstats: print('{:+9.4f} {:+10.4f} {:6d} {:14.2f} {:10.2f} {:12.3f}'.format(x,y,len(sstr.__stalst__), sstr.__options__['d_coef'],sstr.__options__['cutoff_dis'], sstr.__sigma0__), file=fstats)
-                nodes_estim += 1
-            except RuntimeError:
-                vprint_fun('[DEBUG] Too few observations to estimate strain at {:+8.4f}, {:8.4f}. Point skipped.'.format(x,y))
-            except ArithmeticError:
-                vprint_fun('[DEBUG] Failed to compute parameter VcV matrix for strain at {:+8.4f}, {:8.4f}. Point skipped'.format(x,y))
-        else:
-            vprint_fun('[DEBUG] Skipping computation at {:+8.4f},{:8.4f} because of limited coverage (max_beta= {:6.2f}deg.)'.format(x, y, degrees(max(sstr.beta_angles()))))
-        node_nr += 1
-    print('[DEBUG] Estimated Strain Tensors for {} out of {} nodes'.format(nodes_estim, node_nr))
+    nodes_estim, start = 0, 0
+    for batch in iter_grid(sta_list_ell, grd, GRID_BATCH_NODES, utmzone, utm_crd,
+            progress=progress__, **dargs):
+        stop = start + len(batch)
+        estimated = batch['status'] == NODE_ESTIMATED
+        fout.write_array(batch)
+        for key, writer in (grid_writers or {}).items():
+            writer.write(start, numpy.where(estimated, batch[key], numpy.nan))
+        nodes_estim += int(estimated.sum())
+        ## write the statistics (records as tuples)
+        if fstats:
+            xs, ys = grd.centres(start, stop)
+            for x, y, result in zip(xs, ys, batch.tolist()):
+                write_node__(result, x, y, None, fstats)
+        start = stop
+    print('[DEBUG] Estimated Strain Tensors for {} out of {} nodes'.format(nodes_estim, len(grd)))
     fout.close()
     if fstats: fstats.close()
 
+def progress__(done, total):
+    """ Print a progress line (see iter_grid). """
+    print('[DEBUG] {:5d}/{:7d}'.format(done, total), end="\r")
+
+##  Per-process state of the worker pool (see veis_pool_init__).
+_pool_state = {}
+
+def veis_compute__(sta_list_utm, simplices, utmzone, workers=None):
+    """ Estimate one Strain Tensor per triangle (simplices is a (K,3) array of
+        indexes into the StationArray sta_list_utm), see veis_estimate_batch.
+        If workers is larger than one, the triangles are split in chunks which
+        are distributed to a pool of worker processes (the stations are
+        memory-mapped by the workers, as in iter_grid). Returns an array of
+        NODE_RESULT_DTYPE records, one per triangle, in the order of simplices.
+    """
+    workers = workers or 1
+    if workers < 2 or len(simplices) <= POOL_CHUNK_SIMPLICES:
+        return node_results_batch(veis_estimate_batch(sta_list_utm, simplices),
+            UTMProjection(utmzone, Ellipsoid("wgs84")))
+    import multiprocessing
+    chunk = max(1, min(POOL_CHUNK_SIMPLICES, len(simplices) // (4*workers)))
+    chunks = numpy.array_split(simplices, int(ceil(len(simplices)/float(chunk))))
+    tmp_dir = tempfile.mkdtemp(prefix='pystrain-')
+    try:
+        as_station_array(sta_list_utm).dump(tmp_dir)
+        pool = multiprocessing.Pool(workers, initializer=veis_pool_init__,
+            initargs=(tmp_dir, utmzone))
+        results = numpy.concatenate(pool.map(veis_pool_chunk__, chunks))
+        pool.close()
+        pool.join()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+def veis_pool_init__(tmp_dir, utmzone):
+    """ Initialize a worker process of the pool used in veis_compute__. """
+    _pool_state['stations'] = load_station_array(tmp_dir)
+    _pool_state['utm_proj'] = UTMProjection(utmzone, Ellipsoid("wgs84"))
+
+def veis_pool_chunk__(simplices):
+    """ Estimate Strain Tensors for a chunk of triangles, within a worker of
+        the pool used in veis_compute__; returns the NODE_RESULT_DTYPE records.
+    """
+    st = _pool_state
+    return node_results_batch(veis_estimate_batch(st['stations'], simplices), st['utm_proj'])
+
 ##  If only the formatter_class could be:
 ##+ argparse.RawTextHelpFormatter|ArgumentDefaultsHelpFormatter ....
 ##  Seems to work with multiple inheritance!
@@ -263,6 +350,56 @@ parser.add_argument('--d-param',
     required=False,
     help='Only relevant for \'--mehod=shen\'. This is the \'D\' parameter for computing the spatial weights. If this option is used, then the parameters: dmin, dmax, dstep and Wt are not used.')
 
+parser.add_argument('--d-search',
+    default='linear',
+    metavar='D_SEARCH',
+    dest='d_search',
+    choices=['linear', 'incremental'],
+    required=False,
+    help='Only relevant for \'--mehod=shen\' and if \'d-param\' is not passed in. Algorithm used to search for the optimal D-parameter value; \'linear\' tests every D in the range [dmin, dmax), while \'incremental\' skips D values that cannot satisfy the Wt criterion and updates the weights incrementally. Both yield the same D.')
+
+parser.add_argument('--d-warm-start',
+    dest='d_warm_start',
+    help='Only relevant for \'--mehod=shen\' and if \'d-param\' is not passed in. Use the optimal D-parameter of an already estimated neighbouring node as a starting point when searching for the optimal D of a node. The optimal D found does not change.',
+    action='store_true')
+
+parser.add_argument('--ls-solver',
+    default='lstsq',
+    metavar='LS_SOLVER',
+    dest='ls_solver',
+    choices=['lstsq', 'cholesky'],
+    required=False,
+    help='Only relevant for \'--mehod=shen\'. How the (weighted) least squares problem is solved at each node; \'lstsq\' solves the full design matrix via SVD, while \'cholesky\' accumulates and solves the (6x6) normal equations, which is faster when many stations are used. The Cholesky path falls back to \'lstsq\' when only 3 stations are available or the normal equations are (nearly) singular.')
+
+parser.add_argument('--output-format',
+    default='text',
+    metavar='OUTPUT_FORMAT',
+    dest='output_format',
+    choices=['text', 'npz'],
+    required=False,
+    help='Format of the Strain Tensor estimates file. \'text\' writes the file \'{:}\'; \'npz\' writes the (binary, columnar) file \'{:}\', which can be read via pystrain.iotools.strainout.read_strain_npz and converted to text via StrainNpz2Txt.py.'.format(STRAIN_OUT_FILE, STRAIN_NPZ_FILE))
+
+parser.add_argument('--station-cache',
+    default=None,
+    metavar='CACHE_DIR',
+    dest='station_cache',
+    required=False,
+    help='A directory where the parsed input stations and their UTM coordinates are cached, in a (memory-mappable) binary format. Entries are named after a hash of the input file contents, so that any change in the input file invalidates them. Runs on the same input file (e.g. with different options) load the stations from the cache instead of parsing the file.')
+
+parser.add_argument('--veis-cache',
+    default=None,
+    metavar='CACHE_FILE',
+    dest='veis_cache',
+    required=False,
+    help='Only relevant for \'--mehod=veis\'. A (numpy npz) file caching the triangulation and the per-triangle results. If the file exists, the results of triangles that have not changed since it was written (same stations, with the same coordinates and velocities) are taken from it instead of being recomputed. The file is then (re)written with the current triangulation and results.')
+
+parser.add_argument('--gmt-grids',
+    default=None,
+    metavar='QUANTITIES',
+    dest='gmt_grids',
+    required=False,
+    help='Only relevant when \'--mehod=shen\' and \'--barycenter\' is not set. A comma-separated list of quantities (any of: {:}), each of which is written as a GMT native binary float grid (\'=bf\'), named \'{:}\' (e.g. \'{:}\'), with region and increment the ones of the estimation grid (pixel registered). Nodes where no tensor is estimated are NaN.'.format(', '.join(STRAIN_DETAILS_COLUMNS[2:]), GMT_GRID_FILE.format('<quantity>'), GMT_GRID_FILE.format('dilat')))
+
 parser.add_argument('-g', '--generate-statistics',
     dest='generate_stats',
     help='Only relevant when \'--mehod=shen\' and \'--barycenter\' is not set. This option will create an output file, named \'strain_stats.dat\', where estimation info and statistics will be written.',
@@ -275,9 +412,17 @@ parser.add_argument('--verbose',
 
 parser.add_argument('--multicore',
     dest='multiproc_mode',
-    help='Run in multithreading mode',
+    help='Run in multithreading mode; unless \'--workers\' is given, one worker process per available CPU is used',
     action='store_true')
 
+parser.add_argument('--workers',
+    default=None,
+    metavar='WORKERS',
+    dest='workers',
+    type=int,
+    required=False,
+    help='Number of worker processes used to estimate the strain tensors on the grid nodes (\'--mehod=shen\') or Delaunay triangles (\'--mehod=veis\'). Nodes (or triangles) are handed out to the workers in chunks; output is written in the same order as in a serial run. A value of 1 means no worker processes.')
+
 parser.add_argument('-v',
     dest='version',
     help='Display version and exit.',
@@ -306,14 +451,23 @@ if __name__ == '__main__':
     vprint = print if args.verbose_mode else lambda *a, **k: None
 
     ## if in mutlithreading mode, load the module
-    if args.multiproc_mode:
-        if args.method == 'shen':
-            import multiprocessing
-            cpu_count = multiprocessing.cpu_count()
-            print("[DEBUG] Using multithreaded version; available CPU's: {:02d}".format(
-                cpu_count))
-        else:
-            print("[DEBUG] Multithreading is only available when using shen method; ignoring the \"--multicore\" switch!")
+    if args.multiproc_mode or (args.workers or 1) > 1:
+        import multiprocessing
+        cpu_count = multiprocessing.cpu_count()
+        if not args.workers: args.workers = cpu_count
+        args.multiproc_mode = args.workers > 1
+        print("[DEBUG] Using multithreaded version; available CPU's: {:02d}, workers: {:02d}".format(
+            cpu_count, args.workers))
+
+    ##  Resolve the quantities to be written as GMT grids (if any)
+    gmt_grids = args.gmt_grids.split(',') if args.gmt_grids else []
+    for key in gmt_grids:
+        if key not in STRAIN_DETAILS_COLUMNS[2:]:
+            print('[ERROR] Invalid quantity for GMT grid: \'{}\''.format(key), file=sys.stderr)
+            sys.exit(1)
+    if gmt_grids and (args.method != 'shen' or args.one_tensor):
+        print("[DEBUG] GMT grids are only written when estimating on a grid (shen method); ignoring the \"--gmt-grids\" switch!")
+        gmt_grids = []
     
 	## import dill module for windows multithreading processing
     if args.multiproc_mode and os.name == 'nt':
@@ -334,7 +488,12 @@ if __name__ == '__main__':
             args.gps_file), file=sys.stderr)
         sys.exit(1)
     try:
-        sta_list_ell = parse_ascii_input(args.gps_file, args.method=='shen')
+        if args.station_cache:
+            sta_cache = StationCache(args.station_cache, args.gps_file, args.method=='shen')
+            sta_list_ell = sta_cache.stations()
+            vprint('[DEBUG] Using station cache entry {}'.format(sta_cache.path))
+        else:
+            sta_list_ell = parse_ascii_input(args.gps_file, args.method=='shen', as_array=True)
     except ValueError as err:
         print(err)
         print('[ERROR] Failed to parse input file: \"{:}\"'.format(args.gps_file))
@@ -342,6 +501,8 @@ if __name__ == '__main__':
     print('[DEBUG] Reading station coordinates and velocities from {}'.format(
         args.gps_file))
     print('[DEBUG] Number of stations parsed: {}'.format(len(sta_list_ell)))
+    ##  Indexes (in the input file) of the stations kept
+    sta_list_all, sta_rows = sta_list_ell, numpy.arange(len(sta_list_ell))
 
     ##  If a region is passed in, resolve it (from something like 
     ##+ '21.0/23.5/36.0/38.5'). Note that limits are in dec. degrees.
@@ -355,7 +516,8 @@ if __name__ == '__main__':
                 Napr = len(sta_list_ell)
                 #  Note that we have to convert radians to degrees for station 
                 #+ coordinates, hence 'sta_list_to_degrees=True'
-                sta_list_ell = cut_rectangle(lonmin, lonmax, latmin, latmax, sta_list_ell, True)
+                inside = in_rectangle(lonmin, lonmax, latmin, latmax, sta_list_ell, True)
+                sta_list_ell, sta_rows = sta_list_ell[inside], sta_rows[inside]
                 Npst = len(sta_list_ell)
                 vprint('[DEBUG] Stations filtered to fit input region: {:7.3f}/{:7.3f}/{:7.3f}/{:7.3f}'.format(lonmin, lonmax, latmin, latmax))
                 vprint('[DEBUG] {:4d} out of original {:4d} stations remain to be processed.'.format(Npst, Napr))
@@ -393,34 +555,34 @@ if __name__ == '__main__':
         d = 2e0*(args.d_coef if args.d_coef is not None else args.dmax)
         cutoffdis += d * (2.15e0 if args.ltype == 'gaussian' else 10e0) # in km
         vprint('[DEBUG] Using cut-off distance {:10.3f}km'.format(cutoffdis))
-        sta_list_ell = [ s for s in sta_list_ell if s.haversine_distance(bc)/1e3 <= cutoffdis ]
+        near = as_station_array(sta_list_ell).haversine_distance(bc)/1e3 <= cutoffdis
+        sta_list_ell, sta_rows = sta_list_ell[near], sta_rows[near]
         Npst = len(sta_list_ell)
         print('[DEBUG] {:4d} out of original {:4d} stations remain to be processed.'.format(Npst, Napr))
 
-    ##  Make a new station list (copy of the original one), where all coordinates
-    ##+ are in UTM. All points should belong to the same ZONE.
+    ##  Make a projected view of the station list, where all coordinates are
+    ##+ in UTM; all other columns (names, velocities, sigmas) are shared with
+    ##+ sta_list_ell. All points should belong to the same ZONE.
     ##  Note that station ellipsoidal coordinates are in radians while the 
     ##+ cartesian (projection) coordinates are in meters.
-    ##
-    ##  TODO is this mean_lon the optimal?? or should it be the region's mean longtitude
-    ##
-    mean_lon = degrees(sum([ x.lon for x in sta_list_ell ]) / len(sta_list_ell))
-    utm_zone = floor(mean_lon/6)+31
-    utm_zone = utm_zone + int(utm_zone<=0)*60 - int(utm_zone>60)*60
-    vprint('[DEBUG] Mean longtitude is {} deg.; using Zone = {} for UTM'.format(mean_lon, utm_zone))
-    sta_list_utm = deepcopy(sta_list_ell)
-    for idx, sta in enumerate(sta_list_utm):
-        N, E, Zone, lcm = ell2utm(sta.lat, sta.lon, Ellipsoid("wgs84"), utm_zone)
-        sta_list_utm[idx].lon = E
-        sta_list_utm[idx].lat = N
-        assert Zone == utm_zone, "[ERROR] Invalid UTM Zone."
+    utm_zone = utm_zone_of(sta_list_ell)
+    vprint('[DEBUG] Using Zone = {} for UTM (zone of the mean longtitude)'.format(utm_zone))
+    utm_proj = UTMProjection(utm_zone, Ellipsoid("wgs84"))
+    assert (sta_list_ell.lat > 0).all(), "[ERROR] Invalid UTM Zone."
+    if args.station_cache:
+        ##  (cached) coordinates of all stations in the input file
+        N, E = sta_cache.utm(sta_list_all, utm_proj)
+        N, E = N[sta_rows], E[sta_rows]
+    else:
+        N, E = utm_proj.forward(sta_list_ell.lat, sta_list_ell.lon)
+    sta_list_utm = sta_list_ell.with_coordinates(E, N)
     vprint('[DEBUG] Station list transformed to UTM.')
 
-    ##  Open file to write Strain Tensor estimates; write the header
-    fout = open(STRAIN_OUT_FILE, 'w')
-    vprint('[DEBUG] Strain info written in file: {}'.format(STRAIN_OUT_FILE))
-    print('{:^9s} {:^9s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s}'.format('Latitude', 'Longtitude', 'vx+dvx', 'vy+dvy', 'w+dw', 'exx+dexx', 'exy+dexy', 'eyy+deyy', 'emax+demax', 'emin+demin', 'shr+dshr', 'azi+dazi', 'dilat+ddilat', 'sec. invariant+dsec inv.'), file=fout)
-    print('{:^9s} {:^9s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s}'.format('deg', 'deg', 'mm/yr', 'mm/yr', 'deg/Myr', 'nstrain/yr', 'nstrain/yr', 'nstrain/yr', 'nstrain/yr', 'nstrain/yr', 'nstrain/yr', 'deg.', 'nstrain/yr', 'nstrain/yr'), file=fout)
+    ##  Open file to write Strain Tensor estimates (in text mode, the header is
+    ##+ written right away)
+    strain_out_file = STRAIN_NPZ_FILE if args.output_format == 'npz' else STRAIN_OUT_FILE
+    fout = StrainResultsWriter(strain_out_file, args.output_format)
+    vprint('[DEBUG] Strain info written in file: {}'.format(strain_out_file))
 
     ##  Compute only one Strain Tensor, at the region's barycenter; then exit.
     if args.one_tensor:
@@ -431,7 +593,7 @@ if __name__ == '__main__':
             sstr = ShenStrain(0e0, 0e0, sta_list_utm, weighting_function='equal_weights')
         sstr.set_to_barycenter()
         sstr.estimate()
-        sstr.print_details(fout, utm_zone)
+        fout.write(sstr.result(utm_proj), novar='{:7s}'.format('-'))
         fout.close()
         write_station_info(sta_list_ell)
         print('[DEBUG] Total running time: {:10.2f} sec.'.format((time.time() - start_time)))      
@@ -456,71 +618,44 @@ if __name__ == '__main__':
         vprint('[DEBUG] Estimating strain tensor for each cell center:')
         ##  Iterate through the grid (on each cell center). Grid returns cell-centre
         ##+ coordinates in lon/lat pairs, in degrees!
-        if args.multiproc_mode:
-            grd1, grd2, grd3, grd4 = grd.split2four()
-            fout1=open(".out.thread1", "w")
-            fout2=open(".out.thread2", "w")
-            fout3=open(".out.thread3", "w")
-            fout4=open(".out.thread4", "w")
-            if fstats:
-                fstats1=open(".sta.thread1", "w")
-                fstats2=open(".sta.thread2", "w")
-                fstats3=open(".sta.thread3", "w")
-                fstats4=open(".sta.thread4", "w")
-            else:
-                fstats1 = fstats2 = fstats3 = fstats4 = None
-            print('[DEBUG] Estimating strain tensors in multi-threading mode')
-            p1 = multiprocessing.Process(target=compute__, args=(grd1, sta_list_utm, utm_zone, fout1, fstats1, vprint), kwargs=dargs)
-            p2 = multiprocessing.Process(target=compute__, args=(grd2, sta_list_utm, utm_zone, fout2, fstats2, vprint), kwargs=dargs)
-            p3 = multiprocessing.Process(target=compute__, args=(grd3, sta_list_utm, utm_zone, fout3, fstats3, vprint), kwargs=dargs)
-            p4 = multiprocessing.Process(target=compute__, args=(grd4, sta_list_utm, utm_zone, fout4, fstats4, vprint), kwargs=dargs)
-            [ p.start() for p in [p1, p2, p3, p4]]
-            [ p.join()  for p in [p1, p2, p3, p4]]
-            for fl in [fout1, fout2, fout3, fout4]:
-                if not fl.closed:
-                    fl.close()
-            if fstats:
-                for fl in [fstats1, fstats2, fstats3, fstats4]:
-                    if not fl.closed:
-                        fl.close()
-            ##  Note that fout? and fstats? are now closed! We need to
-            ##+ concatenate the files though.
-            with open(STRAIN_OUT_FILE, 'a') as fout:
-                for fnr in range(1,5):
-                    with open(".out.thread"+str(fnr), "r") as slave_f:
-                        fout.write(slave_f.read())
-                    os.remove(".out.thread"+str(fnr))
-            if fstats:
-                with open(STATISTICS_FILE, 'a') as fstats:
-                    for fnr in range(1,5):
-                        with open(".sta.thread"+str(fnr), "r") as slave_f:
-                            fstats.write(slave_f.read())
-                        os.remove(".sta.thread"+str(fnr))
-           
-        else:
-            compute__(grd, sta_list_utm, utm_zone, fout, fstats, vprint, **dargs)
+        ##+ The requested quantities are written (as they are estimated) to GMT
+        ##+ (native, binary float) grids.
+        grid_writers = dict((key, GmtGridWriter(GMT_GRID_FILE.format(key), grd, key,
+            STRAIN_NPZ_UNITS[STRAIN_NPZ_COLUMNS.index(key)], ' '.join(sys.argv))) for key in gmt_grids)
+        compute__(grd, sta_list_ell, utm_zone, (N, E), fout, fstats, grid_writers, **dargs)
+        for key in gmt_grids:
+            grid_writers[key].close()
+            vprint('[DEBUG] GMT grid for \'{}\' written in file: {}'.format(key, GMT_GRID_FILE.format(key)))
     else:
         ##  Using veis method. Compute delaunay triangles and estimate one tensor
         ##+ per triangle centre
         ## Open file to write delaunay triangles.
         print('[DEBUG] Estimating Strain Tensors at the barycentre of Delaunay triangles')
         dlnout = open('delaunay_info.dat', 'w')
-        points = numpy.array([ [sta.lon, sta.lat] for sta in sta_list_utm ])
+        points = numpy.column_stack((sta_list_utm.lon, sta_list_utm.lat))
         tri = Delaunay(points)
         print('[DEBUG] Number of Delaunay triangles: {}'.format(len(tri.simplices)))
-        for idx, trng in enumerate(tri.simplices):
-            print('[DEBUG] {:5d}/{:7d}'.format(idx+1, len(tri.simplices)), end="\r")
-            ## triangle barycentre
-            cx = (sta_list_utm[trng[0]].lon + sta_list_utm[trng[1]].lon + sta_list_utm[trng[2]].lon)/3e0
-            cy = (sta_list_utm[trng[0]].lat + sta_list_utm[trng[1]].lat + sta_list_utm[trng[2]].lat)/3e0
-            ##  Construct a strain instance, at the triangle's barycentre, with only
-            ##+ 3 points (in UTM) and equal_weights weighting scheme.
-            sstr = ShenStrain(cx, cy, [sta_list_utm[trng[0]], sta_list_utm[trng[1]], sta_list_utm[trng[2]]], weighting_function='equal_weights')
-            sstr.estimate()
-            sstr.print_details(fout, utm_zone)
-            ## Print the triangle in the corresponding file (ellipsoidal crd, degrees)
-            print('> {:}, {:}, {:}'.format(sta_list_utm[trng[0]].name, sta_list_utm[trng[1]].name, sta_list_utm[trng[2]].name), file=dlnout)
-            print('{:+8.5f} {:8.5f}\n{:+8.5f} {:8.5f}\n{:+8.5f} {:8.5f}\n{:+8.5f} {:8.5f}'.format(*[ degrees(x) for x in [sta_list_ell[trng[0]].lon, sta_list_ell[trng[0]].lat, sta_list_ell[trng[1]].lon, sta_list_ell[trng[1]].lat, sta_list_ell[trng[2]].lon, sta_list_ell[trng[2]].lat, sta_list_ell[trng[0]].lon, sta_list_ell[trng[0]].lat]]), file=dlnout)
+        ##  If a cache of a previous run exists, take the results of all
+        ##+ unchanged triangles from it.
+        stations = numpy.column_stack((sta_list_utm.lon, sta_list_utm.lat, sta_list_utm.ve, sta_list_utm.vn))
+        results = numpy.zeros(len(tri.simplices), dtype=NODE_RESULT_DTYPE)
+        todo = numpy.ones(len(tri.simplices), dtype=bool)
+        if args.veis_cache and os.path.isfile(args.veis_cache):
+            cache = read_veis_cache(args.veis_cache)
+            if cache['utm_zone'] == utm_zone:
+                idx = match_simplices(cache['stations'], cache['simplices'], stations, tri.simplices)
+                todo = idx < 0
+                results[~todo] = cache['results'][idx[~todo]]
+            print('[DEBUG] Results of {} triangles taken from cache file {}'.format(int((~todo).sum()), args.veis_cache))
+        ##  Estimate all (other) tensors at once, one per triangle barycentre
+        ##+ (with only the triangle's 3 points, in UTM, and equal weights).
+        if todo.any():
+            results[todo] = veis_compute__(sta_list_utm, tri.simplices[todo], utm_zone, args.workers)
+        fout.write_array(results, novar='{:7s}'.format('-'))
+        if args.veis_cache:
+            write_veis_cache(args.veis_cache, stations, tri.simplices, results, utm_zone)
+        ## Print the triangles in the corresponding file (ellipsoidal crd, degrees)
+        write_delaunay__(dlnout, tri.simplices, sta_list_ell)
         dlnout.close()
         fout.close()
 
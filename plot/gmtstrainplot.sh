@@ -139,6 +139,23 @@ scalevar_T()
     read Tmax_r Tmax_r_marg cpt_step scale_step_r <<< "${SVARS[@]}"
 }
 
+##
+##  Function to check if a (strain) input file is a GMT native binary float
+##+ grid, as written by 'StrainTensor.py --gmt-grids' (e.g. strain_dilat.grd);
+##+ these are used directly (as <file>=bf), without any text conversion.
+##+ The check does not depend on the file name: the file must be readable by
+##+ 'gmt grdinfo' as a native float grid and its size must match the header
+##+ (892 bytes) plus nx*ny 4-byte values.
+##  Use as: <if is_native_grd file; then ...>
+##
+is_native_grd() {
+    local info
+    [ -f "${1}" ] || return 1
+    info=$(gmt grdinfo -C "${1}=bf" 2>/dev/null) || return 1
+    echo "${info}" | awk -v size="$(wc -c < "${1}")" \
+        'NF >= 11 && $10 > 0 && $11 > 0 && size == 892 + 4*$10*$11 {ok=1} END {exit !ok}'
+}
+
 ##
 ##  Check if a (given) variable is a number (either integer or float, in
 ##+ fixed or scietific format. Returns 0 if variable is number, 1 otherwise.
@@ -280,6 +297,9 @@ function help {
 	echo "     -rotsc [:=rotational scales]"
 	echo "  *for -gtot | -dil | -secinv use +grd to plot gridded data"
 	echo "        ex:-gtot+grd "
+	echo "     with +grd, the strain file can also be a native grid written by"
+	echo "     StrainTensor.py --gmt-grids (shr, dilat or sec_inv respectively)"
+	echo "        ex:-dil+grd strain_dilat.grd"
 	echo ""
 	echo "/*** OTHER OPRTIONS ********************************************/"
 	echo "     -o | --output : name of output files"
@@ -654,9 +674,15 @@ if [ "$GTOTAL" -eq 1 ]
 then
   echo "...plot maximum shear strain rates..."
 # plot shear strain rates
-  awk 'NR > 2 {print $2,$1,$19*1}' $pth2strinfo > tmpgtot
+  if [ "${GRDDAT}" -eq 1 ] && is_native_grd ${pth2strinfo}
+  then
+# find min max (from the grid header) and create cpt file
+    T=`gmt grdinfo -C ${pth2strinfo}=bf | awk '{print $7}'`
+  else
+    awk 'NR > 2 {print $2,$1,$19*1}' $pth2strinfo > tmpgtot
 # find min max and create cpt file
-  T=`awk '{print $3}' tmpgtot | gmt info -Eh `
+    T=`awk '{print $3}' tmpgtot | gmt info -Eh `
+  fi
 # set variables for scale plot
   scalevar_T ${T}
   Tmax=$(pythonc "print(round(${T},${Tmax_r})+${Tmax_r_marg})")
@@ -667,8 +693,13 @@ then
   then
     gmt pscontour tmpgtot -R -J  -Cinx.cpt -I0.1 -O -K -V${VRBLEVM} >> ${outfile}
   else
-    gmt xyz2grd tmpgtot -Gtmpgtot.grd ${range} -I40m= -V
-    gmt grdsample tmpgtot.grd -I4s -Gtmpgtot_sample.grd -V${VRBLEVM}
+    if is_native_grd ${pth2strinfo}
+    then
+      gmt grdsample ${pth2strinfo}=bf -I4s -Gtmpgtot_sample.grd -V${VRBLEVM}
+    else
+      gmt xyz2grd tmpgtot -Gtmpgtot.grd ${range} -I40m= -V
+      gmt grdsample tmpgtot.grd -I4s -Gtmpgtot_sample.grd -V${VRBLEVM}
+    fi
     gmt grdimage tmpgtot_sample.grd ${proj} ${range} -Cinx.cpt -Q \
 	-O -K -V${VRBLEVM}>> $outfile
   fi
@@ -700,13 +731,24 @@ if [ "$DILATATION" -eq 1 ]
 then
   echo "...plot dilatation..."
 # plot shear strain rates
-  awk 'NR > 2 {print $2,$1,$23*1}' $pth2strinfo >tmpdil
-  # find min max and create cpt file
-  T=`awk '{print $3}' tmpdil | gmt info -Eh `
+  if [ "${GRDDAT}" -eq 1 ] && is_native_grd ${pth2strinfo}
+  then
+    # find min max (from the grid header) and create cpt file
+    T=`gmt grdinfo -C ${pth2strinfo}=bf | awk '{print $7}'`
+  else
+    awk 'NR > 2 {print $2,$1,$23*1}' $pth2strinfo >tmpdil
+    # find min max and create cpt file
+    T=`awk '{print $3}' tmpdil | gmt info -Eh `
+  fi
   # set variables for scale plot
   scalevar_T ${T}
   Tmax=$(pythonc "print(round(${T},${Tmax_r})+${Tmax_r_marg})")
-  T=`awk '{print $3}' tmpdil | gmt info -El `
+  if [ "${GRDDAT}" -eq 1 ] && is_native_grd ${pth2strinfo}
+  then
+    T=`gmt grdinfo -C ${pth2strinfo}=bf | awk '{print $6}'`
+  else
+    T=`awk '{print $3}' tmpdil | gmt info -El `
+  fi
   Tmin=$(pythonc "print(round(${T},${Tmax_r})-${Tmax_r_marg})")
   gmt makecpt -Cjet -T${Tmin}/${Tmax}/${cpt_step} > inx.cpt
 
@@ -714,8 +756,13 @@ then
   then
     gmt pscontour tmpdil -R -J  -Cinx.cpt -I0.1 -O -K -V${VRBLEVM} >> ${outfile}
   else 
-    gmt xyz2grd tmpdil -Gtmpdil.grd ${range} -I40m= -V
-    gmt grdsample tmpdil.grd -I4s -Gtmpdil_sample.grd -V${VRBLEVM}
+    if is_native_grd ${pth2strinfo}
+    then
+      gmt grdsample ${pth2strinfo}=bf -I4s -Gtmpdil_sample.grd -V${VRBLEVM}
+    else
+      gmt xyz2grd tmpdil -Gtmpdil.grd ${range} -I40m= -V
+      gmt grdsample tmpdil.grd -I4s -Gtmpdil_sample.grd -V${VRBLEVM}
+    fi
     gmt grdimage tmpdil_sample.grd ${proj} ${range} -Cinx.cpt -Q \
 	-O -V${VRBLEVM} -K >> $outfile
   fi
@@ -746,9 +793,15 @@ if [ "$SECINV" -eq 1 ]
 then
   echo "...plot 2nd invariant..."
 # plot shear strain rates
-  awk 'NR > 2 {print $2,$1, $25*1}' $pth2strinfo >tmp2inv
-  # find min max and create cpt file
-  T=`awk '{print $3}' tmp2inv | gmt info -Eh `
+  if [ "${GRDDAT}" -eq 1 ] && is_native_grd ${pth2strinfo}
+  then
+    # find min max (from the grid header) and create cpt file
+    T=`gmt grdinfo -C ${pth2strinfo}=bf | awk '{print $7}'`
+  else
+    awk 'NR > 2 {print $2,$1, $25*1}' $pth2strinfo >tmp2inv
+    # find min max and create cpt file
+    T=`awk '{print $3}' tmp2inv | gmt info -Eh `
+  fi
 # set variables for scale plot
   scalevar_T ${T}
   
@@ -759,8 +812,13 @@ then
   then
     gmt pscontour tmp2inv -R -J  -Cinx.cpt -I0.1 -O -K -V${VRBLEVM} >> ${outfile}
   else 
-    gmt xyz2grd tmp2inv -Gtmp2inv.grd ${range} -I40m= -V
-    gmt grdsample tmp2inv.grd -I4s -Gtmp2inv_sample.grd -V${VRBLEVM}
+    if is_native_grd ${pth2strinfo}
+    then
+      gmt grdsample ${pth2strinfo}=bf -I4s -Gtmp2inv_sample.grd -V${VRBLEVM}
+    else
+      gmt xyz2grd tmp2inv -Gtmp2inv.grd ${range} -I40m= -V
+      gmt grdsample tmp2inv.grd -I4s -Gtmp2inv_sample.grd -V${VRBLEVM}
+    fi
     gmt grdimage tmp2inv_sample.grd ${proj} ${range} -Cinx.cpt -Q \
 	-O -V${VRBLEVM} -K >> $outfile
   fi
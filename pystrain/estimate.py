@@ -0,0 +1,292 @@
+#! /usr/bin/python
+#-*- coding: utf-8 -*-
+
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+from collections import deque
+from math import radians, degrees, floor
+import numpy
+from pystrain.station import StationIndex, as_station_array, load_station_array
+from pystrain.strain import ShenSolver, NODE_RESULT_DTYPE, NODE_ESTIMATED, \
+    NODE_LIMITED_COVER, NODE_NO_VCV
+from pystrain.geodesy.utm import UTMProjection
+from pystrain.geodesy.ellipsoid import Ellipsoid
+
+##  Min number of stations for which a spatial index (KD-tree) is used
+INDEX_MIN_STATIONS = 1000
+##  Max number of grid nodes in each chunk handed out to a worker process
+POOL_CHUNK_NODES = 32
+##  Max number of chunks (per worker process) submitted to the pool ahead of
+##+ the one the results are being collected from
+POOL_CHUNKS_AHEAD = 4
+##  Default number of grid nodes in each batch of results (see iter_grid)
+GRID_BATCH_NODES = 4096
+
+def utm_zone_of(sta_list):
+    """ The UTM zone of the stations' mean longtitude.
+
+        Args:
+            sta_list (StationArray or list of Station): the stations
+                (ellipsoidal coordinates, in radians).
+
+        Returns:
+            int: the UTM zone, in the range [1, 60].
+    """
+    sta_arr = as_station_array(sta_list)
+    ##  TODO is this mean_lon the optimal?? or should it be the region's mean
+    ##+ longtitude
+    mean_lon = degrees(sum(sta_arr.lon.tolist()) / len(sta_arr))
+    utm_zone = floor(mean_lon/6)+31
+    return utm_zone + int(utm_zone<=0)*60 - int(utm_zone>60)*60
+
+def make_solver(sta_list_utm, utm_proj, **options):
+    """ A ShenSolver for the stations (in UTM) and options; a spatial index
+        is built for large station sets (for small ones a linear scan is just
+        as fast).
+    """
+    sta_index = StationIndex(sta_list_utm) if len(sta_list_utm) >= INDEX_MIN_STATIONS else None
+    return ShenSolver(sta_list_utm, station_index=sta_index, utm_zone=utm_proj, **options)
+
+def estimate_nodes(grd, nodes, solver, utm_proj, d_warm_start=False):
+    """ Estimate Strain Tensors for a set of grid nodes (generator).
+
+        For each of the given nodes (in the order given), the Strain Tensor is
+        estimated at the node (projected to UTM) by solver and a tuple holding
+        the fields of a NODE_RESULT_DTYPE record is yielded.
+
+        Args:
+            grd (pystrain.grid.Grid): the grid.
+            nodes (sequence): flat indexes of the grid nodes to estimate (see
+                Grid.idx2xyidx), e.g. a range or a numpy.array; cell centres
+                are computed GRID_BATCH_NODES nodes at a time.
+            solver (ShenSolver): the estimator (stations in UTM).
+            utm_proj (UTMProjection): the projection of the stations.
+            d_warm_start (bool): use the optimal D of neighbouring nodes as
+                hints for the D search (see ShenStrain.estimate).
+    """
+    ##  Optimal D of the last node estimated in each grid column; with the
+    ##+ previous node (same row) these are used as hints for the D search.
+    d_hints = [ None ] * grd.xpts
+    for start in range(0, len(nodes), GRID_BATCH_NODES):
+        block = numpy.asarray(nodes[start:start+GRID_BATCH_NODES], dtype=int)
+        for result in _estimate_block(grd, block, solver, utm_proj, d_warm_start, d_hints):
+            yield result
+
+def _estimate_block(grd, nodes, solver, utm_proj, d_warm_start, d_hints):
+    """ Estimate Strain Tensors for a block of grid nodes (numpy.array of flat
+        indexes); see estimate_nodes. d_hints holds the optimal D of the last
+        node estimated in each grid column and is updated in place.
+    """
+    vprint = solver.vprint
+    xs, ys = grd.nodes(nodes)
+    for node_nr, x, y in zip(nodes.tolist(), xs.tolist(), ys.tolist()):
+        clat, clon =  radians(y), radians(x)
+        assert clat > 0, "[ERROR] Invalid UTM Zone."
+        N, E = utm_proj.forward(clat, clon)
+        vprint('[DEBUG] Grid point at {:+8.4f}, {:8.4f} or E={:}, N={:}'.format(
+            x, y, E, N))
+        ##  hint: the node on the left if estimated, else the one below
+        d_hint, ix = None, node_nr % grd.xpts
+        if d_warm_start:
+            d_hint = d_hints[ix-1] if ix > 0 and d_hints[ix-1] is not None else d_hints[ix]
+        result = solver.solve(E, N, d_hint)
+        status = result[0]
+        if status == NODE_ESTIMATED:
+            vprint('[DEBUG] Computed tensor at {:+8.4f} {:+8.4f} for node {:3d}/{:3d}'.format(x, y, node_nr+1, len(grd)))
+        elif status == NODE_LIMITED_COVER:
+            vprint('[DEBUG] Skipping computation at {:+8.4f},{:8.4f} because of limited coverage (max_beta= {:6.2f}deg.)'.format(x, y, solver.max_beta(E, N)))
+        elif status == NODE_NO_VCV:
+            vprint('[DEBUG] Failed to compute parameter VcV matrix for strain at {:+8.4f}, {:8.4f}. Point skipped'.format(x,y))
+        else:
+            vprint('[DEBUG] Too few observations to estimate strain at {:+8.4f}, {:8.4f}. Point skipped.'.format(x,y))
+        if d_warm_start and status != NODE_LIMITED_COVER:
+            d_hints[ix] = result[2] if status == NODE_ESTIMATED else None
+        yield result
+
+def iter_grid(stations, grd, batch_size=GRID_BATCH_NODES, utm_zone=None, utm_coordinates=None, workers=None, progress=None, **options):
+    """ Estimate Strain Tensors (Shen's algorithm) on the nodes of a grid, in
+        batches (generator).
+
+        The results are yielded as arrays of NODE_RESULT_DTYPE records (see
+        estimate_grid), one batch of batch_size contiguous nodes at a time (the
+        last one may be shorter), in grid order; i.e. the k-th batch holds
+        nodes k*batch_size up to (k+1)*batch_size-1, whose coordinates are
+        given by grd.centres(k*batch_size, (k+1)*batch_size). Each batch is a
+        new array, so it may be kept by the caller.
+        Memory use depends on batch_size (and the number of stations), not on
+        the number of grid nodes; a batch is estimated only when the previous
+        one has been consumed, so results can be written as they are computed
+        (e.g. via StrainResultsWriter.write_array).
+
+        If workers is larger than one, the nodes of each batch are split in
+        small chunks, which are dynamically distributed to a pool of worker
+        processes; only a few chunks (per worker) are submitted ahead of the
+        one being waited for. The stations are written once to (temporary)
+        files, which the workers memory-map. Workers store the results in a
+        (temporary) memory-mapped buffer, one record per grid node, at the
+        nodes' indexes; no results are sent back to the parent process, which
+        yields (copies of) slices of the buffer as batches complete. Results
+        (and batches) are identical to a serial run.
+
+        e.g. for batch in iter_grid(stations, grd, 1024, Wt=24):
+                 fout.write_array(batch)
+
+        Args:
+            stations, grd, utm_zone, utm_coordinates, workers, progress and
+                **options: see estimate_grid.
+            batch_size (int): number of grid nodes in each batch.
+
+        Yields:
+            numpy.array: NODE_RESULT_DTYPE records for a batch of nodes.
+    """
+    sta_list_ell = as_station_array(stations)
+    if utm_zone is None: utm_zone = utm_zone_of(sta_list_ell)
+    utm_proj = UTMProjection(utm_zone, Ellipsoid("wgs84"))
+    if utm_coordinates is None:
+        utm_coordinates = utm_proj.forward(sta_list_ell.lat, sta_list_ell.lon)
+    N, E = utm_coordinates
+    sta_list_utm = sta_list_ell.with_coordinates(E, N)
+    batch_size = max(1, int(batch_size))
+    nodes = len(grd)
+    workers = workers or 1
+    if workers < 2:
+        solver = make_solver(sta_list_utm, utm_proj, **options)
+        records = estimate_nodes(grd, range(nodes), solver, utm_proj,
+            options.get('d_warm_start', False))
+        for start in range(0, nodes, batch_size):
+            batch = numpy.empty(min(batch_size, nodes-start), dtype=NODE_RESULT_DTYPE)
+            for i in range(len(batch)):
+                batch[i] = next(records)
+                if progress: progress(start+i+1, nodes)
+            yield batch
+        return
+    import multiprocessing
+    ##  Small chunks of contiguous nodes (never crossing a batch), handed out
+    ##+ to the workers as they become available; results are collected in
+    ##+ order.
+    chunk = max(1, min(POOL_CHUNK_NODES, batch_size, nodes // (4*workers)))
+    chunks = _node_chunks(nodes, batch_size, chunk)
+    pending = deque()
+    ##  The stations are written once to (temporary) files, which all workers
+    ##+ memory-map (read-only) instead of receiving a copy. The results buffer
+    ##+ (one record per node) lives in the same directory.
+    tmp_dir = tempfile.mkdtemp(prefix='pystrain-')
+    pool, results = None, None
+    try:
+        sta_list_utm.dump(tmp_dir)
+        results = numpy.lib.format.open_memmap(os.path.join(tmp_dir, 'results.npy'),
+            mode='w+', dtype=NODE_RESULT_DTYPE, shape=(nodes,))
+        pool = multiprocessing.Pool(workers, initializer=_pool_init,
+            initargs=(grd, tmp_dir, utm_zone, options))
+        for start in range(0, nodes, batch_size):
+            stop = min(start+batch_size, nodes)
+            filled = start
+            while filled < stop:
+                while len(pending) < POOL_CHUNKS_AHEAD*workers:
+                    bounds = next(chunks, None)
+                    if bounds is None: break
+                    pending.append(pool.apply_async(_pool_chunk, (bounds,)))
+                filled += pending.popleft().get()
+                if progress: progress(filled, nodes)
+            yield numpy.array(results[start:stop])
+        pool.close()
+        pool.join()
+    finally:
+        ## e.g. an error, or the generator was closed before the last batch
+        if pool is not None: pool.terminate()
+        del results
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def estimate_grid(stations, grd, utm_zone=None, utm_coordinates=None, workers=None, progress=None, **options):
+    """ Estimate Strain Tensors (Shen's algorithm) on the nodes of a grid.
+
+        One Strain Tensor is estimated at each grid node (cell centre) and the
+        results are returned in memory, as an array of NODE_RESULT_DTYPE
+        records (see pystrain.strain) in grid order: status, number of
+        stations used, optimal D, cut-off distance, a-posteriori std.
+        deviation and the Strain Tensor details (velocities, rotation, strain
+        rate components, principal and derived quantities, each followed by
+        its std. deviation; see STRAIN_DETAILS_COLUMNS). Fields of nodes not
+        estimated (status other than NODE_ESTIMATED) are NaN; the node
+        coordinates are given by grd.centres().
+        Stations and nodes are projected to UTM (one zone for all), as
+        StrainTensor.py does. For large grids, see iter_grid, which yields the
+        same results in batches.
+
+        If workers is larger than one, the nodes are split in small chunks,
+        which are dynamically distributed to a pool of worker processes; the
+        stations are written once to (temporary) files, which the workers
+        memory-map. Results are identical to a serial run.
+
+        e.g. results = estimate_grid(stations, Grid(19, 30, .5, 34, 42, .5), Wt=24)
+             dilat = results['dilat'][results['status'] == NODE_ESTIMATED]
+
+        Args:
+            stations (StationArray or list of Station): the stations, with
+                ellipsoidal coordinates (radians) and velocities in m/yr (e.g.
+                as returned by parse_ascii_input).
+            grd (pystrain.grid.Grid): the grid (degrees).
+            utm_zone (int): the UTM zone; if None, the zone of the stations'
+                mean longtitude is used (see utm_zone_of).
+            utm_coordinates (tuple): (Northings, Eastings) of the stations in
+                utm_zone, if already available (e.g. see StationCache.utm);
+                else they are computed.
+            workers (int): number of worker processes; None or 1 means no
+                worker processes.
+            progress (function): if given, it is called as progress(done,
+                total) as nodes are estimated.
+            **options: any of the ShenSolver options (i.e. the ShenStrain
+                options and max_beta_angle) and d_warm_start (bool); other
+                keys are ignored.
+
+        Returns:
+            numpy.array: len(grd) NODE_RESULT_DTYPE records, in grid order.
+    """
+    results = numpy.empty(len(grd), dtype=NODE_RESULT_DTYPE)
+    start = 0
+    for batch in iter_grid(stations, grd, GRID_BATCH_NODES, utm_zone,
+            utm_coordinates, workers, progress, **options):
+        results[start:start+len(batch)] = batch
+        start += len(batch)
+    return results
+
+def _node_chunks(nodes, batch_size, chunk):
+    """ Ranges (start, stop) of contiguous flat node indexes, of (at most)
+        chunk nodes each, in grid order; no range crosses a batch boundary
+        (see iter_grid).
+    """
+    for start in range(0, nodes, batch_size):
+        stop = min(start+batch_size, nodes)
+        for first in range(start, stop, chunk):
+            yield first, min(first+chunk, stop)
+
+##  Per-process state of the worker pool (see _pool_init).
+_pool_state = {}
+
+def _pool_init(grd, tmp_dir, utm_zone, options):
+    """ Initialize a worker process of the pool used in iter_grid: the
+        stations are memory-mapped from the directory tmp_dir (see
+        StationArray.dump), as is the results buffer; the solver and the UTM
+        projection are constructed once per worker.
+    """
+    sta_list_utm = load_station_array(tmp_dir)
+    _pool_state['results'] = numpy.load(os.path.join(tmp_dir, 'results.npy'), mmap_mode='r+')
+    _pool_state['grd'] = grd
+    _pool_state['utm_proj'] = UTMProjection(utm_zone, Ellipsoid("wgs84"))
+    _pool_state['solver'] = make_solver(sta_list_utm, _pool_state['utm_proj'], **options)
+    _pool_state['d_warm_start'] = options.get('d_warm_start', False)
+
+def _pool_chunk(bounds):
+    """ Estimate Strain Tensors for a chunk of grid nodes (flat indexes in the
+        range [start, stop) given by bounds), within a worker of the pool used
+        in iter_grid; results are stored in the (memory-mapped) results
+        buffer, at the nodes' indexes. Returns the number of nodes.
+    """
+    st = _pool_state
+    start, stop = bounds
+    st['results'][start:stop] = numpy.array(list(estimate_nodes(st['grd'],
+        range(start, stop), st['solver'], st['utm_proj'], st['d_warm_start'])),
+        dtype=NODE_RESULT_DTYPE)
+    return stop - start
@@ -6,27 +6,70 @@ import math
 import numpy as np
 from pystrain.geodesy.ellipsoid import Ellipsoid
 
+def _is_scalar(*args):
+    """True if all args are scalars (i.e. not arrays); floats are checked
+        first, since numpy.ndim is comparatively slow."""
+    for c in args:
+        if not isinstance(c, float) and np.ndim(c) != 0: return False
+    return True
+
 def top2daz(north, east, up):
     """Compute azimouth, zenith and distance from a topocentric vector.
 
         Given a topocentric vector (aka north, east and up components), compute
         the azimouth, zenith angle and distance between the two points.
+        The components can also be (equally sized) numpy arrays, in which case
+        the returned values are arrays too.
 
         Args:
-            north (float): the north component (in meters)
-            east (float) : the east component (in meters)
-            up (float)   : the up component (in meters)
+            north (float or numpy.array): the north component (in meters)
+            east (float or numpy.array) : the east component (in meters)
+            up (float or numpy.array)   : the up component (in meters)
 
         Returns:
             tuple (floats): a tuple of three floats is returned, as:
                             [distance, azimouth, zenith], where distance is
                             in meters, and azimouth and zenith are in radians.
     """
-    distance = math.sqrt(north*north + east*east + up*up)
-    a        = math.atan2(east, north) % (math.pi*2e0) # normalized [0, 2pi]
-    zenith   = math.acos(up/distance);
+    if _is_scalar(north, east, up):
+        ## single point; plain floats and math are a lot faster here
+        north, east, up = float(north), float(east), float(up)
+        distance = math.sqrt(north*north + east*east + up*up)
+        a        = math.atan2(east, north) % (math.pi*2e0) # normalized [0, 2pi]
+        zenith   = math.acos(up/distance);
+        return distance, a, zenith
+    distance = np.sqrt(north*north + east*east + up*up)
+    a        = np.arctan2(east, north) % (np.pi*2e0) # normalized [0, 2pi]
+    zenith   = np.arccos(up/distance);
     return distance, a, zenith
 
+def _ell2top(phi, lamda, dx, dy, dz, xp=np):
+    """Rotate a cartesian vector to the topocentric system at (phi, lamda).
+
+        Args:
+            phi (float or numpy.array)  : latitude of the local system origin
+                                          (radians).
+            lamda (float or numpy.array): longtitude of the local system
+                                          origin (radians).
+            dx, dy, dz (float or numpy.array): the cartesian vector components.
+            xp: the module providing the math functions (math or numpy).
+
+        Returns:
+            tuple: a 3-element tuple, as [north, east, up].
+    """
+    # Trigonometric numbers.
+    cosf = xp.cos(phi)
+    cosl = xp.cos(lamda)
+    sinf = xp.sin(phi)
+    sinl = xp.sin(lamda)
+
+    # Topocentric vector.
+    north = - sinf * cosl * dx - sinf * sinl * dy + cosf * dz
+    east  = - sinl * dx        + cosl * dy
+    up = cosf * cosl * dx + cosf * sinl * dy + sinf * dz
+
+    return north, east, up
+
 def car2top(xi, yi, zi, xj, yj, zj, ell=Ellipsoid("wgs84")):
     """Cartesian to topocentric vector.
 
@@ -34,14 +77,16 @@ def car2top(xi, yi, zi, xj, yj, zj, ell=Ellipsoid("wgs84")):
         local system around point i (i.e. North(i), East(i), Up(i)).
         To perform the conversion we will need an ellipsoid. The default is
         'wgs84'.
+        All coordinates can also be (equally sized) numpy arrays, in which
+        case all vectors are transformed in one go.
 
         Args:
-            xi (float): x-component of reference point (m).
-            yi (float): y-component of reference point (m).
-            zi (float): z-component of reference point (m).
-            xj (float): x-component of end point (m).
-            yj (float): y-component of end point (m).
-            zj (float): z-component of end point (m).
+            xi (float or numpy.array): x-component of reference point (m).
+            yi (float or numpy.array): y-component of reference point (m).
+            zi (float or numpy.array): z-component of reference point (m).
+            xj (float or numpy.array): x-component of end point (m).
+            yj (float or numpy.array): y-component of end point (m).
+            zj (float or numpy.array): z-component of end point (m).
 
         Returns:
             tuple (float): a 3-element float tuple, as [north, east, up] in
@@ -53,47 +98,72 @@ def car2top(xi, yi, zi, xj, yj, zj, ell=Ellipsoid("wgs84")):
     # Cartesian to ellipsoidal for reference point.
     phi_i, lamda_i, h_i = car2ell(xi, yi, zi, ell)
 
-    # Trigonometric numbers.
-    cosf = math.cos(phi_i)
-    cosl = math.cos(lamda_i)
-    sinf = math.sin(phi_i)
-    sinl = math.sin(lamda_i)
+    if _is_scalar(xi, yi, zi, xj, yj, zj):
+        return _ell2top(phi_i, lamda_i, float(xj)-xi, float(yj)-yi, float(zj)-zi, math)
 
     # Cartesian vector.
-    dx = xj - xi
-    dy = yj - yi
-    dz = zj - zi
+    dx = np.asarray(xj) - xi
+    dy = np.asarray(yj) - yi
+    dz = np.asarray(zj) - zi
 
-    # Topocentric vector.
-    north = - sinf * cosl * dx - sinf * sinl * dy + cosf * dz
-    east  = - sinl * dx        + cosl * dy
-    up = cosf * cosl * dx + cosf * sinl * dy + sinf * dz
+    return _ell2top(phi_i, lamda_i, dx, dy, dz)
 
-    return north, east, up
+def vcar2top(x, y, z, vx, vy, vz, ell=Ellipsoid("wgs84")):
+    """Cartesian to topocentric velocity.
+
+        Rotate velocity vectors expressed in the cartesian (geocentric) system,
+        to the topocentric, local system around each station (i.e. North,
+        East, Up). The rotation is performed at the station's ellipsoidal
+        coordinates, computed on the given ellipsoid (default is 'wgs84').
+        All arguments can be (equally sized) numpy arrays, so that a whole
+        velocity solution is rotated in one go.
+
+        Args:
+            x (float or numpy.array) : x-component of the station (m).
+            y (float or numpy.array) : y-component of the station (m).
+            z (float or numpy.array) : z-component of the station (m).
+            vx (float or numpy.array): x-component of the velocity.
+            vy (float or numpy.array): y-component of the velocity.
+            vz (float or numpy.array): z-component of the velocity.
+
+        Returns:
+            tuple: a 3-element tuple, as [v_north, v_east, v_up], in the same
+                   units as the input velocity.
+    """
+    phi, lamda, h = car2ell(x, y, z, ell)
+    if _is_scalar(x, y, z, vx, vy, vz):
+        return _ell2top(phi, lamda, float(vx), float(vy), float(vz), math)
+    return _ell2top(phi, lamda, np.asarray(vx), np.asarray(vy), np.asarray(vz))
 
 def ell2car(phi, lamda, h, ell=Ellipsoid("wgs84")):
     """Ellipsoidal to cartesian coordinates.
 
         Convert Ellipsoidal coordinates (aka longtitude, latitude, height) to
         cartesian. Default ellipsoid is wgs84.
+        The coordinates can also be (equally sized) numpy arrays, in which
+        case the returned values are arrays too.
 
         Args:
-            phi (float)    : the latitude (in radians).
-            lamda (float)  : the longtitude (in radians).
-            h (float)      : the height (in meters)
-            ell (Ellipsoid): the ellipsoid of choice.
+            phi (float or numpy.array)  : the latitude (in radians).
+            lamda (float or numpy.array): the longtitude (in radians).
+            h (float or numpy.array)    : the height (in meters)
+            ell (Ellipsoid)             : the ellipsoid of choice.
         
         Returns: 
             tuple (float): a 3-float tuple, as [x, y, z] in meters
     """
+    ## single point; plain floats and math are a lot faster here
+    xp = math if _is_scalar(phi, lamda, h) else np
+    if xp is math: phi, lamda, h = float(phi), float(lamda), float(h)
+
     # Eccentricity squared.
     e2 = ell.eccentricity_squared()
 
     # Trigonometric numbers.
-    sinf = math.sin(phi)
-    cosf = math.cos(phi)
-    sinl = math.sin(lamda)
-    cosl = math.cos(lamda)
+    sinf = xp.sin(phi)
+    cosf = xp.cos(phi)
+    sinl = xp.sin(lamda)
+    cosl = xp.cos(lamda)
 
     # Radius of curvature in the prime vertical.
     N = ell.N(phi)
@@ -106,6 +176,44 @@ def ell2car(phi, lamda, h, ell=Ellipsoid("wgs84")):
     # Finished.
     return x, y, z
 
+def _halley(p2, absz, a, f, xp):
+    """Latitude and height of points off the poles (see car2ell), given the
+        squared distance from the polar axis p2 and the unsigned Z-coordinate
+        absz; returns (s1, cp, h), where tan(latitude) = s1/cp. xp is the
+        module providing the math functions (math or numpy).
+    """
+    # Functions of ellipsoid parameters.
+    e2    = (2.0e0-f)*f
+    e4t   = e2*e2*1.5e0
+    ep2   = 1.0e0-e2
+    ep    = math.sqrt(ep2)
+    # Compute distance from polar axis.
+    p = xp.sqrt(p2)
+    # Normalize.
+    s0  = absz/a
+    pn  = p/a
+    zp  = ep*s0
+    # Prepare Newton correction factors.
+    c0  = ep*pn
+    c02 = c0*c0
+    c03 = c02*c0
+    s02 = s0*s0
+    s03 = s02*s0
+    a02 = c02+s02
+    a0  = xp.sqrt(a02)
+    a03 = a02*a0
+    d0  = zp*a03 + e2*s03
+    f0  = pn*a03 - e2*c03
+    # Prepare Halley correction factor.
+    b0  = e4t*s02*c02*pn*(a0-ep)
+    s1  = d0*f0 - b0*s0
+    cp  = ep*(f0*f0-b0*c0)
+    # Evaluate height.
+    s12 = s1*s1
+    cp2 = cp*cp
+    h = (p*cp+absz*s1-a*xp.sqrt(ep2*s12+cp2))/xp.sqrt(s12+cp2)
+    return s1, cp, h
+
 def car2ell(x, y, z, ell=Ellipsoid("wgs84")):
     """Cartesian to ellipsoidal coordinates.
     
@@ -113,11 +221,14 @@ def car2ell(x, y, z, ell=Ellipsoid("wgs84")):
         height). Reference: Fukushima, T., "Transformation from Cartesian to 
         geodetic coordinates accelerated by Halley's method",
         J. Geodesy (2006), 79(12): 689-693
+        The coordinates can also be (equally sized) numpy arrays, in which
+        case all points are transformed in one go (points at the poles are
+        handled separately, as in the scalar case).
 
         Args:
-            x (float): cartesian x component (meters).
-            y (float): cartesian y component (meters).
-            z (float): cartesian z component (meters).
+            x (float or numpy.array): cartesian x component (meters).
+            y (float or numpy.array): cartesian y component (meters).
+            z (float or numpy.array): cartesian z component (meters).
             ell      : ellipsoid of choice.
 
         Returns:
@@ -128,61 +239,59 @@ def car2ell(x, y, z, ell=Ellipsoid("wgs84")):
     """
     a = ell.a
     f = ell.f
-    # Functions of ellipsoid parameters.
     aeps2 = a*a*1e-32
-    e2    = (2.0e0-f)*f
-    e4t   = e2*e2*1.5e0
-    ep2   = 1.0e0-e2
-    ep    = math.sqrt(ep2)
-    aep   = a*ep
+    aep   = a*math.sqrt(1.0e0-(2.0e0-f)*f)
+
+    if _is_scalar(x, y, z):
+        ## single point; plain floats and math are a lot faster here
+        x, y, z = float(x), float(y), float(z)
+        # Compute distance from polar axis squared.
+        p2 = x*x + y*y
+        # Compute longitude lamda.
+        if  (p2 != 0):
+            lamda = math.atan2(y,x);
+        else:
+            lamda = .0e0;
+        # Ensure that Z-coordinate is unsigned.
+        absz = abs(z)
+        if (p2 > aeps2): # Continue unless at the poles
+            s1, cp, h = _halley(p2, absz, a, f, math)
+            phi = math.atan(s1/cp);
+        else: # Special case: pole.
+            phi = math.pi / 2e0
+            h   = absz - aep
+        # Restore sign of latitude.
+        if (z < 0.e0):
+            phi = -phi
+        return phi, lamda, h
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    z = np.asarray(z, dtype=float)
 
     # Compute distance from polar axis squared.
     p2 = x*x + y*y
 
     # Compute longitude lamda.
-    if  (p2 != 0):
-        lamda = math.atan2(y,x);
-    else:
-        lamda = .0e0;
+    lamda = np.where(p2 != 0, np.arctan2(y, x), .0e0)
 
     # Ensure that Z-coordinate is unsigned.
-    absz = abs(z)
-
-    if (p2 > aeps2): # Continue unless at the poles
-        # Compute distance from polar axis.
-        p = math.sqrt(p2)
-        # Normalize.
-        s0  = absz/a
-        pn  = p/a
-        zp  = ep*s0
-        # Prepare Newton correction factors.
-        c0  = ep*pn
-        c02 = c0*c0
-        c03 = c02*c0
-        s02 = s0*s0
-        s03 = s02*s0
-        a02 = c02+s02
-        a0  = math.sqrt(a02)
-        a03 = a02*a0
-        d0  = zp*a03 + e2*s03
-        f0  = pn*a03 - e2*c03
-        # Prepare Halley correction factor.
-        b0  = e4t*s02*c02*pn*(a0-ep)
-        s1  = d0*f0 - b0*s0
-        cp  = ep*(f0*f0-b0*c0)
-        # Evaluate latitude and height.
-        phi = math.atan(s1/cp);
-        s12 = s1*s1
-        cp2 = cp*cp
-        h = (p*cp+absz*s1-a*math.sqrt(ep2*s12+cp2))/math.sqrt(s12+cp2)
-
-    else: # Special case: pole.
-        phi = math.pi / 2e0
-        h   = absz - aep
+    absz = np.abs(z)
+
+    ## Points off the poles; the computation is performed for all points
+    ##+ (at the poles it yields nan's, hence the errstate), and the pole values
+    ##+ are substituted afterwards.
+    off_pole = p2 > aeps2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s1, cp, h = _halley(p2, absz, a, f, np)
+        phi = np.arctan(s1/cp);
+
+    # Special case: pole.
+    phi = np.where(off_pole, phi, np.pi / 2e0)
+    h   = np.where(off_pole, h, absz - aep)
 
     # Restore sign of latitude.
-    if (z < 0.e0):
-        phi = -phi
+    phi = np.where(z < 0.e0, -phi, phi)
 
     # Finished.
     return phi, lamda, h
@@ -208,3 +317,24 @@ if __name__ == "__main__":
     assert abs(dr - math.sqrt(n1*n1 + e1*e1 +u1*u1)) < 1e-5
     distance, a, zenith = top2daz(n1, e1, u1)
     assert abs(dr-distance) < 1e-5
+
+    # array versions must match the scalar ones (incl. points at the poles)
+    xs = np.array([dyng_xyz[0], dyng2xyz[0], -2.1e6, 0e0, 0e0])
+    ys = np.array([dyng_xyz[1], dyng2xyz[1], 4.3e6, 0e0, 0e0])
+    zs = np.array([dyng_xyz[2], dyng2xyz[2], -4.2e6, 6356752.3e0, -6356760e0])
+    lats, lons, hgts = car2ell(xs, ys, zs)
+    xa, ya, za = ell2car(lats, lons, hgts)
+    na, ea, ua = car2top(xs, ys, zs, xs+5e0, ys-3e0, zs+1e0)
+    vn, ve, vu = vcar2top(xs, ys, zs, 5e0, -3e0, 1e0)
+    da, aa, za_ = top2daz(na, ea, ua)
+    for i in range(len(xs)):
+        ref = car2ell(xs[i], ys[i], zs[i])
+        assert all(abs(r-c) < 1e-12 for r, c in zip(ref, (lats[i], lons[i], hgts[i])))
+        ref = ell2car(lats[i], lons[i], hgts[i])
+        assert all(abs(r-c) < 1e-7 for r, c in zip(ref, (xa[i], ya[i], za[i])))
+        ref = car2top(xs[i], ys[i], zs[i], xs[i]+5e0, ys[i]-3e0, zs[i]+1e0)
+        assert all(abs(r-c) < 1e-9 for r, c in zip(ref, (na[i], ea[i], ua[i])))
+        assert all(abs(r-c) < 1e-9 for r, c in zip(ref, (vn[i], ve[i], vu[i])))
+        ref = top2daz(na[i], ea[i], ua[i])
+        assert all(abs(r-c) < 1e-12 for r, c in zip(ref, (da[i], aa[i], za_[i])))
+    print('Array and scalar transformations agree.')
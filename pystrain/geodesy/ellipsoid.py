@@ -2,7 +2,8 @@
 #-*- coding: utf-8 -*-
 
 from __future__ import print_function
-from math import cos, sin, sqrt
+import math
+import numpy
 
 ##  A dictionary holding standard reference ellipsoids. The keys are the
 ##+ ellipsoid names, and the respective values are the defining geometric
@@ -95,16 +96,18 @@ class Ellipsoid:
             curvature (on the parallel).
 
             Args:
-                lat (float): the latitude in radians.
+                lat (float or numpy.array): the latitude in radians.
 
             Returns:
-                float: normal radius of curvature at given latitude (meters).
+                float (or numpy.array): normal radius of curvature at given
+                latitude (meters).
         """
-        cosf  = cos(lat)
-        sinf  = sin(lat)
+        xp    = math if isinstance(lat, float) or numpy.ndim(lat) == 0 else numpy
+        cosf  = xp.cos(lat)
+        sinf  = xp.sin(lat)
         acosf = self.a * cosf
         bsinf = sinf * self.semi_minor()
-        den   = sqrt(acosf*acosf + bsinf*bsinf)
+        den   = xp.sqrt(acosf*acosf + bsinf*bsinf)
         return (self.a * self.a) / den;
 
     def M(self, lat):
@@ -114,23 +117,24 @@ class Ellipsoid:
             (on the parallel).
 
             Args:
-                lat (float): the latitude in radians.
+                lat (float or numpy.array): the latitude in radians.
 
             Returns:
-                float: the meridional radii of curvature at the given latitude
-                       (meters).
+                float (or numpy.array): the meridional radii of curvature at
+                       the given latitude (meters).
         """
         a     = self.a
         b     = self.semi_minor()
-        cosf  = cos(lat)
-        sinf  = sin(lat)
+        xp    = math if isinstance(lat, float) or numpy.ndim(lat) == 0 else numpy
+        cosf  = xp.cos(lat)
+        sinf  = xp.sin(lat)
         acosf = a * cosf
         bsinf = b * sinf
         tmpd  = acosf*acosf + bsinf*bsinf
-        return ((a*b)/tmpd) * ((a*b)/sqrt(tmpd))
+        return ((a*b)/tmpd) * ((a*b)/xp.sqrt(tmpd))
 
-    def __getattr__(self, name):
-        """(Attribute) getter.
+    def __setattr__(self, name, value):
+        """(Attribute) setter.
         
             For ease of use, the instances has the following attributes:
                 * e2   -> eccentricity squared
@@ -139,18 +143,24 @@ class Ellipsoid:
             I.e. the user can legaly write:
             ell1 = Ellipsoid("grs80")
             ell1.b
-            Of course, these attributes cannot be assigned to.
+            Of course, these attributes cannot be assigned to. They are
+            computed (once) whenever a or f are set, so that reading them is
+            just an attribute lookup.
 
             Args:
-                name (str): any (valid) attribute we want to get.
+                name (str): any (valid) attribute we want to set.
+                value     : the value to assign.
 
-            Returns:
-                
+            Raises:
+                AttributeError: if the user tries to set any of e2, b or finv.
         """
-        if name == "e2"  : return self.eccentricity_squared()
-        if name == "b"   : return self.semi_minor()
-        if name == "finv": return 1.0e0/self.f
-        raise AttributeError
+        if name in ("e2", "b", "finv"):
+            raise AttributeError
+        self.__dict__[name] = value
+        if name in ("a", "f") and "a" in self.__dict__ and "f" in self.__dict__:
+            self.__dict__["e2"]   = self.eccentricity_squared()
+            self.__dict__["b"]    = self.semi_minor()
+            self.__dict__["finv"] = 1.0e0/self.f
 
 if __name__ == "__main__":
     ell1 = Ellipsoid("grs80")
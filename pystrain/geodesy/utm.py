@@ -2,7 +2,9 @@
 #-*- coding: utf-8 -*-
 
 from __future__ import print_function
+import math
 from math import floor, degrees, radians, pi, sin, cos, tan
+import numpy
 from pystrain.geodesy.ellipsoid import Ellipsoid
 
 def dd2dms(dd):
@@ -25,78 +27,309 @@ def dd2dms(dd):
     if dd < 0e0: cdeg = cdeg * -1
     return cdeg,cmin,csec
 
+class UTMProjection(object):
+    """A class to perform (repeated) UTM projections on a given ellipsoid.
+
+        All constants needed by the forward and inverse projection, that only
+        depend on the ellipsoid (and the zone), are computed once, at
+        construction, and then reused by every call to forward and inverse.
+        Both methods accept floats or (equally sized) numpy arrays.
+
+        Attributes:
+            ell (Ellipsoid): the ellipsoid of choice.
+            zone (int)     : the UTM zone (negative for the southern
+                             hemisphere); can be None, in which case the
+                             central meridian must be passed in explicitly
+                             to forward and inverse.
+            lcm (float)    : the zone's central meridian (radians), or None.
+            a, f (float)   : the ellipsoid's semi-major axis (meters) and
+                             flattening, as used by the projection
+                             (read-only).
+    """
+
+    ##  UTM scale factor, false easting and false northing (south)
+    ko = 0.9996
+    Eo = 500000
+    No = 1e7
+
+    def __init__(self, zone=None, ell=Ellipsoid("wgs84")):
+        """UTMProjection constructor.
+
+            Args:
+                zone (int)     : the UTM zone (negative for the southern
+                                 hemisphere); if not given, the central
+                                 meridian must be passed in explicitly
+                                 to forward and inverse.
+                ell (Ellipsoid): the ellipsoid of choice (default 'wgs84').
+        """
+        self.ell  = ell
+        self.zone = zone
+        self.lcm  = radians(abs(zone)*6-183) if zone else None
+        a = ell.a
+        f = ell.f
+        b = ell.semi_minor()
+        self._a, self._f, self._b = a, f, b
+        self._aa, self._ab = a*a, a*b
+        e2  = ell.eccentricity_squared()
+        e22 = e2*e2
+        e23 = e22*e2
+        e24 = e23*e2
+        self._e2 = e2
+        ## Meridian arc series coefficients (in n), forward projection.
+        n  = f/(2-f)
+        n2 = pow(n,2)
+        n3 = n2*n
+        n4 = n3*n
+        self._n = n
+        self._fcoef = (1+n2/4.0+n4/64.0, 3.0/2.0*(n-n3/8),
+            15.0/16.0*(n2-n4/4), 35.0/48.0*n3, 315.0/512.0*n4)
+        ## Meridian arc series coefficients (in e2), inverse projection.
+        self._icoef = (1-(e2/4)-(e22*3/64.0)-(e23*5/256.0)-(e24*175/16384.0),
+            (3/8.0)*( e2+(e22/4.0)+(e23*15/128.0)-(e24*455/4096.0) ),
+            (15/256.0)*( e22+(e23*3/4.0)-(e24*77/128.0) ),
+            (35/3072.0)*( e23-(e24*41/32.0) ),
+            -(315/131072.0)*e24)
+
+    @property
+    def a(self):
+        """The semi-major axis (meters) used by the projection."""
+        return self._a
+
+    @property
+    def f(self):
+        """The flattening used by the projection."""
+        return self._f
+
+    def _radii(self, lat, xp=numpy):
+        """Normal and meridional radii of curvature at lat (see Ellipsoid).
+            xp is the module providing the math functions (math or numpy)."""
+        cosf  = xp.cos(lat)
+        sinf  = xp.sin(lat)
+        acosf = self._a * cosf
+        bsinf = sinf * self._b
+        tmpd  = acosf*acosf + bsinf*bsinf
+        RN    = self._aa / xp.sqrt(tmpd)
+        RM    = (self._ab/tmpd) * (self._ab/xp.sqrt(tmpd))
+        return RN, RM
+
+    def _forward_series(self, lat, lam, xp):
+        """Northing (without the false northing) and Easting, given latitude
+            and longtitude difference from the central meridian (radians).
+            xp is the module providing the math functions (math or numpy)."""
+        e2 = self._e2
+        n  = self._n
+        ko = self.ko
+
+        RN, RM = self._radii(lat, xp)
+
+        coslat = xp.cos(lat)
+        sinlat = xp.sin(lat)
+        h2     = e2*coslat*coslat/(1-e2)
+        t      = xp.tan(lat)
+
+        # powers of various values
+        t2   = t**2
+        t3   = t2*t
+        t4   = t3*t
+        t6   = t4*t2
+        h22  = h2**2
+        h23  = h22*h2
+        h24  = h23*h2
+
+        A0, A2, A4, A6, A8 = self._fcoef
+        S  = self._a/(1+n)*(A0*lat-A2*xp.sin(2*lat)+A4*xp.sin(4*lat)-A6*xp.sin(6*lat)+A8*xp.sin(8*lat))
+
+        E1   = lam*coslat
+        E2   = lam**3*coslat**3/6*(1-t2+h2)
+        E3   = lam**5*coslat**5/120*(5-18*t2+t4+14*h2-58*t2*h2+
+                   13*h22+4*h23-64*t2*h22-24*t2*h23)
+        E4   = lam**7*coslat**7/5040*(61-479*t2+179*t4-t4*t2)
+        E    = self.Eo+ko*RN*(E1+E2+E3+E4)
+
+        N1 = S/RN
+        N2 = lam**2/2*sinlat*coslat;
+        N3 = lam**4/24*sinlat*coslat**3*(5-t2+9*h2+4*h22)
+        N4 = lam**6/720*sinlat*coslat**5*(61-58*t2+t4+
+                270*h2-330*t2*h2+445*h22+324*h23-680*t2*h22+
+                88*h24-600*t2*h23-192*t2*h24)
+        N5 = lam**8/40320*sinlat*coslat**7*(1385-311*t2+543*t4-t6)
+        return ko*RN*(N1+N2+N3+N4+N5), E
+
+    def _newton_step(self, lat1, N, xp):
+        """Newton correction for the footpoint latitude lat1, given the
+            Northing N (without the false northing).
+            xp is the module providing the math functions (math or numpy)."""
+        a = self._a
+        A0, A2, A4, A6, A8 = self._icoef
+        f1=a*( A0*lat1-A2*xp.sin(2*lat1)+A4*xp.sin(4*lat1)-A6*xp.sin(6*lat1)+A8*xp.sin(8*lat1) )-N/self.ko
+        f2=a*( A0-2*A2*xp.cos(2*lat1)+4*A4*xp.cos(4*lat1)-6*A6*xp.cos(6*lat1)+8*A8*xp.cos(8*lat1) )
+        return -f1/f2
+
+    def _inverse_series(self, lat1, E, lcm, xp):
+        """Latitude and longtitude given the footpoint latitude lat1 and the
+            Easting E (without the false easting).
+            xp is the module providing the math functions (math or numpy)."""
+        e2  = self._e2
+        ko  = self.ko
+        RN, RM = self._radii(lat1, xp)
+        h2  = e2*xp.cos(lat1)**2/(1-e2)
+        t   = xp.tan(lat1)
+        t2  = t**2
+        t4  = t2*t2
+        t6  = t4*t2
+        h22 = h2**2
+        h23 = h22*h2
+        h24 = h23*h2
+
+        E0  = E/ko/RN
+        E1  = E0
+        E2  = E0**3/6.*(1+2*t2+h2)
+        E3  = E0**5/120.*(5+6*h2+28*t2-3*h22+8*t2*h2+24*t4-4*h23+4*t2*h22+24*t2*h23)
+        E4  = E0**7/5040.*(61 + 662*t2 + 1320*t4 + 720*t6)
+        lon = (1/xp.cos(lat1))*(E1-E2+E3-E4)+lcm
+
+        E0 = E/ko
+        N1 = (t*E0**2)/(2*RM*RN)
+        N2 = (t*E0**4)/(24*RM*RN**3)*(5+3.*t2+h2-4*h22-9*h2*t2)
+        N3 = (t*E0**6)/(720*RM*RN**5)*(61-90*t2+46*h2+45*t4-252*t2*h2-5*h22+100*h23-66*t2*h22-90*t4*h2+88*h24+225*t4*h22+84*t2*h23-192*t2*h24)
+        N4 = (t*E0**8)/(40320*RM*RN**7)*(1385+3633*t2+4095*t4+1575*t6)
+        return lat1-N1+N2-N3+N4, lon
+
+    def forward(self, lat, lon, lcm=None):
+        """Ellipsoidal coordinates to UTM.
+
+            Points with latitude <= 0 get a false northing of 1e7 meters, as
+            in ell2utm.
+
+            Args:
+                lat (float or numpy.array): latitude in radians
+                lon (float or numpy.array): longtitude in radians
+                lcm (float or numpy.array): central meridian in radians; if not
+                                            given, the zone's one is used.
+
+            Returns:
+                tuple (float, float): Northing and Easting in meters (arrays
+                                      if the input is arrays).
+
+            Raises:
+                RuntimeError: if neither the instance has a zone nor lcm is
+                              given.
+        """
+        if lcm is None: lcm = self.lcm
+        if lcm is None:
+            raise RuntimeError('[ERROR] No central meridian for UTM projection')
+        if numpy.ndim(lat) == 0 and numpy.ndim(lon) == 0 and numpy.ndim(lcm) == 0:
+            ## single point; plain floats and math are a lot faster here
+            lat, lon = float(lat), float(lon)
+            No  = 0e0 if lat > 0 else self.No
+            lam = lon-float(lcm)
+            if lam >= pi: lam = lam - pi*2
+            N, E = self._forward_series(lat, lam, math)
+            return No+N, E
+        lat = numpy.asarray(lat, dtype=float)
+        lon = numpy.asarray(lon, dtype=float)
+        No  = numpy.where(lat > 0, 0e0, self.No)
+        lam = lon-lcm
+        lam = numpy.where(lam >= pi, lam - pi*2, lam)
+        N, E = self._forward_series(lat, lam, numpy)
+        return No+N, E
+
+    def inverse(self, E, N, zone=None, lcm=None):
+        """UTM to ellipsoidal coordinates.
+
+            The footpoint latitude is computed via a Newton iteration, run on
+            all points at once (each point is iterated until its own correction
+            is small enough).
+
+            Args:
+                E (float or numpy.array)   : Easting in meters
+                N (float or numpy.array)   : Northing in meters
+                zone (int or numpy.array)  : the zone (negative for the
+                                             southern hemisphere); if not
+                                             given, the instance's zone is
+                                             used.
+                lcm (float or numpy.array) : central meridian in radians; if
+                                             not given, it is computed from
+                                             the zone.
+
+            Returns:
+                tuple (float, float): first is latitude and second is
+                                      longtitude, both in radians (arrays if
+                                      the input is arrays).
+
+            Raises:
+                RuntimeError: if no zone is available (neither passed in, nor
+                              set for the instance).
+        """
+        if zone is None: zone = self.zone
+        if zone is None:
+            raise RuntimeError('[ERROR] No zone for UTM projection')
+        if lcm is None or (numpy.ndim(lcm) == 0 and not lcm):
+            if zone is self.zone and self.lcm is not None:
+                lcm = self.lcm
+            elif numpy.ndim(zone) == 0:
+                lcm = radians(abs(zone)*6-183)
+            else:
+                lcm = numpy.radians(numpy.abs(zone)*6-183)
+        ko = self.ko
+
+        if numpy.ndim(E) == 0 and numpy.ndim(N) == 0 and numpy.ndim(zone) == 0:
+            ## single point; plain floats and math are a lot faster here
+            N = float(N) - (self.No if zone < 0 else 0e0)
+            E = float(E) - self.Eo
+            lat1 = N/ko/self._a
+            dlat = 1
+            while abs(dlat) > 1e-12:
+                dlat = self._newton_step(lat1, N, math)
+                lat1 = lat1+dlat
+            return self._inverse_series(lat1, E, float(lcm), math)
+
+        No  = numpy.where(numpy.asarray(zone) < 0, self.No, 0e0) # False northing (south/north)
+        N   = numpy.atleast_1d(numpy.asarray(N, dtype=float))-No
+        E   = numpy.atleast_1d(numpy.asarray(E, dtype=float))-self.Eo
+        N, E = numpy.broadcast_arrays(N, E)
+        lat1 = N/ko/self._a
+        ## points still iterated
+        active = numpy.ones(lat1.shape, dtype=bool)
+        while active.any():
+            l1 = lat1[active]
+            dlat = self._newton_step(l1, N[active], numpy)
+            lat1[active] = l1+dlat
+            active[active] = numpy.abs(dlat) > 1e-12
+        return self._inverse_series(lat1, E, lcm, numpy)
+
+##  Zone-less projections, one per ellipsoid (a, f), used by ell2utm and
+##+ utm2ell so that the ellipsoid constants are only computed once.
+_projections = {}
+
+def _projection(ell):
+    key = (ell.a, ell.f)
+    if key not in _projections:
+        _projections[key] = UTMProjection(None, ell)
+    return _projections[key]
+
 def utm2ell(E, N, zone, ell=Ellipsoid("wgs84"), lcm=None):
     '''UTM to ellipsoidal coordinates.
 
         Convert UTM coordinates (i.e. Easting and Northing) to ellipsoidal
         coordinates (actualy latitude and longtitude).
+        E, N (and zone) can also be (equally sized) numpy arrays, in which
+        case all points are transformed in one go and the returned latitude
+        and longtitude are arrays too. See also UTMProjection, for repeated
+        transformations within the same zone.
 
         Args:
-            E (float): Easting in meters
-            N (float): Northing in meters
-            zone (int): the zone in degrees (?)
+            E (float or numpy.array): Easting in meters
+            N (float or numpy.array): Northing in meters
+            zone (int or numpy.array): the zone in degrees (?)
             ell (Ellipsoid): the ellipsoid of choice
             lcm: central meridian (?)
 
         Returns:
             tuple (float, float): first is latitude and second is longtitude,
-                                  both in degrees.
+                                  both in radians.
     '''
-    if not lcm:
-        lcm = radians(abs(zone)*6-183)
-
-    f   = ell.f
-    a   = ell.a
-    e2  = ell.eccentricity_squared()
-    e22 = e2*e2
-    e23 = e22*e2
-    e24 = e23*e2
-
-    No = 0           # False northing (north)
-    if zone < 0:
-        No = 1e7     # False northing (south)
-    Eo   = 500000    # False easting
-    N    = N-No
-    E    = E-Eo
-    Zone = abs(zone) # Remove negative zone indicator for southern hemisphere
-    ko   = 0.9996    # UTM scale factor
-    lat1 = N/ko/a
-    dlat = 1
-    while abs(dlat) > 1e-12:
-        A0=1-(e2/4)-(e22*3/64.0)-(e23*5/256.0)-(e24*175/16384.0)
-        A2=(3/8.0)*( e2+(e22/4.0)+(e23*15/128.0)-(e24*455/4096.0) )
-        A4=(15/256.0)*( e22+(e23*3/4.0)-(e24*77/128.0) )
-        A6=(35/3072.0)*( e23-(e24*41/32.0) )
-        A8=-(315/131072.0)*e24
-        f1=a*( A0*lat1-A2*sin(2*lat1)+A4*sin(4*lat1)-A6*sin(6*lat1)+A8*sin(8*lat1) )-N/ko
-        f2=a*( A0-2*A2*cos(2*lat1)+4*A4*cos(4*lat1)-6*A6*cos(6*lat1)+8*A8*cos(8*lat1) )
-        dlat=-f1/f2
-        lat1=lat1+dlat
-    RN  = ell.N(lat1)
-    RM  = ell.M(lat1)
-    h2  = e2*pow(cos(lat1),2)/(1-e2)
-    t   = tan(lat1)
-    t2  = pow(t,2)
-    t4  = t2*t2
-    t6  = t4*t2
-    h22 = pow(h2,2)
-    h23 = h22*h2
-    h24 = h23*h2
-
-    E0  = E/ko/RN
-    E1  = E0
-    E2  = pow(E0,3)/6.*(1+2*t2+h2)
-    E3  = pow(E0,5)/120.*(5+6*h2+28*t2-3*h22+8*t2*h2+24*t4-4*h23+4*t2*h22+24*t2*h23)
-    E4  = pow(E0,7)/5040.*(61 + 662*t2 + 1320*t4 + 720*t6)
-    lon = (1/cos(lat1))*(E1-E2+E3-E4)+lcm
-
-    E0 = E/ko
-    N1 = (t*pow(E0,2))/(2*RM*RN)
-    N2 = (t*pow(E0,4))/(24*RM*pow(RN,3))*(5+3.*t2+h2-4*h22-9*h2*t2)
-    N3 = (t*pow(E0,6))/(720*RM*pow(RN,5))*(61-90*t2+46*h2+45*t4-252*t2*h2-5*h22+100*h23-66*t2*h22-90*t4*h2+88*h24+225*t4*h22+84*t2*h23-192*t2*h24)
-    N4 = (t*pow(E0,8))/(40320*RM*pow(RN,7))*(1385+3633*t2+4095*t4+1575*t6)
-    lat= lat1-N1+N2-N3+N4
-    return lat, lon
+    return _projection(ell).inverse(E, N, zone, lcm)
 
 def ell2utm(lat, lon, ell=Ellipsoid("wgs84"), zone=None, lcm=None):
     """Ellipsoidal coordinates to UTM.
@@ -106,10 +339,14 @@ def ell2utm(lat, lon, ell=Ellipsoid("wgs84"), zone=None, lcm=None):
         If zone is passed in, then it is used for the computation; else, zone
         is computed within the function. The actual zone value used within the
         function is returned in the returned tuple.
+        lat and lon can also be (equally sized) numpy arrays, in which case
+        all points are transformed in one go and the returned Northing,
+        Easting and Zone are arrays too. See also UTMProjection, for repeated
+        transformations within the same zone.
 
         Args:
-            lat (float): latitude in radians
-            lon (float): longtitude in radians
+            lat (float or numpy.array): latitude in radians
+            lon (float or numpy.array): longtitude in radians
             ell (Ellipsoid): ellipsoid of choice
             zone (int): zone in degrees
             lcm :
@@ -118,72 +355,27 @@ def ell2utm(lat, lon, ell=Ellipsoid("wgs84"), zone=None, lcm=None):
             tuple (float, float, int, int): a tuple of type:
                 Northing, Easting, Zone, lcm
     """
-    f  = ell.f
-    a  = ell.a
-    e2 = ell.eccentricity_squared()
+    if numpy.ndim(lat) == 0 and numpy.ndim(lon) == 0:
+        if zone:
+            Zone = zone
+        else:
+            Zone = floor(degrees(lon)/6)+31
+            Zone = Zone + int(Zone<=0)*60 - int(Zone>60)*60
+        lcm = radians(Zone*6-183)
+        N, E = _projection(ell).forward(lat, lon, lcm)
+        if not lat > 0: Zone *= -1e0
+        return N, E, Zone, lcm
 
+    lat = numpy.asarray(lat, dtype=float)
+    lon = numpy.asarray(lon, dtype=float)
     if zone:
         Zone = zone
     else:
-        Zone = floor(degrees(lon)/6)+31
-        Zone = Zone + int(Zone<=0)*60 - int(Zone>60)*60
-    lcm = radians(Zone*6-183)
-
-    ko = 0.9996   # Scale factor
-    if lat > 0:
-        No = 0    # False northing (north)
-    else:
-        No = 1e7  # False northing (south)
-        Zone *= -1e0
-    Eo = 500000   # False easting
-
-    lam = lon-lcm
-    if lam >= pi: lam = lam - pi*2
-
-    RN = ell.N(lat)
-    RM = ell.M(lat)
-
-    coslat = cos(lat)
-    sinlat = sin(lat)
-    h2     = e2*coslat*coslat/(1-e2)
-    t      = tan(lat)
-    n      = f/(2-f)
-
-    # powers of various values
-    n2   = pow(n,2)
-    n3   = n2*n
-    n4   = n3*n
-    t2   = pow(t,2)
-    t3   = t2*t
-    t4   = t3*t
-    t6   = t4*t2
-    h22  = pow(h2,2)
-    h23  = h22*h2
-    h24  = h23*h2
-
-    A0 = 1+n2/4.0+n4/64.0
-    A2 = 3.0/2.0*(n-n3/8)
-    A4 = 15.0/16.0*(n2-n4/4)
-    A6 = 35.0/48.0*n3
-    A8 = 315.0/512.0*n4
-    S  = a/(1+n)*(A0*lat-A2*sin(2*lat)+A4*sin(4*lat)-A6*sin(6*lat)+A8*sin(8*lat))
-
-    E1   = lam*coslat
-    E2   = pow(lam,3)*pow(coslat,3)/6*(1-t2+h2)
-    E3   = pow(lam,5)*pow(coslat,5)/120*(5-18*t2+t4+14*h2-58*t2*h2+
-               13*h22+4*h23-64*t2*h22-24*t2*h23)
-    E4   = pow(lam,7)*pow(coslat,7)/5040*(61-479*t2+179*t4-t4*t2)
-    E    = Eo+ko*RN*(E1+E2+E3+E4)
-
-    N1 = S/RN
-    N2 = pow(lam,2)/2*sinlat*coslat;
-    N3 = pow(lam,4)/24*sinlat*pow(coslat,3)*(5-t2+9*h2+4*h22)
-    N4 = pow(lam,6)/720*sinlat*pow(coslat,5)*(61-58*t2+t4+
-            270*h2-330*t2*h2+445*h22+324*h23-680*t2*h22+
-            88*h24-600*t2*h23-192*t2*h24)
-    N5 = pow(lam,8)/40320*sinlat*pow(coslat,7)*(1385-311*t2+543*t4-t6)
-    N = No+ko*RN*(N1+N2+N3+N4+N5)
-
+        Zone = numpy.floor(numpy.degrees(lon)/6)+31
+        Zone = Zone + (Zone<=0)*60 - (Zone>60)*60
+    lcm = numpy.radians(Zone*6-183)
+    N, E = _projection(ell).forward(lat, lon, lcm)
+    Zone = numpy.where(lat > 0, Zone, Zone*-1e0)
     return N, E, Zone, lcm
 
 if __name__ == "__main__":
@@ -210,3 +402,22 @@ if __name__ == "__main__":
             print('\tdlat={} dlon={} in decimal degrees'.format(degrees(abs(clat-lats[i])), degrees(abs(clon-lons[i]))))
             print('\tdLat={} dLon={} in seconds'.format(degrees(abs(clat-lats[i]))*3600e0, degrees(abs(clon-lons[i]))*3600e0))
             print('\tInput {}, {} output {}, {}'.format(degrees(lats[i]), degrees(lons[i]), degrees(clat), degrees(clon)))
+    # all points in one go (arrays); results must match the ones above
+    print('> Testing all points at once (arrays)')
+    n, e, z, l = ell2utm(numpy.array(lats), numpy.array(lons), ell)
+    clat, clon = utm2ell(e, n, z, ell)
+    for i in range(0, len(lats)):
+        sn, se, sz, sl = ell2utm(lats[i], lons[i], ell)
+        if abs(n[i]-sn)>1e-6 or abs(e[i]-se)>1e-6 or z[i] != sz or abs(l[i]-sl)>1e-12:
+            print('\tERROR Array and scalar ell2utm differ for station #{}'.format(i))
+        if abs(clat[i]-lats[i])>5e-10 or abs(clon[i]-lons[i])>5e-10:
+            print('\tERROR Too big discrepancies (array) for station #{}'.format(i))
+    # a projection object must give the same results as the functions
+    print('> Testing UTMProjection')
+    for i in range(0, len(lats)):
+        sn, se, sz, sl = ell2utm(lats[i], lons[i], ell)
+        proj = UTMProjection(int(sz), ell)
+        n, e = proj.forward(lats[i], lons[i])
+        clat, clon = proj.inverse(e, n)
+        if (n, e) != (sn, se) or (clat, clon) != utm2ell(se, sn, sz, ell):
+            print('\tERROR UTMProjection and ell2utm/utm2ell differ for station #{}'.format(i))
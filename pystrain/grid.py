@@ -168,6 +168,109 @@ class Grid:
     # Python 3.X compatibility
     __next__ = next
 
+    def __len__(self):
+        """Number of cells (aka nodes) in the grid, i.e. xpts*ypts."""
+        return self.xpts * self.ypts
+
+    def xvals(self):
+        """Cell centres on the x-axis, as a numpy.array of size self.xpts."""
+        return self.x_min + self.x_step/2e0 + self.x_step*np.arange(self.xpts, dtype=float)
+
+    def yvals(self):
+        """Cell centres on the y-axis, as a numpy.array of size self.ypts."""
+        return self.y_min + self.y_step/2e0 + self.y_step*np.arange(self.ypts, dtype=float)
+
+    def idx2xyidx(self, idx):
+        """Flat (node) index to x- and y-axis indexes.
+
+            Nodes are numbered in iteration order (see next), i.e. starting
+            from the bottom left cell, x-axis first; hence the flat index of
+            the cell (xidx, yidx) is yidx*self.xpts + xidx.
+
+            Args:
+                idx (int or numpy.array): the flat index; should be in range
+                                          [0, self.xpts*self.ypts)
+
+            Returns:
+                tuple (int, int) or (numpy.array, numpy.array): the x- and
+                y-axis indexes.
+        """
+        assert np.all(np.asarray(idx) >= 0) and np.all(np.asarray(idx) < len(self))
+        yidx, xidx = np.divmod(idx, self.xpts)
+        return xidx, yidx
+
+    def xyidx2idx(self, xidx, yidx):
+        """x- and y-axis indexes to flat (node) index; see idx2xyidx.
+
+            Args:
+                xidx (int or numpy.array): x-axis index in range [0, self.xpts)
+                yidx (int or numpy.array): y-axis index in range [0, self.ypts)
+
+            Returns:
+                int or numpy.array: the flat index(es).
+        """
+        assert np.all(np.asarray(xidx) >= 0) and np.all(np.asarray(xidx) < self.xpts)
+        assert np.all(np.asarray(yidx) >= 0) and np.all(np.asarray(yidx) < self.ypts)
+        return yidx * self.xpts + xidx
+
+    def nodes(self, idx):
+        """Cell centres for a set of flat (node) indexes.
+
+            The returned values are exactly the ones produced when iterating
+            through the grid.
+
+            Args:
+                idx (numpy.array): flat indexes, in range
+                                   [0, self.xpts*self.ypts); see idx2xyidx.
+
+            Returns:
+                tuple (numpy.array, numpy.array): x and y coordinates of the
+                cell centres.
+        """
+        xidx, yidx = self.idx2xyidx(np.asarray(idx, dtype=int))
+        return self.xvals()[xidx], self.yvals()[yidx]
+
+    def centres(self, start=0, stop=None):
+        """Cell centres (as arrays) for a range of flat (node) indexes.
+
+            With no arguments, all cell centres are returned, in iteration
+            order.
+
+            Args:
+                start (int): first flat index of the range.
+                stop (int) : one past the last flat index of the range; if
+                             not given, the range extends to the last node.
+
+            Returns:
+                tuple (numpy.array, numpy.array): x and y coordinates of the
+                cell centres, in iteration order.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        return self.nodes(np.arange(start, stop, dtype=int))
+
+    def split(self, n, strided=False):
+        """Split the grid's nodes into n chunks.
+
+            Each chunk is an array of flat (node) indexes, so that the cell
+            centres can be get via nodes() and results written back by index.
+            Chunks are either contiguous (ranges of flat indexes, with sizes
+            differing by at most one) or strided (chunk k holds nodes k, k+n,
+            k+2n, ...), which usually spreads the expensive parts of a region
+            more evenly between chunks.
+
+            Args:
+                n (int)       : number of chunks; if larger than the number of
+                                nodes, some of the chunks will be empty.
+                strided (bool): if True return strided chunks, else contiguous.
+
+            Returns:
+                list of numpy.array: the flat indexes for each chunk.
+        """
+        assert n > 0
+        if strided:
+            return [ np.arange(k, len(self), n, dtype=int) for k in range(n) ]
+        return np.array_split(np.arange(len(self), dtype=int), n)
+
 def generate_grid(sta_lst, x_step, y_step, sta_lst_to_deg=False):
     """Grid generator.
 
@@ -253,3 +356,14 @@ if __name__ == "__main__":
     dummy = np.arange(grd.y_min+grd.y_step/2e0, grd.y_max, grd.y_step)
     assert len(dummy) == grd.ypts
     assert grd.xpts*grd.ypts == idx
+    # array versions must match the iteration (exactly)
+    x, y = grd.centres()
+    assert all(a == (b, c) for a, b, c in zip(grd, x, y))
+    for n in [1, 3, 7, 100]:
+        for strided in [False, True]:
+            chunks = grd.split(n, strided)
+            assert sorted(np.concatenate(chunks).tolist()) == list(range(len(grd)))
+    xidx, yidx = grd.idx2xyidx(np.arange(len(grd)))
+    assert (grd.xyidx2idx(xidx, yidx) == np.arange(len(grd))).all()
+    assert grd.xyidx2idx(*grd.idx2xyidx(5)) == 5
+    assert grd.centres(3, 9)[0].tolist() == x[3:9].tolist()
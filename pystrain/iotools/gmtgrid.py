@@ -0,0 +1,195 @@
+#! /usr/bin/python
+#-*- coding: utf-8 -*-
+
+from __future__ import print_function
+import struct
+import numpy
+
+##  The (fixed-size, 892 bytes) header of a GMT native binary grid: number of
+##+ columns and rows and the registration (int32), west, east, south, north,
+##+ z_min, z_max, x_inc, y_inc, z_scale_factor and z_add_offset (float64),
+##+ followed by the x-, y- and z-units, the title (80 chars each), the
+##+ command (320 chars) and a remark (160 chars). The header (and data) are
+##+ written little-endian; there is no padding between the ints and floats.
+GMT_GRID_HEADER_FMT = '<3i10d80s80s80s80s320s160s'
+GMT_GRID_HEADER_SIZE = struct.calcsize(GMT_GRID_HEADER_FMT)
+
+##  Registration codes (GMT): gridline (nodes on the grid lines) or pixel
+##+ (nodes at the cell centres).
+GMT_GRID_NODE_REG = 0
+GMT_GRID_PIXEL_REG = 1
+
+def _str80(s, size=80):
+    return s.encode('ascii', 'replace')[:size-1]
+
+class GmtGridWriter:
+    """Write values on a Grid as a GMT native binary float grid (aka '=bf'),
+        a range of nodes at a time.
+
+        The values are given at the cell centres of the grid, in grid
+        (iteration) order (see pystrain.grid.Grid), so the GMT grid is pixel
+        registered, with region and increment taken from the Grid. Missing
+        values should be NaN; nodes never written are NaN too. GMT reads the
+        file as e.g. 'filename=bf'.
+        Each range of values is written at its place in the file as soon as
+        it is passed in (GMT stores rows from north to south, while the Grid
+        starts from the south), so only the values passed in are kept in
+        memory; the header (with the z-range of all values written) is
+        completed when the instance is closed.
+
+        Attributes:
+            filename (str): the grid file.
+    """
+
+    def __init__(self, filename, grd, title='', z_units='', command='', remark=''):
+        """GmtGridWriter constructor; creates the (all NaN) grid file.
+
+            Args:
+                filename (str)     : the file to write.
+                grd (pystrain.grid.Grid): the grid.
+                title (str)        : the grid's title.
+                z_units (str)      : units of the values.
+                command (str)      : the command that produced the grid.
+                remark (str)       : any remark.
+        """
+        self.filename = filename
+        self._grd = grd
+        self._labels = (_str80(z_units), _str80(title),
+            _str80(command, 320), _str80(remark, 160))
+        self._z_range = (numpy.inf, -numpy.inf)
+        self._fout = open(filename, 'w+b')
+        self._write_header()
+        row = numpy.full(grd.xpts, numpy.nan, dtype='<f4').tobytes()
+        for _ in range(grd.ypts):
+            self._fout.write(row)
+
+    def _write_header(self):
+        grd = self._grd
+        z_min, z_max = self._z_range
+        if z_min > z_max: z_min, z_max = numpy.nan, numpy.nan
+        self._fout.seek(0)
+        self._fout.write(struct.pack(GMT_GRID_HEADER_FMT, grd.xpts, grd.ypts,
+            GMT_GRID_PIXEL_REG, grd.x_min, grd.x_min + grd.xpts*grd.x_step,
+            grd.y_min, grd.y_min + grd.ypts*grd.y_step, z_min, z_max, grd.x_step,
+            grd.y_step, 1e0, 0e0, _str80('longitude [degrees_east]'),
+            _str80('latitude [degrees_north]'), *self._labels))
+
+    def write(self, start, values):
+        """Write the values of a range of (consecutive) grid nodes.
+
+            Args:
+                start (int)         : flat index of the first node (see
+                                      pystrain.grid.Grid.idx2xyidx).
+                values (numpy.array): the values of nodes start, start+1, ...
+
+            Raises:
+                RuntimeError: if the nodes are not within the grid.
+        """
+        grd = self._grd
+        values = numpy.asarray(values, dtype='<f4').ravel()
+        stop = start + values.size
+        if start < 0 or stop > len(grd):
+            raise RuntimeError('[ERROR] Nodes [{:}, {:}) out of the grid ({:} nodes)'.format(start, stop, len(grd)))
+        valid = values[~numpy.isnan(values)]
+        if valid.size:
+            self._z_range = (min(self._z_range[0], float(valid.min())),
+                max(self._z_range[1], float(valid.max())))
+        ##  one (part of a) row at a time; row iy is the (ypts-1-iy)-th in the
+        ##+ file
+        node = start
+        while node < stop:
+            iy, ix = divmod(node, grd.xpts)
+            n = min(stop, (iy+1)*grd.xpts) - node
+            self._fout.seek(GMT_GRID_HEADER_SIZE + 4*((grd.ypts-1-iy)*grd.xpts + ix))
+            self._fout.write(values[node-start:node-start+n].tobytes())
+            node += n
+
+    def close(self):
+        """Complete the header and close the grid file."""
+        if self._fout:
+            self._write_header()
+            self._fout.close()
+            self._fout = None
+
+def write_gmt_grid(filename, grd, values, title='', z_units='', command='', remark=''):
+    """Write values on a Grid as a GMT native binary float grid (aka '=bf').
+
+        The values of all nodes are written at once, see GmtGridWriter.
+
+        Args:
+            filename (str)     : the file to write.
+            grd (pystrain.grid.Grid): the grid.
+            values (numpy.array): len(grd) values, in grid order.
+            title (str)        : the grid's title.
+            z_units (str)      : units of the values.
+            command (str)      : the command that produced the grid.
+            remark (str)       : any remark.
+
+        Raises:
+            RuntimeError: if the number of values does not match the grid.
+    """
+    values = numpy.asarray(values, dtype='<f4')
+    if values.size != grd.xpts*grd.ypts:
+        raise RuntimeError('[ERROR] Expected {:} values for the grid, got {:}'.format(grd.xpts*grd.ypts, values.size))
+    writer = GmtGridWriter(filename, grd, title, z_units, command, remark)
+    writer.write(0, values)
+    writer.close()
+
+def read_gmt_grid(filename):
+    """Read a GMT native binary float grid (aka '=bf'), as written by
+        write_gmt_grid (or GmtGridWriter).
+
+        Args:
+            filename (str): the grid file.
+
+        Returns:
+            tuple: a dictionary with the header fields (nx, ny, registration,
+                   west, east, south, north, z_min, z_max, x_inc, y_inc, and
+                   the strings x_units, y_units, z_units, title, command,
+                   remark) and a (ny, nx) numpy.array with the values; rows
+                   are stored from north to south, as in the file.
+
+        Raises:
+            RuntimeError: if the file size does not match the header.
+    """
+    with open(filename, 'rb') as fin:
+        fields = struct.unpack(GMT_GRID_HEADER_FMT, fin.read(GMT_GRID_HEADER_SIZE))
+        names = ['nx', 'ny', 'registration', 'west', 'east', 'south', 'north',
+            'z_min', 'z_max', 'x_inc', 'y_inc', 'z_scale_factor',
+            'z_add_offset', 'x_units', 'y_units', 'z_units', 'title',
+            'command', 'remark']
+        header = dict(zip(names, fields))
+        for key in names[-6:]:
+            header[key] = header[key].split(b'\0', 1)[0].decode('ascii')
+        data = numpy.frombuffer(fin.read(), dtype='<f4')
+    if data.size != header['nx']*header['ny']:
+        raise RuntimeError('[ERROR] Invalid GMT native grid file: {:}'.format(filename))
+    return header, data.reshape(header['ny'], header['nx'])
+
+if __name__ == "__main__":
+    import os, tempfile
+    from pystrain.grid import Grid
+    grd = Grid(20e0, 22e0, .5e0, 35e0, 36.5e0, .5e0)
+    values = numpy.arange(len(grd), dtype=float)
+    values[1] = numpy.nan
+    filename = os.path.join(tempfile.mkdtemp(), 'test.grd')
+    write_gmt_grid(filename, grd, values, 'test', 'nstrain/yr')
+    header, data = read_gmt_grid(filename)
+    assert os.path.getsize(filename) == 892 + 4*len(grd)
+    assert header['nx'] == grd.xpts and header['ny'] == grd.ypts
+    assert header['east'] == 22e0 and header['north'] == 36.5e0
+    assert header['z_min'] == 0e0 and header['z_max'] == len(grd)-1
+    ##  first row of the file is the northmost one
+    assert data[0,0] == values[(grd.ypts-1)*grd.xpts] and numpy.isnan(data[-1,1])
+    ##  the same grid, written in (unaligned) ranges of nodes
+    writer = GmtGridWriter(filename + '2', grd, 'test', 'nstrain/yr')
+    for start in range(0, len(grd), 5):
+        writer.write(start, values[start:start+5])
+    writer.close()
+    with open(filename, 'rb') as f1, open(filename + '2', 'rb') as f2:
+        assert f1.read() == f2.read()
+    os.remove(filename + '2')
+    print('Grid {:}x{:}, region {:}/{:}/{:}/{:}, title: {:}'.format(header['nx'],
+        header['ny'], header['west'], header['east'], header['south'],
+        header['north'], header['title']))
+    os.remove(filename)
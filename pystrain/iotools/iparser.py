@@ -1,6 +1,30 @@
-from pystrain.station import Station
+from math import pi
+import numpy
+from pystrain.station import Station, StationArray
 
-def parse_ascii_input(filename, zero_std_is_error=False):
+##  Number of (leading) fields used from each line of an input file, aka
+##+ "name lon lat Ve Vn Se Sn RHO T"; any other fields are ignored.
+INPUT_FIELDS = 9
+
+def _first_duplicates(keys, skip=None):
+  """For each key, the index of its first occurrence in keys.
+
+      Args:
+          keys (numpy.array): a 1-d array of (hashable/sortable) keys.
+          skip (numpy.array): a boolean mask; keys where skip is True are
+                              considered unique (i.e. they never match).
+
+      Returns:
+          numpy.array: index of the first occurrence of each key (equal to the
+                       key's own index if it has not occurred before).
+  """
+  _, first, inverse = numpy.unique(keys, return_index=True, return_inverse=True)
+  firsts = first[inverse.ravel()]
+  if skip is not None:
+    firsts = numpy.where(skip, numpy.arange(len(keys)), firsts)
+  return firsts
+
+def parse_ascii_input(filename, zero_std_is_error=False, as_array=False):
   """Parse station info from an input file.
 
       This function will try to read Stations of from the input file, named
@@ -13,32 +37,76 @@ def parse_ascii_input(filename, zero_std_is_error=False):
       Station.init_from_ascii_line()
       Station.Station() --aka the constructor--.
 
+      The file is read in one go and each field is converted to a (numpy)
+      column. Duplicate names and coordinates are detected by sorting (see
+      numpy.unique), not by comparing each station to all previous ones; the
+      error raised is the one for the first invalid line, as if stations
+      were checked one at a time, in the order they appear in the file.
+
       Args:
           filename (string): the name of the file holding station info (see
                              description above).
           zero_std_is_error (bool): if set to True, then the function will throw
                              if a station has zero std. deviation for either the
                              north or east component (or both)
+          as_array (bool): if set to True, the stations are returned as a
+                             StationArray instead of a list of Stations
 
       Returns:
-          list of Station instances or None (if no station was read)
+          list of Station instances (or a StationArray if as_array is True)
+          or None (if no station was read)
 
+      Raises:
+          ValueError: if a station has zero std. deviation (and
+                      zero_std_is_error is set), or is a (possible) duplicate
+                      of a previous one.
+          RuntimeError: if a line cannot be resolved (see
+                      Station.init_from_ascii_line).
   """
-  stations = []
   with open(filename) as fin:
-    for line in fin.readlines():
-      # stations.append(Station(line))
-      nSta=Station(line)
-      if zero_std_is_error and (nSta.sn==0e0 or nSta.se==0e0):
-        raise ValueError('[ERROR] Zero std. deviation not allowed! station is: {:}'.format(nSta.name))
-      ## check that the station is not a duplicate
-      for sta in stations:
-        if sta.name == nSta.name:
-          raise ValueError('[ERROR] Duplicate record found in input file for station {:}'.format(sta.name))
-        if sta.lat==nSta.lat and sta.lon==nSta.lon:
-          raise ValueError('[ERROR] Exact coordinate match for stations {:} and {:}. Possible duplicate!'.format(sta.name, nSta.name))
-      stations.append(nSta)
-  if len(stations):
-    return stations
+    lines = fin.read().split('\n')
+  if lines[-1] == '': lines.pop()
+  fields = [ line.split() for line in lines ]
+  ##  Index of the first line that can not be resolved (if any); all lines
+  ##+ before it are valid.
+  bad = next((i for i, f in enumerate(fields) if len(f) < INPUT_FIELDS), len(fields))
+  try:
+    cols = numpy.array([ f[1:INPUT_FIELDS] for f in fields[:bad] ], dtype=float).reshape(-1, INPUT_FIELDS-1)
+  except ValueError:
+    for i, f in enumerate(fields[:bad]):
+      try:
+        [ float(v) for v in f[1:INPUT_FIELDS] ]
+      except ValueError:
+        bad = i
+        break
+    cols = numpy.array([ f[1:INPUT_FIELDS] for f in fields[:bad] ], dtype=float).reshape(-1, INPUT_FIELDS-1)
+  n = bad
+  sta = StationArray(name=numpy.array([ f[0] for f in fields[:n] ], dtype=str),
+    lon=cols[:,0]*(pi/180e0), lat=cols[:,1]*(pi/180e0), ve=cols[:,2]/1e3,
+    vn=cols[:,3]/1e3, se=cols[:,4]/1e3, sn=cols[:,5]/1e3, rho=cols[:,6]/1e3,
+    t=cols[:,7])
+  ##  Stations with zero std. deviations, duplicate names and (exact)
+  ##+ duplicate coordinates; for the latter two, the index of the first
+  ##+ station with the same name (or coordinates). Coordinates with NaNs
+  ##+ never match and -0 matches 0 (as with float comparisons).
+  zero_std = ((sta.sn == 0e0) | (sta.se == 0e0)) if zero_std_is_error else numpy.zeros(n, dtype=bool)
+  first_name = _first_duplicates(sta.name) if n else numpy.zeros(0, dtype=int)
+  crd = numpy.ascontiguousarray(numpy.column_stack((sta.lat, sta.lon)) + 0e0)
+  first_crd = _first_duplicates(crd.view('V16').ravel(), numpy.isnan(crd).any(axis=1)) if n else numpy.zeros(0, dtype=int)
+  index = numpy.arange(n)
+  invalid = numpy.nonzero(zero_std | (first_name < index) | (first_crd < index))[0]
+  if invalid.size:
+    i = invalid[0]
+    if zero_std[i]:
+      raise ValueError('[ERROR] Zero std. deviation not allowed! station is: {:}'.format(sta.name[i]))
+    ##  the first previous station matching either the name or coordinates
+    if first_name[i] <= first_crd[i]:
+      raise ValueError('[ERROR] Duplicate record found in input file for station {:}'.format(sta.name[first_name[i]]))
+    raise ValueError('[ERROR] Exact coordinate match for stations {:} and {:}. Possible duplicate!'.format(sta.name[first_crd[i]], sta.name[i]))
+  if bad < len(lines):
+    ## let Station report (and raise for) the invalid line
+    Station(lines[bad])
+  if n:
+    return sta if as_array else sta.to_list()
   else:
     return None
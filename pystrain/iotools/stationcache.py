@@ -0,0 +1,104 @@
+#! /usr/bin/python
+#-*- coding: utf-8 -*-
+
+from __future__ import print_function
+import os
+import hashlib
+import shutil
+import tempfile
+import numpy
+from pystrain.station import load_station_array
+from pystrain.iotools.iparser import parse_ascii_input
+
+##  Version of the station cache layout; part of every cache key, so that a
+##+ new layout never reads an old one.
+STATION_CACHE_VERSION = 1
+
+class StationCache:
+    """A (content-addressed) on-disk cache of a parsed station input file.
+
+        The stations parsed from an input file (see parse_ascii_input) are
+        stored under a directory named after the SHA-256 hash of the file's
+        contents (and the parsing options), in the memory-mappable layout of
+        StationArray.dump. Projected (UTM) coordinates of all stations are
+        stored next to them, one file per zone and ellipsoid. Any change of
+        the input file changes the key, so a stale entry is never used;
+        entries are written atomically, so that any number of runs can share
+        the same cache directory.
+
+        Attributes:
+            cache_dir (str): the (top-level) cache directory.
+            key (str)      : the cache key of the input file.
+            path (str)     : the directory of this entry.
+    """
+
+    def __init__(self, cache_dir, filename, zero_std_is_error=False):
+        """StationCache constructor; computes the key of the input file.
+
+            Args:
+                cache_dir (str): the cache directory (created if needed).
+                filename (str) : the station input file.
+                zero_std_is_error (bool): see parse_ascii_input.
+        """
+        sha = hashlib.sha256()
+        sha.update('{:} {:}\n'.format(STATION_CACHE_VERSION, bool(zero_std_is_error)).encode('ascii'))
+        with open(filename, 'rb') as fin:
+            for block in iter(lambda: fin.read(1<<20), b''):
+                sha.update(block)
+        self.cache_dir = cache_dir
+        self.filename = filename
+        self.zero_std_is_error = zero_std_is_error
+        self.key = sha.hexdigest()
+        self.path = os.path.join(cache_dir, self.key)
+        if not os.path.isdir(cache_dir): os.makedirs(cache_dir)
+
+    def stations(self):
+        """The stations of the input file (as a StationArray).
+
+            On a cache hit, the (read-only) columns are memory-mapped from the
+            cache; else the file is parsed (see parse_ascii_input) and the
+            stations are stored in the cache.
+
+            Returns:
+                StationArray: the stations, or None (if no station was read).
+
+            Raises:
+                see parse_ascii_input.
+        """
+        if os.path.isdir(self.path):
+            return load_station_array(self.path)
+        sta_list = parse_ascii_input(self.filename, self.zero_std_is_error, as_array=True)
+        if sta_list is None: return None
+        tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+        try:
+            sta_list.dump(tmp_dir)
+            os.rename(tmp_dir, self.path)
+        except OSError:
+            ## e.g. another process stored the same entry meanwhile
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return sta_list
+
+    def utm(self, sta_list, utm_proj):
+        """UTM coordinates of (all) the stations.
+
+            Args:
+                sta_list (StationArray): the stations, as returned by
+                                         stations (ellipsoidal coordinates).
+                utm_proj (UTMProjection): the projection (zone and ellipsoid).
+
+            Returns:
+                tuple (numpy.array, numpy.array): Northings and Eastings of
+                the stations (see UTMProjection.forward).
+        """
+        tag = hashlib.sha256(repr((utm_proj.zone, utm_proj.a, utm_proj.f)).encode('ascii')).hexdigest()[:16]
+        filename = os.path.join(self.path, 'utm-{:}.npy'.format(tag))
+        if os.path.isfile(filename):
+            N, E = numpy.asarray(numpy.load(filename, mmap_mode='r'))
+            return N, E
+        N, E = utm_proj.forward(sta_list.lat, sta_list.lon)
+        if os.path.isdir(self.path):
+            fd, tmp_file = tempfile.mkstemp(suffix='.npy', dir=self.path)
+            with os.fdopen(fd, 'wb') as fout:
+                numpy.save(fout, numpy.vstack((N, E)))
+            os.rename(tmp_file, filename)
+        return N, E
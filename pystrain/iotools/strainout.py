@@ -0,0 +1,277 @@
+#! /usr/bin/python
+#-*- coding: utf-8 -*-
+
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import numpy
+from pystrain.strain import STRAIN_DETAILS_COLUMNS, NODE_RESULT_DTYPE, \
+    NODE_ESTIMATED, format_details
+
+##  Version of the (binary) npz strain output format
+STRAIN_NPZ_VERSION = 1
+
+##  Columns stored in the npz strain output: the Strain Tensor details (see
+##+ pystrain.strain.STRAIN_DETAILS_COLUMNS) followed by the estimation
+##+ statistics (number of stations, optimal D, cut-off distance, sigma0).
+STRAIN_NPZ_COLUMNS = STRAIN_DETAILS_COLUMNS + ['nsta', 'd_coef', 'cutoff_dis', 'sigma0']
+
+##  Units of the STRAIN_NPZ_COLUMNS
+STRAIN_NPZ_UNITS = ['deg', 'deg'] + ['mm/yr']*4 + ['deg/Myr']*2 \
+    + ['nstrain/yr']*12 + ['deg.']*2 + ['nstrain/yr']*4 \
+    + ['#', 'km', '#', '/']
+
+def write_strain_header(fout):
+    """Write the (two line) header of the text strain output file.
+
+        Args:
+            fout (output stream): the (already opened) output stream.
+    """
+    print('{:^9s} {:^9s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s}'.format('Latitude', 'Longtitude', 'vx+dvx', 'vy+dvy', 'w+dw', 'exx+dexx', 'exy+dexy', 'eyy+deyy', 'emax+demax', 'emin+demin', 'shr+dshr', 'azi+dazi', 'dilat+ddilat', 'sec. invariant+dsec inv.'), file=fout)
+    print('{:^9s} {:^9s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s} {:^15s}'.format('deg', 'deg', 'mm/yr', 'mm/yr', 'deg/Myr', 'nstrain/yr', 'nstrain/yr', 'nstrain/yr', 'nstrain/yr', 'nstrain/yr', 'nstrain/yr', 'deg.', 'nstrain/yr', 'nstrain/yr'), file=fout)
+
+def write_strain_npz(filename, results):
+    """Write estimation results to a (binary, columnar) npz file.
+
+        Only the results with status NODE_ESTIMATED are written (as in the
+        text output). Each of the STRAIN_NPZ_COLUMNS is stored as a separate
+        (little-endian, float64) array, named after the column. The file
+        also holds the arrays 'version', 'columns' (the column names, in
+        order) and 'units'.
+
+        Args:
+            filename (str): the file to write (numpy appends '.npz' if
+                            missing).
+            results (numpy.array): an array of NODE_RESULT_DTYPE records (see
+                            pystrain.strain).
+    """
+    results = numpy.asarray(results, dtype=NODE_RESULT_DTYPE)
+    est = results[results['status'] == NODE_ESTIMATED]
+    _savez_columns(filename, dict((c, numpy.ascontiguousarray(est[c], dtype='<f8')) for c in STRAIN_NPZ_COLUMNS))
+
+def _savez_columns(filename, cols):
+    """Write the STRAIN_NPZ_COLUMNS arrays in cols (a dictionary, column name
+        to 1-d array; e.g. memory-mapped) to a strain npz file (see
+        write_strain_npz).
+    """
+    numpy.savez(filename, version=numpy.array(STRAIN_NPZ_VERSION),
+        columns=numpy.array(STRAIN_NPZ_COLUMNS), units=numpy.array(STRAIN_NPZ_UNITS),
+        **cols)
+
+def read_strain_npz(filename):
+    """Read a strain npz file, written by write_strain_npz.
+
+        Args:
+            filename (str): the npz file.
+
+        Returns:
+            numpy.array: a structured array, one record per estimated tensor,
+                         with one (float) field per column (named as in
+                         STRAIN_NPZ_COLUMNS); e.g. data['dilat'].
+
+        Raises:
+            RuntimeError: if the file is not a (supported) strain npz file.
+    """
+    with numpy.load(filename) as npz:
+        if 'version' not in npz or int(npz['version']) > STRAIN_NPZ_VERSION:
+            raise RuntimeError('[ERROR] Not a (supported) strain npz file: {:}'.format(filename))
+        columns = [ str(c) for c in npz['columns'] ]
+        data = numpy.empty(len(npz[columns[0]]), dtype=[ (c, 'f8') for c in columns ])
+        for c in columns:
+            data[c] = npz[c]
+    return data
+
+def strain_npz2txt(npz_filename, txt_filename, novar='-'):
+    """Convert a strain npz file to the text strain output layout.
+
+        The text file is identical to the one StrainTensor.py would write
+        for the same results, in text mode.
+
+        Args:
+            npz_filename (str): the npz file (see write_strain_npz).
+            txt_filename (str): the text file to write.
+            novar (str)       : printed in place of missing std. deviations
+                                (see format_details); StrainTensor.py prints
+                                them right-aligned for grid estimates and
+                                left-aligned (aka '-      ') otherwise.
+
+        Returns:
+            int: the number of tensors written.
+    """
+    data = read_strain_npz(npz_filename)
+    details = numpy.column_stack([ data[c] for c in STRAIN_DETAILS_COLUMNS ]) if len(data) else []
+    with open(txt_filename, 'w') as fout:
+        write_strain_header(fout)
+        for row in details:
+            fout.write(format_details(row.tolist(), novar))
+    return len(data)
+
+def write_veis_cache(filename, stations, simplices, results, utm_zone):
+    """Write a triangulation and its per-triangle results to a cache file.
+
+        The cache is a (numpy) npz file; it is used to reuse the results of
+        triangles that have not changed in a later run (see
+        pystrain.strain.match_simplices). The file is written atomically
+        (i.e. to a temporary file, which is then renamed), so that an
+        interrupted run never leaves a truncated cache behind.
+
+        Args:
+            filename (str): the file to write, named exactly so (no '.npz'
+                            is appended).
+            stations (numpy.array): (N,M) values identifying the stations
+                            (e.g. UTM coordinates and velocities).
+            simplices (numpy.array): (K,3) indexes into stations.
+            results (numpy.array): K NODE_RESULT_DTYPE records, one per
+                            simplex.
+            utm_zone (int): the UTM zone of the stations' coordinates.
+    """
+    fd, tmp_file = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        with os.fdopen(fd, 'wb') as fout:
+            numpy.savez(fout, version=numpy.array(STRAIN_NPZ_VERSION),
+                utm_zone=numpy.array(utm_zone), stations=numpy.asarray(stations, dtype='<f8'),
+                simplices=numpy.asarray(simplices, dtype='<i8'),
+                results=numpy.asarray(results, dtype=NODE_RESULT_DTYPE))
+        os.rename(tmp_file, filename)
+    except:
+        os.remove(tmp_file)
+        raise
+
+def read_veis_cache(filename):
+    """Read a triangulation cache file, written by write_veis_cache.
+
+        Args:
+            filename (str): the cache file.
+
+        Returns:
+            dictionary: with keys 'utm_zone', 'stations', 'simplices' and
+                        'results' (see write_veis_cache).
+
+        Raises:
+            RuntimeError: if the file is not a (supported) cache file.
+    """
+    with numpy.load(filename) as npz:
+        if 'version' not in npz or int(npz['version']) > STRAIN_NPZ_VERSION \
+                or 'simplices' not in npz:
+            raise RuntimeError('[ERROR] Not a (supported) triangulation cache file: {:}'.format(filename))
+        return {
+            'utm_zone': int(npz['utm_zone']),
+            'stations': npz['stations'],
+            'simplices': npz['simplices'],
+            'results': numpy.asarray(npz['results'], dtype=NODE_RESULT_DTYPE)
+        }
+
+class StrainResultsWriter:
+    """Write Strain Tensor estimation results to a file, as text or npz.
+
+        Results (NODE_RESULT_DTYPE records, see pystrain.strain) are passed
+        in one at a time (write) or as arrays (write_array); only estimated
+        ones end up in the file. In text mode, each result is written as a
+        line (see pystrain.strain.format_details) right away, after the
+        header. In npz mode, the results are appended to one (temporary, raw
+        float64) file per column as they arrive, next to the output file;
+        when the instance is closed, the column files are memory-mapped and
+        copied to the npz file (see write_strain_npz). Hence, in either mode,
+        memory use does not grow with the number of results.
+
+        Attributes:
+            filename (str)     : the output file.
+            output_format (str): 'text' or 'npz'.
+    """
+
+    ##  Max number of results passed in via write, kept (in npz mode) before
+    ##+ they are appended to the column files
+    ROWS_BUFFERED = 4096
+
+    def __init__(self, filename, output_format='text'):
+        """StrainResultsWriter constructor; opens the output file.
+
+            Args:
+                filename (str)     : the output file.
+                output_format (str): 'text' or 'npz'.
+
+            Raises:
+                RuntimeError: if the output format is not valid.
+        """
+        if output_format not in ['text', 'npz']:
+            raise RuntimeError('[ERROR] Invalid strain output format: {:}'.format(output_format))
+        self.filename = filename
+        self.output_format = output_format
+        ##  npz mode: directory of the column files, number of results in
+        ##+ them and results (tuples) not yet appended
+        self._spool = None
+        self._count = 0
+        self._rows = []
+        self._fout = None
+        if output_format == 'text':
+            self._fout = open(filename, 'w')
+            write_strain_header(self._fout)
+        else:
+            self._spool = tempfile.mkdtemp(prefix='.strain-',
+                dir=os.path.dirname(os.path.abspath(filename)))
+
+    def _column_file(self, column):
+        return os.path.join(self._spool, column + '.f8')
+
+    def _append(self, results):
+        """npz mode: append (estimated) results to the column files."""
+        for c in STRAIN_NPZ_COLUMNS:
+            with open(self._column_file(c), 'ab') as fcol:
+                numpy.ascontiguousarray(results[c], dtype='<f8').tofile(fcol)
+        self._count += len(results)
+
+    def _flush_rows(self):
+        if self._rows:
+            self._append(numpy.array(self._rows, dtype=NODE_RESULT_DTYPE))
+            self._rows = []
+
+    def write(self, result, novar='-'):
+        """Write a result (a tuple with the fields of a NODE_RESULT_DTYPE record).
+
+            Args:
+                result (tuple): the result; skipped if its status is not
+                                NODE_ESTIMATED.
+                novar (str)   : text mode only, see format_details.
+        """
+        if result[0] != NODE_ESTIMATED: return
+        if self.output_format == 'text':
+            self._fout.write(format_details(result[5:], novar))
+        else:
+            self._rows.append(tuple(result))
+            if len(self._rows) >= self.ROWS_BUFFERED: self._flush_rows()
+
+    def write_array(self, results, novar='-'):
+        """Write an array of NODE_RESULT_DTYPE records (in order).
+
+            Args:
+                results (numpy.array): the results.
+                novar (str)          : text mode only, see format_details.
+        """
+        results = results[results['status'] == NODE_ESTIMATED]
+        if self.output_format == 'text':
+            for start in range(0, len(results), 4096):
+                for result in results[start:start+4096].tolist():
+                    self._fout.write(format_details(result[5:], novar))
+        else:
+            self._flush_rows()
+            if len(results): self._append(results)
+
+    def close(self):
+        """Close the output file (in npz mode, this is when it is written)."""
+        if self.output_format == 'text':
+            if self._fout: self._fout.close()
+            self._fout = None
+        elif self._spool is not None:
+            try:
+                self._flush_rows()
+                if self._count:
+                    cols = dict((c, numpy.memmap(self._column_file(c), dtype='<f8',
+                        mode='r', shape=(self._count,))) for c in STRAIN_NPZ_COLUMNS)
+                else:
+                    cols = dict((c, numpy.empty(0, dtype='<f8')) for c in STRAIN_NPZ_COLUMNS)
+                _savez_columns(self.filename, cols)
+                del cols
+            finally:
+                shutil.rmtree(self._spool, ignore_errors=True)
+                self._spool = None
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import os
 from math import sqrt, radians, sin, cos, atan2, pi, asin
+import numpy
+from scipy.spatial import cKDTree
 
 # Any Station instance, can have any (or all) of these attributes
 station_member_names = ['name', 'lat', 'lon', 've', 'vn', 'se', 'sn', 'rho', 't']
@@ -217,3 +220,298 @@ class Station:
             tmp    = cos(frm.lat) * cos(to.lat)
             return 2e0 * asin(sqrt(lath + tmp*lonh))
         return R*ArcInRadians(self, sta)
+
+class StationRow(Station, object):
+    '''A Station that is a (row) view into a StationArray.
+
+        Reading or assigning any of the Station attributes (name, lon, lat,
+        ve, vn, se, sn, rho, t) of a StationRow reads/writes the corresponding
+        element of the underlying StationArray columns. Apart from that, a
+        StationRow behaves exactly like a Station.
+
+        Attributes:
+            array (StationArray): the StationArray this row belongs to
+            index (int): the index of the row within array
+    '''
+
+    def __init__(self, array, index):
+        self.__dict__['array'] = array
+        self.__dict__['index'] = index
+
+def _row_property(member):
+    '''Property to access a column element of a StationRow.'''
+    def getter(self):
+        return getattr(self.array, member)[self.index]
+    def setter(self, val):
+        getattr(self.array, member)[self.index] = val
+    return property(getter, setter)
+
+for _member in station_member_names:
+    setattr(StationRow, _member, _row_property(_member))
+
+class StationArray:
+    '''A columnar container of Stations.
+
+        A StationArray holds the information of a collection of stations in
+        (contiguous) numpy arrays, one per Station attribute (aka name, lon,
+        lat, ve, vn, se, sn, rho and t). All columns have the same length and
+        the same units as the respective Station attributes.
+        It can be used in place of a list of Station instances; len() and
+        iteration work as expected, indexing with an integer returns a
+        StationRow (a Station view of the row), while indexing with a slice,
+        an index array or a boolean mask returns a new StationArray.
+
+        Attributes:
+            name (numpy.array): station names (str)
+            lon (numpy.array) : longtitudes (radians) or Eastings (meters)
+            lat (numpy.array) : latitudes (radians) or Northings (meters)
+            ve (numpy.array)  : east velocity components (meters/year)
+            vn (numpy.array)  : north velocity components (meters/year)
+            se (numpy.array)  : std. deviations of east velocity components
+                                (meters/year)
+            sn (numpy.array)  : std. deviations of north velocity components
+                                (meters/year)
+            rho (numpy.array) : correlation coefficients between East and North
+                                velocity components
+            t (numpy.array)   : time-spans in decimal years
+    '''
+
+    def __init__(self, *args, **kargs):
+        '''StationArray constructor.
+
+            Construction can be performed:
+                #. from a list (or any iterable) of Station instances
+                #. given (any of) the columns as named arguments.
+            Any column not set, will be filled with NaN (name will be filled
+            with empty strings).
+
+            e.g. sa = StationArray([Station("akyr ..."), Station("ankr ...")])
+                 sa = StationArray(lon=numpy.array([.1, .2]), lat=numpy.array([.3, .4]))
+
+            Args:
+                *args (list of Station): if provided, the columns are filled
+                                         with the stations' attributes.
+                **kargs: any of the columns (array-like), aka one of:
+                    * name
+                    * lon
+                    * lat
+                    * ve
+                    * vn
+                    * se
+                    * sn
+                    * rho
+                    * t
+        '''
+        if len(args) != 0:
+            sta_lst = list(args[0])
+            for key in station_member_names:
+                if key not in kargs:
+                    kargs[key] = [ getattr(s, key) for s in sta_lst ]
+        size = max([ len(kargs[k]) for k in station_member_names if kargs.get(k) is not None ] + [0])
+        for key in station_member_names:
+            val = kargs.get(key)
+            if isinstance(val, numpy.ndarray):
+                col = val
+            elif val is None:
+                col = numpy.array(['']*size) if key == 'name' else numpy.full(size, numpy.nan)
+            elif key == 'name':
+                col = numpy.array([ '' if v is None else v for v in val ], dtype=str)
+            else:
+                col = numpy.array([ numpy.nan if v is None else v for v in val ], dtype=float)
+            if len(col) != size:
+                raise ValueError('[ERROR] StationArray columns must be of equal length')
+            setattr(self, key, col)
+
+    def __len__(self):
+        return len(self.lon)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, numpy.integer)):
+            if key < 0: key += len(self)
+            if key < 0 or key >= len(self):
+                raise IndexError('StationArray index out of range')
+            return StationRow(self, key)
+        return StationArray(**dict((m, getattr(self, m)[key]) for m in station_member_names))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield StationRow(self, i)
+
+    def copy(self):
+        '''Deep copy of the instance (all columns are copied).'''
+        return StationArray(**dict((m, getattr(self, m).copy()) for m in station_member_names))
+
+    def with_coordinates(self, lon, lat):
+        '''A view of the instance, with different coordinates.
+
+            Return a new StationArray, with the given lon and lat columns; all
+            other columns (name, velocities, sigmas, etc) are shared with (not
+            copied from) the instance. This can be used to hold e.g. the
+            projected (Easting, Northing) coordinates of a set of stations
+            next to their ellipsoidal ones, without duplicating the rest of
+            the information.
+
+            Args:
+                lon (numpy.array): the new lon column (e.g. Eastings)
+                lat (numpy.array): the new lat column (e.g. Northings)
+
+            Returns:
+                StationArray: the view
+        '''
+        cols = dict((m, getattr(self, m)) for m in station_member_names)
+        cols['lon'] = numpy.asarray(lon, dtype=float)
+        cols['lat'] = numpy.asarray(lat, dtype=float)
+        return StationArray(**cols)
+
+    def dump(self, path):
+        '''Write the columns to a directory, so that they can be memory-mapped.
+
+            The numeric columns are written (one row per column) to the file
+            'columns.npy' and the station names to 'names.npy', both under the
+            (existing) directory path. Use load_station_array to get them back;
+            e.g. worker processes can attach to the same (read-only) data
+            instead of receiving a copy each.
+
+            Args:
+                path (str): an existing directory where the files are written.
+        '''
+        numpy.save(os.path.join(path, 'names.npy'), self.name)
+        numpy.save(os.path.join(path, 'columns.npy'),
+            numpy.vstack([ getattr(self, m) for m in station_member_names if m != 'name' ]).astype(float))
+
+    def haversine_distance(self, sta, R=6372797.560856e0):
+        '''Great-circle distances, in meters, of all stations from a point.
+
+            The array version of Station.haversine_distance; see
+            haversine_distances.
+
+            Args:
+                sta (Station): the point (lon and lat in radians).
+                R (float): radius of the sphere in meters.
+
+            Returns:
+                numpy.array: the distance of each station from sta.
+        '''
+        return haversine_distances(self.lon, self.lat, sta.lon, sta.lat, R)
+
+    def to_list(self):
+        '''Make a list of (independent) Station instances, one per row.'''
+        return [ Station(**dict((m, getattr(self, m)[i].item()) for m in station_member_names)) for i in range(len(self)) ]
+
+def haversine_distances(lon1, lat1, lon2, lat2, R=6372797.560856e0, pairwise=False):
+    """Great-circle distances, in meters, between points on a sphere.
+
+        The vectorized version of Station.haversine_distance; coordinates are
+        in radians and may be scalars or arrays. By default the arguments are
+        broadcast against each other, so that e.g. one point (lon2, lat2) is
+        compared to many (lon1, lat1). If pairwise is True, the distance of
+        every point (lon1, lat1) to every point (lon2, lat2) is computed.
+        See https://en.wikipedia.org/wiki/Haversine_formula
+
+        Args:
+            lon1, lat1 (float or numpy.array): coordinates of the first point(s)
+            lon2, lat2 (float or numpy.array): coordinates of the second point(s)
+            R (float): radius of the sphere in meters.
+            pairwise (bool): if True, return a (len(lon1), len(lon2)) matrix of
+                             all distances.
+
+        Returns:
+            numpy.array: the distances (meters).
+    """
+    lon1, lat1 = numpy.asarray(lon1, dtype=float), numpy.asarray(lat1, dtype=float)
+    lon2, lat2 = numpy.asarray(lon2, dtype=float), numpy.asarray(lat2, dtype=float)
+    if pairwise:
+        lon1, lat1 = lon1.reshape(-1, 1), lat1.reshape(-1, 1)
+        lon2, lat2 = lon2.reshape(1, -1), lat2.reshape(1, -1)
+    lath = numpy.sin((lat1 - lat2)*0.5e0)
+    lath *= lath
+    lonh = numpy.sin((lon1 - lon2)*0.5e0)
+    lonh *= lonh
+    ##  rounding may push the argument (slightly) above 1 for antipodal points
+    return R*2e0*numpy.arcsin(numpy.minimum(numpy.sqrt(lath + numpy.cos(lat1)*numpy.cos(lat2)*lonh), 1e0))
+
+def load_station_array(path, mmap_mode='r'):
+    '''Load a StationArray written by StationArray.dump.
+
+        By default the files are memory-mapped (read-only), so that the
+        columns of the returned StationArray are views of the file contents;
+        no copy is made and processes loading the same files share the
+        (physical) memory pages.
+
+        Args:
+            path (str): the directory passed to StationArray.dump.
+            mmap_mode (str): passed to numpy.load; None to read the columns
+                             into memory.
+
+        Returns:
+            StationArray: the stations.
+    '''
+    ##  plain ndarray views of the mapped buffers (numpy.memmap results of
+    ##+ any further computation would needlessly be memmap instances too)
+    cols  = numpy.asarray(numpy.load(os.path.join(path, 'columns.npy'), mmap_mode=mmap_mode))
+    names = [ m for m in station_member_names if m != 'name' ]
+    kargs = dict((m, cols[i]) for i, m in enumerate(names))
+    kargs['name'] = numpy.asarray(numpy.load(os.path.join(path, 'names.npy'), mmap_mode=mmap_mode))
+    return StationArray(**kargs)
+
+def as_station_array(sta_lst):
+    '''Return sta_lst as a StationArray.
+
+        If sta_lst is already a StationArray it is returned as is (no copy);
+        else, a new StationArray is constructed from the list of Stations.
+    '''
+    if isinstance(sta_lst, StationArray):
+        return sta_lst
+    return StationArray(sta_lst)
+
+class StationIndex:
+    '''A spatial index (KD-tree) for a set of stations.
+
+        The index is built once, from the stations' (projected) coordinates
+        and can then answer radius queries (aka which stations are within
+        a given distance from a point) in O(log n + k) time. It is meant to
+        be shared by all ShenStrain instances working on the same stations.
+        As with Station.distance_from, the lon and lat station components are
+        treated as cartesian x (Easting) and y (Northing) coordinates, in
+        meters.
+
+        Attributes:
+            stations (StationArray): the stations indexed
+            tree (scipy.spatial.cKDTree): the KD-tree of station coordinates
+    '''
+
+    def __init__(self, stations):
+        '''StationIndex constructor.
+
+            Args:
+                stations (list of Station or StationArray): the stations to
+                    index; coordinates should be cartesian (e.g. UTM).
+        '''
+        self.stations = as_station_array(stations)
+        self.tree = cKDTree(numpy.column_stack((self.stations.lon, self.stations.lat)))
+
+    def within(self, x, y, limit):
+        '''Stations within a given distance from a point.
+
+            Find all stations for which the (squared) distance from the point
+            (x, y), computed exactly as in Station.squared_distance_from, is
+            less than or equal to limit*limit. The KD-tree is queried with a
+            (slightly) enlarged radius and the exact test is then applied to
+            the candidates only, so that the result is identical to a linear
+            scan.
+
+            Args:
+                x (float): x coordinate (or Easting) of the point in meters
+                y (float): y coordinate (or Northing) of the point in meters
+                limit (float): the distance limit in km
+
+            Returns:
+                numpy.array (int): indexes of the stations within the limit,
+                    in ascending order.
+        '''
+        radius = limit*1e3*(1e0+1e-9) + 1e-6
+        cand = numpy.array(self.tree.query_ball_point((x, y), radius), dtype=int)
+        cand.sort()
+        dlon = (x - self.stations.lon[cand])/1e3
+        dlat = (y - self.stations.lat[cand])/1e3
+        return cand[dlat*dlat + dlon*dlon <= limit*limit]
@@ -5,24 +5,73 @@ from __future__ import print_function
 import sys
 import numpy
 from scipy import linalg
-import operator
-from math import atan2, exp, sqrt, floor, pi, degrees
+from math import atan2, sqrt, floor, pi, degrees
 
 import pystrain.grid
-from pystrain.station import Station
+from pystrain.station import Station, StationArray, StationIndex, as_station_array
 from pystrain.strain import *
 from pystrain.geodesy.utm import *
 from pystrain.iotools.iparser import *
 
 DEBUG_MODE = False
 
+##  Status codes assigned to each estimated point (see ShenSolver.solve,
+##+ shen_estimate_batch and NODE_RESULT_DTYPE).
+NODE_ESTIMATED      = 0 ## strain tensor estimated
+NODE_LIMITED_COVER  = 1 ## skipped; max β angle larger than the limit
+NODE_NO_OPTIMAL_D   = 2 ## skipped; no optimal D found in [dmin, dmax)
+NODE_TOO_FEW_OBS    = 3 ## skipped; less than 3 stations available
+NODE_NO_VCV         = 4 ## skipped; failed to compute the parameter VcV matrix
+
+##  Names of the Strain Tensor details, in the order they are printed (see
+##+ ShenStrain.details and format_details); units are 'deg', 'deg', 'mm/yr',
+##+ 'mm/yr', 'deg/Myr', 'nstrain/yr' (x6), 'deg.', 'nstrain/yr' (x2). Each
+##+ value is followed by its std. deviation (named with a 'd' prefix).
+STRAIN_DETAILS_COLUMNS = ['lat', 'lon', 'vx', 'dvx', 'vy', 'dvy', 'w', 'dw',
+    'exx', 'dexx', 'exy', 'dexy', 'eyy', 'deyy', 'emax', 'demax', 'emin',
+    'demin', 'shr', 'dshr', 'azi', 'dazi', 'dilat', 'ddilat', 'sec_inv',
+    'dsec_inv']
+
+##  (numpy) record holding the (numeric) estimation result for a point: the
+##+ status code (NODE_*), the number of stations used, the optimal D, the
+##+ cut-off distance, the a-posteriori std. deviation and the Strain Tensor
+##+ details (see STRAIN_DETAILS_COLUMNS). Anything not estimated is NaN.
+NODE_RESULT_DTYPE = numpy.dtype([('status', 'i1'), ('nsta', 'i4'),
+    ('d_coef', 'f8'), ('cutoff_dis', 'f8'), ('sigma0', 'f8')] +
+    [ (c, 'f8') for c in STRAIN_DETAILS_COLUMNS ])
+
+def format_details(details, novar='-'):
+    ''' Format Strain Tensor details (see ShenStrain.details) to a line of
+        text, as written by ShenStrain.print_details_v2.
+
+        Args:
+            details (sequence): the 26 values (see STRAIN_DETAILS_COLUMNS); if
+                                the std. deviations are NaN, they are printed
+                                as novar.
+            novar (str): what to print (right-aligned in 7 characters) in
+                         place of missing std. deviations.
+
+        Returns:
+            str: the formatted line (including the trailing newline).
+    '''
+    if details[3] == details[3]:
+        return '%9.5f %9.5f %+7.1f %7.1f %+7.1f '\
+            '%7.1f %+7.1f %7.1f %+7.1f %7.1f %+7.1f %7.1f '\
+            '%+7.1f %7.1f %+7.1f %7.1f %+7.1f %7.1f %+7.1f '\
+            '%7.1f %+7.1f %7.1f %+7.1f %7.1f %+7.1f %7.1f\n' %tuple(details)
+    return '%9.5f %9.5f %+7.1f %7s %+7.1f '\
+        '%7s %+7.1f %7s %+7.1f %7s %+7.1f %7s '\
+        '%+7.1f %7s %+7.1f %7s %+7.1f %7s %+7.1f '\
+        '%7s %+7.1f %7s %+7.1f %7s %+7.1f %7s\n' %tuple(
+        novar if i > 2 and i % 2 else v for i, v in enumerate(details))
+
 def barycenter(sta_list):
     ''' Compute the barycenter from a list of stations. The function will use
         each station's self.lat and self.lon components.
         Barycenter's coordinates will have the same units as the input ones.
 
         Args:
-            sta_lst (list of Station): a list of Station instances.
+            sta_lst (list of Station or StationArray): the stations.
 
         Returns:
             tuple (float, float): first element is the average of the stations
@@ -31,13 +80,265 @@ def barycenter(sta_list):
     '''
     if len(sta_list) == 0:
         raise ValueError("[ERROR] Cannot compute barycentre for empty list of stations")
-    y_mean = sta_list[0].lat
-    x_mean = sta_list[0].lon
-    for i in range(1, len(sta_list)):
-        y_mean = (sta_list[i].lat + (i-1)*y_mean) / float(i)
-        x_mean = (sta_list[i].lon + (i-1)*x_mean) / float(i)
+    sta_arr = as_station_array(sta_list)
+    lats, lons = sta_arr.lat.tolist(), sta_arr.lon.tolist()
+    y_mean = lats[0]
+    x_mean = lons[0]
+    for i in range(1, len(lats)):
+        y_mean = (lats[i] + (i-1)*y_mean) / float(i)
+        x_mean = (lons[i] + (i-1)*x_mean) / float(i)
     return x_mean, y_mean
 
+def _l_function(ltype):
+    """ Return the distance-dependent weighting function L(ΔR, D), i.e.
+        exp(-ΔR**2/D**2) for 'gaussian' and 1/(1+ΔR**2/D**2) for 'quadratic'.
+        Note: ΔR and D must be in the same units (here km).
+    """
+    def gaussian(dri, d):  return numpy.exp(-(dri/d)**2)
+    def quadratic(dri, d): return 1e0/(1e0+(dri/d)**2)
+    if ltype == 'gaussian':
+        return gaussian
+    elif ltype == 'quadratic':
+        return quadratic
+    raise RuntimeError("[ERROR] Invalid distance-dependent weighting function")
+
+def _normal_equations(wx, wy, dx, dy, ve, vn):
+    """ Normal equations AᵀA (6x6), Aᵀb (6x1) and bᵀb of the LS problem
+        formulated in ShenStrain.ls_matrices, given the square root weights
+        (wx, wy), the station distances from the centre (dx, dy) and the
+        velocities (ve, vn). See ShenStrain.normal_equations.
+    """
+    px, py = wx*wx, wy*wy
+    g  = numpy.vstack((numpy.ones(len(dx)), dx, dy))
+    Mx = numpy.dot(g*px, g.T)
+    My = numpy.dot(g*py, g.T)
+    N  = numpy.dot(_CX, Mx).dot(_CX.T) + numpy.dot(_CY, My).dot(_CY.T)
+    u  = numpy.dot(_CX, numpy.dot(g, px*ve)) + numpy.dot(_CY, numpy.dot(g, py*vn))
+    return N, u.reshape(6,1), float(numpy.dot(px, ve*ve) + numpy.dot(py, vn*vn))
+
+##  Rows of the design matrix, A(i,:) = Cx*g(i) and A(i+1,:) = Cy*g(i), with
+##+ g = (1, Δx, Δy); see _normal_equations
+_CX = numpy.array([[1,0,0],[0,0,0],[0,1,0],[0,0,1],[0,0,0],[0,0,1]], dtype=float)
+_CY = numpy.array([[0,0,0],[1,0,0],[0,0,0],[0,1,0],[0,0,1],[0,-1,0]], dtype=float)
+
+def _shen_options(**kwargs):
+    """ Options of a ShenStrain (or ShenSolver): the defaults, updated with
+        any (known) key in kwargs; cutoff_dis is always set according to
+        ltype (see ShenStrain.__init__).
+    """
+    options = {
+        'ltype': 'gaussian',
+        'Wt': 24,
+        'dmin': 1,
+        'dmax': 500,
+        'dstep': 2,
+        'd_coef': None,
+        'cutoff_dis': None,
+        'weighting_function': 'shen',
+        'd_search': 'linear',
+        'ls_solver': 'lstsq',
+        'verbose_mode': False
+    }
+    for key in kwargs:
+        if key in options:
+            options[key] = kwargs[key]
+    if options['ltype'] == 'gaussian':
+        options['cutoff_dis'] = 2.15e0
+    else:
+        options['cutoff_dis'] = 10e0
+    return options
+
+def _z_weights(az):
+    """ Z-weights (see ShenStrain.z_weights) of stations with azimouths az
+        (in station order); the weights are returned in the same order.
+    """
+    nr = numpy.argsort(az, kind='stable')
+    zw = numpy.empty(len(az))
+    zw[nr] = _z_weights_sorted(az[nr])
+    return zw
+
+def _ls_matrices(wx, wy, dx, dy, ve, vn):
+    """ The (weighted) design matrix A and observation vector b of the LS
+        problem, given the square root weights (wx, wy), the station distances
+        from the centre (dx, dy) and the velocities (ve, vn). See
+        ShenStrain.ls_matrices.
+    """
+    N  = len(dx)*2
+    A  = numpy.zeros(shape=(N,6))
+    b  = numpy.zeros(shape=(N,1))
+    A[0::2,0], A[0::2,2], A[0::2,3], A[0::2,5] = wx, wx*dx, wx*dy, wx*dy
+    A[1::2,1], A[1::2,3], A[1::2,4], A[1::2,5] = wy, wy*dx, wy*dy, wy*(-dx)
+    b[0::2,0] = ve * wx
+    b[1::2,0] = vn * wy
+    return A, b
+
+def _solve_normal_equations(wx, wy, dx, dy, ve, vn):
+    """ Solve the LS problem via the normal equations (Cholesky); see
+        ShenStrain.solve_normal_equations for the arguments (as in
+        _ls_matrices), return values and exceptions.
+    """
+    m = len(dx)*2
+    if m <= 6:
+        raise numpy.linalg.LinAlgError('[ERROR] Too few obs to solve the normal equations')
+    N, u, _ = _normal_equations(wx, wy, dx, dy, ve, vn)
+    diag = numpy.diag(N)
+    if not (diag > 0e0).all():
+        raise numpy.linalg.LinAlgError('[ERROR] Normal matrix is singular')
+    ss = 1e0/numpy.sqrt(numpy.outer(diag, diag))
+    Ns = N*ss
+    ##  N = L*Lᵀ => N^(-1) = L^(-T)*L^(-1); raises LinAlgError if N is not
+    ##+ positive definite
+    Linv = numpy.linalg.inv(numpy.linalg.cholesky(Ns))
+    Ninv = numpy.dot(Linv.T, Linv)
+    ## 1-norm condition number
+    if abs(Ns).sum(axis=0).max() * abs(Ninv).sum(axis=0).max() > 1e12:
+        raise numpy.linalg.LinAlgError('[ERROR] Normal matrix is (nearly) singular')
+    Ninv *= ss
+    estim = numpy.dot(Ninv, u)
+    ## weighted residuals (u^T * P * u)
+    Ux, Uy, taux, tauxy, tauy, omega = estim[:,0].tolist()
+    vx = (ve - (Ux + taux*dx + tauxy*dy + omega*dy))*wx
+    vy = (vn - (Uy + tauxy*dx + tauy*dy - omega*dx))*wy
+    sigma0_post = float(numpy.dot(vx, vx) + numpy.dot(vy, vy))
+    return estim, sqrt(sigma0_post/(m-6e0)), Ninv*(sigma0_post/(m-6e0))
+
+def _ls_fit(wx, wy, dx, dy, ve, vn, ls_solver, vprint):
+    """ Estimate the parameters [Ux, Uy, τx, τxy, τy, ω], their a-posteriori
+        std. deviation and VcV matrix (steps 4 and 5 of ShenStrain.estimate).
+        Arguments are as in _ls_matrices; ls_solver is 'lstsq' or 'cholesky'
+        and vprint a (verbose) print function.
+
+        Returns:
+            tuple (numpy.array, float, numpy.array): the estimates (6x1), the
+                a-posteriori std. deviation and the VcV matrix (6x6); the
+                latter two are None if not available.
+
+        Raises:
+            RuntimeError: if less than 3 stations are given or ls_solver is
+                not valid.
+    """
+    estim, sigma0, vcv = None, None, None
+    ##  If requested, solve the normal equations via Cholesky; falls back
+    ##+ to lstsq for the exactly-determined or rank-deficient cases.
+    if ls_solver == 'cholesky':
+        if len(dx) > 3:
+            try:
+                estim, sigma0, vcv = _solve_normal_equations(wx, wy, dx, dy, ve, vn)
+            except numpy.linalg.LinAlgError:
+                vprint('[DEBUG] Normal equations are (nearly) singular; using lstsq instead.')
+    elif ls_solver != 'lstsq':
+        raise RuntimeError("[ERROR] Invalid least squares solver option")
+    if estim is None:
+        ## Formulate the LS matrices A and b (or AW, bW if shen).
+        A, b = _ls_matrices(wx, wy, dx, dy, ve, vn)
+        ## Var-Covar matrix
+        VcV  = numpy.dot(A.T, A)
+        m, n = A.shape
+        if m < 6:
+            raise RuntimeError('[ERROR] Too few obs to perform LS.')
+        elif m == 6:
+            vprint('[DEBUG] Only 3 stations available; computing NOT estimating strain.')
+        ##  Note: To silence warning in versions > 1.14.0, use a third argument,
+        ##+ rcond=None; see https://docs.scipy.org/doc/numpy/reference/generated/numpy.linalg.lstsq.html
+        estim, res, rank, sing_vals = numpy.linalg.lstsq(A, b)
+        # Parameter variance-covariance matrix
+        if m > 6:
+            try:
+                ##  A-posteriori std. deviation. res[0] is the sum of residuals;
+                ##+ squared Euclidean 2-norm for each column in b - a*x, aka
+                ##+ u^T * P * u,
+                ##+ or (b - A*estim)^T * (b - A*estim)
+                sigma0_post = float(res[0])
+                sigma0 = sqrt(sigma0_post / (float(m) - 6e0))
+                ## A-posteriri VcV matrix = σ0^2 * (A^T P A)^-1
+                vcv = linalg.inv(VcV) * (sigma0_post/float(m-n))
+            except:
+                vprint('[DEBUG] Cannot compute var-covar matrix! Probably singular.')
+                vcv = None
+    return estim, sigma0, vcv
+
+def _cmp_strain(x1, x2, x3, params_cov=None):
+    """ Strain tensor parameters and sigmas, given τx (x1), τxy (x2) and τy
+        (x3) in strain/yr; see ShenStrain.cmp_strain.
+    """
+    cov = pi / 180e0
+    ##  estimate principle strain rates emax, emin, maximum shear tau_max,
+    ##+ and dextral tau_max azimuth
+    emean = (x1+x3) / 2e0               ## strain/yr
+    ediff = (x1-x3) / 2e0               ## strain/yr
+    taumax= sqrt(x2**2 + ediff**2)      ## strain/yr
+    emax  = emean+taumax                ## strain/yr
+    emin  = emean-taumax                ## strain/yr
+    azim  = -atan2(x2, ediff) / cov / 2.0e0 ## degrees
+    azim  = 90e0+azim
+    dexazim = azim+45e0-180e0
+    dilat = x1+x3                       ## strain/yr
+    sec_inv = sqrt(x1*x1+2e0*x2*x2+x3*x3)
+    if params_cov is None:
+        staumax, semax, semin, sazim, sdilat, ssec_inv = [None] * 6
+    else:
+        nv, mv = params_cov.shape
+        assert nv == mv and nv == 6
+        ## Error propagation for non-linear functions, aka V <- J*VcV*J^T
+        ## where J is the Jacobian matrix and VcV the var-covar matrix of
+        ## the parameter vector: [Ux, Uy, τx, τxy, τy, ω]
+        ## rows of the Jacobian are:
+        ## [τ_max, e_max, e_min, Azim, dilatation, sec_inv]
+        ## first row is:
+        ## [ dτ_max/dUx, dτ_max/dUy, dτ_max/dτx, dτ_max/dτxy, dτ_max/dτy, dτ_max/dω ]
+        J = numpy.zeros(shape=(6,6))
+        _tmp = ediff/(2e0*taumax)
+        J[0, :] = [ 0e0, 0e0, _tmp,           x2/taumax,        -_tmp,          0e0 ]
+        J[1, :] = [ 0e0, 0e0, .5e0+_tmp,      x2/taumax,         .5e0-_tmp,     0e0 ]
+        J[2, :] = [ 0e0, 0e0, .5e0-_tmp,     -x2/taumax,         .5e0+_tmp,     0e0 ]
+        _tmp = ediff*ediff + x2*x2
+        J[3, :] = [ 0e0, 0e0, x2/(4e0*_tmp), -ediff/(4e0*_tmp), -x2/(4e0*_tmp), 0e0 ]
+        J[4, :] = [ 0e0, 0e0, 1e0,            0e0,               1e0,           0e0 ]
+        J[5, :] = [ 0e0, 0e0, x1/sec_inv,     2e0*x2/sec_inv,    x3/sec_inv,    0e0 ]
+        Vy = numpy.dot(J, numpy.dot(params_cov, J.T))
+        staumax = sqrt(Vy[0,0])
+        semax   = sqrt(Vy[1,1])
+        semin   = sqrt(Vy[2,2])
+        sazim   = sqrt(Vy[3,3])
+        sdilat  = sqrt(Vy[4,4])
+        ssec_inv= sqrt(Vy[5,5])
+    return emean, ediff, \
+        taumax, staumax, \
+        emax, semax, \
+        emin, semin, \
+        azim, sazim, \
+        dilat, sdilat, \
+        sec_inv, ssec_inv
+
+def _strain_details(x, y, params, vcv, utm_zone=None):
+    """ Strain Tensor details (see ShenStrain.details) of a tensor at (x, y),
+        with parameters params ([Ux, Uy, τx, τxy, τy, ω]) and VcV matrix vcv
+        (may be None).
+    """
+    if utm_zone:
+        utm_proj = utm_zone if isinstance(utm_zone, UTMProjection) else UTMProjection(utm_zone)
+        cy, cx = [ degrees(c) for c in utm_proj.inverse(x, y) ]
+    else:
+        cx, cy = x, y
+    Ux, Uy, taux, tauxy, tauy, omega = params
+    emean, ediff, taumax, staumax, emax, semax, emin, semin, azim, sazim, \
+        dilat, sdilat, sec_inv, ssec_inv = _cmp_strain(taux, tauxy, tauy, vcv)
+    values = (cy, cx, \
+        Ux*1e3, Uy*1e3, \
+        omega*1e9*0.206e0/3.6e0, \
+        taux*1e9, tauxy*1e9, \
+        tauy*1e9, emax*1e9, emin*1e9, taumax*1e9, \
+        azim, dilat*1e9, sec_inv*1e9)
+    if vcv is not None:
+        sigmas = (sqrt(vcv[0,0])*1e3, sqrt(vcv[1,1])*1e3, \
+            sqrt(vcv[5,5])*1e9*0.206e0/3.6e0, \
+            sqrt(vcv[2,2])*1e9, sqrt(vcv[3,3])*1e9, \
+            sqrt(vcv[4,4])*1e9, semax*1e9, semin*1e9, \
+            staumax*1e9, sazim, sdilat*1e9, ssec_inv*1e9)
+    else:
+        sigmas = (float('nan'),) * 12
+    return (cy, cx) + tuple(v for pair in zip(values[2:], sigmas) for v in pair)
+
 class ShenStrain:
     """A class to represeent Strain Tensors.
 
@@ -46,12 +347,12 @@ class ShenStrain:
         Attributes:
             __xcmp__ (float): x coordinate (could also be easting)
             __ycmp__ (float): y coordinate (could also be northing)
-            __stalst__ (list of Station): a list of stations to be used
-                for strain estimation. Some of them may be filtered out.
-            __zweights__ (list): a list of floats, where each element is the
-                weight of the station based on azimouthal coverage.
-            __lweights__ (list): a list of floats, where each element is the
-                weight of the station based on distance.
+            __stalst__ (StationArray): the stations to be used for strain
+                estimation. Some of them may be filtered out.
+            __zweights__ (numpy.array): an array of floats, where each element
+                is the weight of the station based on azimouthal coverage.
+            __lweights__ (numpy.array): an array of floats, where each element
+                is the weight of the station based on distance.
             __options__ (dictionary): A dictionary holding the following:
                 * ltype (str): gaussian or quadratic; this is the function
                                to be used for distance weight computation.
@@ -64,8 +365,14 @@ class ShenStrain:
                 * weighting_function (str): can be shen (to use shen weighting
                     algorithm), or equal_weights (to use equal weights for all
                     stations)
+                * d_search (str): linear or incremental; the algorithm used
+                    to search for the optimal D value (see find_optimal_d)
+                * ls_solver (str): lstsq or cholesky; how the least squares
+                    problem is solved (see estimate)
                 * verbose_mode (bool): sets verbose mde on if True; i.e. print
                   debugging messages
+            _index (StationIndex): an (optional) spatial index of the
+                stations in __stalst__, used to speed up filtering.
             vprint (function): if the instance is created with with verbose_mode
                 on, then this function is just print(); else vprint is a noop.
 
@@ -87,8 +394,9 @@ class ShenStrain:
             Args:
                 x (float): x coordinate (could also be easting)
                 y (float): y coordinate (could also be northing)
-                station_list (list of Station): a list of stations to be used
-                           for strain estimation. Some of them may be filtered out.
+                station_list (list of Station or StationArray): the stations to
+                           be used for strain estimation. Some of them may be
+                           filtered out. A list is converted to a StationArray.
                 **kwargs: a dictionary containing any of the keys:
                     * ltype (str): 'gaussian' or 'quadratic'; this is the
                                    function to be used for distance weight
@@ -102,8 +410,18 @@ class ShenStrain:
                     * weighting_function (str): can be 'shen' (to use shen 
                       weighting algorithm), or 'equal_weights' (to use equal 
                       weights for all stations)
+                    * d_search (str): 'linear' or 'incremental'; the algorithm
+                      used to search for the optimal D value. Both yield the
+                      same D (see find_optimal_d).
+                    * ls_solver (str): 'lstsq' or 'cholesky'; solve the least
+                      squares problem via the design matrix (SVD) or via the
+                      normal equations (see estimate).
                     * verbose_mode (bool): sets verbose mode on if True; i.e.
                       print debugging messages.
+                    * station_index (StationIndex): a spatial index built from
+                      station_list; if given, it is used when filtering stations
+                      wrt distance (results do not change). The same index can
+                      be shared by any number of instances.
 
             Warning:
                 the value of __options__[cutoff_dis] will be automatically set.
@@ -112,22 +430,12 @@ class ShenStrain:
         """
         ##  Set input values (x, y, station_list) and initiallize all others to
         ##+ default values.
-        self.__stalst__ = station_list
+        self.__stalst__ = as_station_array(station_list)
         self.__xcmp__   = x
         self.__ycmp__   = y
         self.__zweights__ = None
         self.__lweights__ = None
-        self.__options__  = {
-            'ltype': 'gaussian',
-            'Wt': 24, 
-            'dmin': 1,
-            'dmax': 500,
-            'dstep': 2,
-            'd_coef': None,
-            'cutoff_dis': None,
-            'weighting_function': 'shen',
-            'verbose_mode': False
-        }
+        self.__options__  = _shen_options(**kwargs)
         self.__parameters__ = {
             'Ux':0e0,
             'Uy':0e0,
@@ -137,14 +445,7 @@ class ShenStrain:
             'tauy':0e0
         }
         self.__vcv__ = None
-        ## Resolve the dictionary passed in (if any)
-        for key in kwargs:
-            if key in self.__options__:
-                self.__options__[key] = kwargs[key]
-        if self.__options__['ltype'] == 'gaussian':
-            self.__options__['cutoff_dis'] = 2.15e0
-        else:
-            self.__options__['cutoff_dis'] = 10e0
+        self._index = kwargs.get('station_index')
         ##  If in verbose_mode, set the vprint function to print; else vprint
         ##+ is a noop
         self.vprint = print if self.__options__['verbose_mode'] else lambda *a, **k: None
@@ -175,29 +476,36 @@ class ShenStrain:
                            should be provided in km.
 
             Returns:
-                list of Station: a list of Station instances, where each station
-                                 is less than cut-off distance away from the
-                                 instance.
+                StationArray: the stations that are less than cut-off distance
+                              away from the instance.
             Note:
                 The returned list is not assigned to the instance's __stalst__.
                 If you want that, then do it manually.
+                If the instance has a spatial index (_index) built for its
+                __stalst__, the index is used to find the stations within the
+                cut-off distance.
 
         """
         if not self.__options__['cutoff_dis']:
             raise ValueError("[ERROR] Cannot filter station list; cutoff_dis is None!")
-        cc = Station(lon=self.__xcmp__, lat=self.__ycmp__)
         if not d: d = self.__options__['d_coef']
         limit = self.__options__['cutoff_dis'] * d
+        stalst = self.__stalst__
+        if self._index is not None and self._index.stations is stalst:
+            return stalst[self._index.within(self.__xcmp__, self.__ycmp__, limit)]
         ##  OPT try optimized squared distance (aka remove the square roots).
         ##+ That is instead of filtering based on sqrt(Δx^2 + Δy^2) < limit*1e3
-        ##+ we will use (Δx^2 + Δy^2) < limit*limit
-        nlst = [ s for s in self.__stalst__ if s.squared_distance_from(cc) <= limit*limit ]
+        ##+ we will use (Δx^2 + Δy^2) < limit*limit; distances are computed
+        ##+ as in Station.squared_distance_from
+        dlon = (self.__xcmp__ - stalst.lon)/1e3
+        dlat = (self.__ycmp__ - stalst.lat)/1e3
+        nlst = stalst[dlat*dlat + dlon*dlon <= limit*limit]
         ## In debug mode, check that we have the correct results
         if DEBUG_MODE:
-            nlst1 = [ s for s in self.__stalst__ if s.distance_from(cc)[2] <= limit*1e3 ]
+            dr = numpy.sqrt((stalst.lat-self.__ycmp__)**2 + (stalst.lon-self.__xcmp__)**2)
+            nlst1 = stalst[dr <= limit*1e3]
             assert len(nlst) == len(nlst1)
-            for i,s in enumerate(nlst1):
-                assert s.name == nlst[i].name
+            assert (nlst1.name == nlst.name).all()
         return nlst
     
     def azimouths(self, other_sta_lst=None):
@@ -226,7 +534,7 @@ class ShenStrain:
             the function will use the isntance's __stalst__.
 
             Args:
-                other_sta_lst (list of Station): a list of Station instances.
+                other_sta_lst (list of Station or StationArray): the stations.
                     If not provided, __stalst__ will be used.
 
            Returns:
@@ -238,18 +546,35 @@ class ShenStrain:
             Note:
                 All azimouths will fall in range [0, 2π)
         """
-        stalst = self.__stalst__ if other_sta_lst is None else other_sta_lst
-        n = len(stalst)
-        azimouths = []
-        for idx, sta in enumerate(stalst):
-            az = atan2(sta.lon-self.__xcmp__, sta.lat-self.__ycmp__)
-            azimouths.append({'az': az+int(az<0e0)*(2e0*pi), 'nr': idx})
-        azimouths = sorted(azimouths, key=operator.itemgetter('az'))
+        az, nr = self.azimouth_array(other_sta_lst)
+        return [ {'az': a, 'nr': i} for a, i in zip(az.tolist(), nr.tolist()) ]
+
+    def azimouth_array(self, other_sta_lst=None):
+        """ Sorted azimouths of lines from the instance's centre to each point.
+
+            Same as ShenStrain.azimouths, but the result is returned as two
+            numpy arrays instead of a list of dictionaries.
+
+            Args:
+                other_sta_lst (list of Station or StationArray): the stations.
+                    If not provided, __stalst__ will be used.
+
+            Returns:
+                tuple (numpy.array, numpy.array): the first array holds the
+                    azimouths (in radians, range [0, 2π)) sorted in ascending
+                    order; the second array holds the index of the
+                    corresponding station in other_sta_lst.
+        """
+        stalst = self.__stalst__ if other_sta_lst is None else as_station_array(other_sta_lst)
+        az = numpy.arctan2(stalst.lon-self.__xcmp__, stalst.lat-self.__ycmp__)
+        az = numpy.where(az<0e0, az+2e0*pi, az)
+        nr = numpy.argsort(az, kind='stable')
+        az = az[nr]
         if DEBUG_MODE:
             ##  if in debug mode, confirm that all azimouths are in the range
             ##+ [0,2*pi)
-            for a in azimouths: assert a['az'] >= 0e0 and a['az'] < 2*pi
-        return azimouths
+            assert (az >= 0e0).all() and (az < 2*pi).all()
+        return az, nr
 
     def ls_matrices(self, sigma0=1):
         """ Construct Least Squares Matrices (A and b) to be solved for.
@@ -303,30 +628,66 @@ class ShenStrain:
         """
         ## number of rows (observations)
         N = len(self.__stalst__)*2
-        ## number of columns (parameters)
-        M = 6
         ## the weights, i.e. σ0 * W(i)
         W = sigma0 * self.make_weight_matrix()
         assert W.shape == (N,1)
-        ##  Distances, dx and dy for each station from (cx, cy). Each element
-        ##+ of the array is xyr = [ ... (dx, dy, dr) ... ]
-        cc  = Station(lon=self.__xcmp__, lat=self.__ycmp__)
-        xyr = [ cc.distance_from(x) for x in self.__stalst__ ]
-        ## design matrix A, observation matrix b
-        A = numpy.zeros(shape=(N,M))
-        b = numpy.zeros(shape=(N,1))
-        i = 0
-        for idx, sta in enumerate(self.__stalst__):
-            dx, dy, dr = xyr[idx]
-            Wx     = W[i]
-            Wy     = W[i+1]
-            A[i]   = [ Wx*j for j in [1e0, 0e0,  dx, dy, 0e0, dy] ]
-            A[i+1] = [ Wy*j for j in [0e0, 1e0, 0e0, dx, dy, -dx] ]
-            b[i]   = sta.ve * Wx
-            b[i+1] = sta.vn * Wy
-            i += 2
-        assert i == N, "[DEBUG] Failed to construct ls matrices"
-        return A, b
+        ##  Distances, dx and dy for each station from (cx, cy), as in
+        ##+ Station.distance_from
+        dx = self.__stalst__.lon - self.__xcmp__
+        dy = self.__stalst__.lat - self.__ycmp__
+        return _ls_matrices(W[0::2,0], W[1::2,0], dx, dy, self.__stalst__.ve, self.__stalst__.vn)
+
+    def normal_equations(self, sigma0=1):
+        """ Construct the normal equations (AᵀA and Aᵀb) of the LS problem.
+
+            Same as forming the A and b matrices via ShenStrain.ls_matrices
+            and computing AᵀA, Aᵀb and bᵀb, but the (2*N x 6) design matrix
+            is never formed. Each row of A is a linear combination of
+            g = (1, Δx, Δy) (scaled by the row's weight), i.e.
+            A(i,:)   = W(i)   * Cx * g(i)
+            A(i+1,:) = W(i+1) * Cy * g(i)
+            hence AᵀA = Cx * Σ{W(i)^2 g*gᵀ} * Cxᵀ + Cy * Σ{W(i+1)^2 g*gᵀ} * Cyᵀ,
+            where the sums are (3x3) weighted moments of the stations.
+
+            Args:
+                sigma0 (float): A-priori sigma0 (σ0) for the formulation of the
+                    weight matrix.
+
+            Returns:
+                tuple (numpy.array, numpy.array, float): AᵀA (6x6), Aᵀb (6x1)
+                    and bᵀb
+        """
+        W = sigma0 * self.make_weight_matrix()
+        return _normal_equations(W[0::2,0], W[1::2,0], \
+                                 self.__stalst__.lon - self.__xcmp__, \
+                                 self.__stalst__.lat - self.__ycmp__, \
+                                 self.__stalst__.ve, self.__stalst__.vn)
+
+    def solve_normal_equations(self):
+        """ Solve the LS problem via the normal equations, using a Cholesky
+            factorization.
+
+            The normal equations (see ShenStrain.normal_equations) are
+            (Jacobi) scaled and factorized; the a-posteriori std. deviation is
+            computed from the weighted residuals u^T * P * u and the parameter
+            VcV matrix as σ0^2 * (AᵀPA)^-1.
+
+            Returns:
+                tuple (numpy.array, float, numpy.array): the estimates (6x1),
+                    the a-posteriori std. deviation and the VcV matrix (6x6)
+
+            Raises:
+                numpy.linalg.LinAlgError if the normal matrix is not positive
+                definite or is (numerically) singular; also if less than 4
+                stations are available.
+        """
+        if len(self.__stalst__) <= 3:
+            raise numpy.linalg.LinAlgError('[ERROR] Too few obs to solve the normal equations')
+        W  = self.make_weight_matrix()
+        return _solve_normal_equations(W[0::2,0], W[1::2,0], \
+                                       self.__stalst__.lon - self.__xcmp__, \
+                                       self.__stalst__.lat - self.__ycmp__, \
+                                       self.__stalst__.ve, self.__stalst__.vn)
 
     def make_weight_matrix(self):
         """ Construct the square root of weight matrix W <- P^(1/2)
@@ -370,17 +731,11 @@ class ShenStrain:
         W = numpy.ones(shape=(N,1))
         ## Use Shen's weighting scheme
         if self.__options__['weighting_function'] == 'shen':
-            if not self.__zweights__ or not self.__lweights__:
+            if self.__zweights__ is None or self.__lweights__ is None:
                 raise RuntimeError("[ERROR] Z or L weights not set; cannot compute weight matrices")
-            d_coef = self.__options__['d_coef']
-            zw = self.__zweights__
-            lw = self.__lweights__
-            i = 0
-            for idx, sta in enumerate(self.__stalst__):
-                W[i]   = (1e0/sta.se)*sqrt(zw[idx]*lw[idx])
-                W[i+1] = (1e0/sta.sn)*sqrt(zw[idx]*lw[idx])
-                i += 2
-            assert i == N
+            zl = numpy.sqrt(numpy.asarray(self.__zweights__)*numpy.asarray(self.__lweights__))
+            W[0::2,0] = (1e0/self.__stalst__.se)*zl
+            W[1::2,0] = (1e0/self.__stalst__.sn)*zl
         elif self.__options__['weighting_function'] == 'equal_weights':
             self.vprint('[DEBUG] Using equal-weight covar matrix!')
             #pass
@@ -405,14 +760,14 @@ class ShenStrain:
             component and Station.lat is considered the 'y' component.
 
             Args:
-                other_sta_lst (list of Station) : A list of Station instances. For
-                    each one a weight will be computed and returned. If not given,
-                    the instance's __stalst__ list will be used.
+                other_sta_lst (list of Station or StationArray) : the stations.
+                    For each one a weight will be computed and returned. If not
+                    given, the instance's __stalst__ will be used.
 
             Returns:
-                list of floats: Each element in the list is the weight of the
+                numpy.array: Each element in the array is the weight of the
                     respective station in the input station list (aka 
-                    len(list) == len(other_sta_lst))
+                    len(array) == len(other_sta_lst))
 
             Warning:
                 The weighting function is NOT Z(i) = n*θ(i) / 4π, but it is
@@ -421,14 +776,14 @@ class ShenStrain:
                 where azi_avrg = 0.25 * 360 / n
                 and azi_tot = (1+0.25)*3600
         """
-        stalst = self.__stalst__ if other_sta_lst is None else other_sta_lst
+        stalst = self.__stalst__ if other_sta_lst is None else as_station_array(other_sta_lst)
         n = len(stalst)
         thetas = self.compute_theta_angles(stalst)
         assert len(thetas) == n
         wt_az = 0.25e0
         azi_avrg = wt_az * 360e0 / n
         azi_tot = (1e0+wt_az)*360e0
-        return [ (0.5e0*degrees(a)+azi_avrg)*n/azi_tot for a in thetas ]
+        return (0.5e0*numpy.degrees(thetas)+azi_avrg)*n/azi_tot
 
     def compute_theta_angles(self, other_sta_lst=None):
         """ Compute θ angles, aka next minus the previous point.
@@ -453,31 +808,30 @@ class ShenStrain:
                            P(i+1)
             
             Args:
-                other_sta_lst: A list of Station instances. For each one a θ (theta)
-                    angle is computed and returned. If not given, the instance's
-                    __stalst__ list will be used.
+                other_sta_lst: A list of Station instances or a StationArray.
+                    For each station a θ (theta) angle is computed and returned.
+                    If not given, the instance's __stalst__ will be used.
 
             Returns:
-                list of floats. Each element in the list, is the θ angle of
-                    the corresponding station in other_sta_lst.
+                numpy.array of floats. Each element in the array, is the θ
+                    angle of the corresponding station in other_sta_lst.
         """
         stalst = self.__stalst__ if other_sta_lst is None else other_sta_lst
         n = len(stalst)
-        azimouths = self.azimouths(stalst)
-        assert len(azimouths) == n
-        thetas = []
+        az, nr = self.azimouth_array(stalst)
+        assert len(az) == n
+        thetas = numpy.empty(n)
+        thetas[1:n-1] = az[2:] - az[:n-2]
         ##  Special care for the first and last elements (theta angles).
-        thetas.append({'w' : 2e0*pi+(azimouths[1]['az'] - azimouths[n-1]['az']),\
-                       'nr': azimouths[0]['nr']})
-        for j in range(1, n-1):
-            thetas.append({'w':azimouths[j+1]['az'] - azimouths[j-1]['az'],\
-                          'nr':azimouths[j]['nr']})
-        thetas.append({'w': 2e0*pi+(azimouths[0]['az'] - azimouths[n-2]['az']),\
-                      'nr':azimouths[n-1]['nr']})
+        thetas[0]   = 2e0*pi+(az[1] - az[n-1])
+        thetas[n-1] = 2e0*pi+(az[0] - az[n-2])
         ##  Double-check !! All theta angles must be in the range [0, 2*π)
         if DEBUG_MODE:
-            for angle in thetas: assert angle['w'] >= 0 and angle['w'] <= 2*pi
-        return [ i['w'] for i in sorted(thetas, key=operator.itemgetter('nr')) ]
+            assert (thetas >= 0).all() and (thetas <= 2*pi).all()
+        ## thetas are in azimouth order; return them in station order
+        w = numpy.empty(n)
+        w[nr] = thetas
+        return w
 
     def l_weights(self, other_sta_lst=None):
         """ Compute distance-dependent weights.
@@ -496,40 +850,32 @@ class ShenStrain:
             will be extracted from __options__['d_coef'], which should be in km.
 
             Args:
-                other_sta_lst: A list of Station instances, i.e. the list of
-                    stations. If not given, the instance's __stalst__ will be
-                    used.
+                other_sta_lst: A list of Station instances or a StationArray,
+                    i.e. the stations. If not given, the instance's __stalst__
+                    will be used.
 
             Returns:
-                tuple: (list, float)
-                list is a list of weights (i.e. L(i) values) for each station,
-                in the order they are passed in.
+                tuple: (numpy.array, float)
+                numpy.array holds the weights (i.e. L(i) values) for each
+                station, in the order they are passed in.
                 float is the D value used to compute the weights.
 
         """
-        ##  Note: d and dri must be in the same units (here km).
-        def gaussian(dri, d):  return exp(-pow(dri/d,2))
-        def quadratic(dri, d): return 1e0/(1e0+pow(dri/d,2))
         ## assign the correct weighting formula
-        if self.__options__['ltype'] == 'gaussian':
-            l_i = gaussian
-        elif self.__options__['ltype'] == 'quadratic':
-            l_i = quadratic
-        else:
-            raise RuntimeError("[ERROR] Invalid distance-dependent weighting function")
-        
-        stalst = self.__stalst__ if other_sta_lst is None else other_sta_lst
+        l_i = _l_function(self.__options__['ltype'])
+
+        stalst = self.__stalst__ if other_sta_lst is None else as_station_array(other_sta_lst)
 
         #  Distances for each point from center in km.
-        dr = [ sqrt((x.lon-self.__xcmp__)*(x.lon-self.__xcmp__)+\
-                    (x.lat-self.__ycmp__)*(x.lat-self.__ycmp__))/1000e0 \
-                    for x in stalst ]
+        dx = stalst.lon-self.__xcmp__
+        dy = stalst.lat-self.__ycmp__
+        dr = numpy.sqrt(dx*dx + dy*dy)/1000e0
         d = float(self.__options__['d_coef'])
         if not d:
             raise RuntimeError("[ERROR] D-coefficient ton set; cannot compute distance-dependent weights")
-        return [ l_i(dri,d) for dri in dr ], d
+        return l_i(dr,d), d
 
-    def find_optimal_d(self):
+    def find_optimal_d(self, d_hint=None):
         """ Find optimal D coefficient, for distance weighting.
 
             This function will test the range [dmin, dstep) with a step of
@@ -563,12 +909,22 @@ class ShenStrain:
 
             Returns:
                 a tuple with elements:
-                -- list (floats): the lweights (i.e. distance weights) computed 
-                    with the optimal D coeff.
-                -- list (floats): the zweights (i.e. spatial weights) computed
-                    with the optimal D coeff
+                -- numpy.array (floats): the lweights (i.e. distance weights)
+                    computed with the optimal D coeff.
+                -- numpy.array (floats): the zweights (i.e. spatial weights)
+                    computed with the optimal D coeff
                 -- float: The optimal D coefficient in km.
 
+            Note:
+                If __options__['d_search'] is 'incremental' or a hint D is
+                given, the search is delegated to
+                ShenStrain.find_optimal_d_incremental; the results are the
+                same.
+
+            Args:
+                d_hint (float): a first guess for the optimal D (km), e.g. the
+                    optimal D of a neighbouring point; may be None.
+
             Warning:
                 The returned lists (lweights and zweights), may not be of the
                 same size as __stalst__. They actually correspond to the list
@@ -583,6 +939,10 @@ class ShenStrain:
                 RuntimeError if no  optimal D coeff can be found within the
                 range [dmin, dmax).
         """
+        if d_hint is not None or self.__options__['d_search'] == 'incremental':
+            return self.find_optimal_d_incremental(d_hint)
+        elif self.__options__['d_search'] != 'linear':
+            raise RuntimeError("[ERROR] Invalid D search option")
         assert self.__options__['dmin'] < self.__options__['dmax']
         for d in numpy.arange(self.__options__['dmin'], \
                               self.__options__['dmax'], \
@@ -593,13 +953,71 @@ class ShenStrain:
                 lwghts,_ = self.l_weights(new_sta_lst)
                 zwghts   = self.z_weights(new_sta_lst)
                 assert len(lwghts) == len(zwghts)
-                w = sum([ x[0]*x[1] for x in zip(lwghts,zwghts) ])*2 # w(i) = l(i)*z(i)
+                w = (lwghts*zwghts).sum()*2 # w(i) = l(i)*z(i)
                 if int(round(w)) >= int(self.__options__['Wt']):
                     return lwghts, zwghts, d
         # Fuck! cannot find optimal D
         self.vprint('[ERROR] Cannot compute optimal D in weighting scheme')
         raise RuntimeError
 
+    def find_optimal_d_incremental(self, d_hint=None):
+        """ Find optimal D coefficient, for distance weighting (incremental).
+
+            Same as ShenStrain.find_optimal_d, i.e. the first D in the range
+            [dmin, dmax) with a step of dstep for which int(round(W)) >= Wt,
+            but without filtering/sorting the station list for every D. As D
+            grows, stations are only added to the set within the cut-off
+            distance; hence the function will:
+                - sort the stations by distance from the instance's centre
+                  (once) and get the number of stations n(D) for every D via
+                  a binary search of the (squared) cut-off distances,
+                - bisect the D range to find the first D that could possibly
+                  satisfy the criterion; W is bounded from above by
+                  U(D) = 2 * (0.5*n*Lmax*720 + 90*Σ{L(i)}) / 450
+                  (since Σ{θ(i)} = 720 deg.), where Lmax is the distance weight
+                  of the nearest station. U(D) does not decrease with D,
+                - loop through D's from that point on; new stations are
+                  inserted in an azimouth-sorted array, so that θ angles (and
+                  Z-weights) are only re-computed when n(D) changes.
+            The D, L- and Z-weights returned are exactly the ones of the linear
+            search (weights are in the order of filter_sta_wrt_distance).
+
+            If a hint D is given (e.g. the optimal D of a neighbouring point),
+            the criterion is first tested at the hint and the search then
+            proceeds to smaller and larger D's. Ranges of D are discarded as a
+            whole when an upper bound of W within the range (see
+            _OptimalDSearch.range_bound) is below Wt; so only a few D's need
+            to be tested if the hint is close to the optimal D. The result
+            is still the first D on the [dmin, dmax) lattice that satisfies
+            the criterion.
+
+            Args:
+                d_hint (float): a first guess for the optimal D (km); may be
+                    None.
+
+            Returns:
+                same as ShenStrain.find_optimal_d
+
+            Raises:
+                RuntimeError if no  optimal D coeff can be found within the
+                range [dmin, dmax).
+        """
+        assert self.__options__['dmin'] < self.__options__['dmax']
+        search = _OptimalDSearch(self.__stalst__, self._index, self.__options__,
+            self.__xcmp__, self.__ycmp__)
+        if d_hint is None:
+            found = search.sweep()
+        else:
+            found = search.from_hint(d_hint)
+        self.vprint('[DEBUG] Tested {:} D values in search for optimal D'.format(search.tests))
+        if found is None:
+            # Fuck! cannot find optimal D
+            self.vprint('[ERROR] Cannot compute optimal D in weighting scheme')
+            raise RuntimeError
+        lwghts, zwghts, d = found
+        self.__options__['d_coef'] = d
+        return lwghts, zwghts, d
+
     def beta_angles(self):
         """ Return the β angles (internal angles).
 
@@ -618,24 +1036,23 @@ class ShenStrain:
                        C
 
             Returns:
-                list (float): The β angles (all in range [0, 2π)). The length
-                    of the returned list, is the length of __stalst__ minus one.
+                numpy.array (float): The β angles (all in range [0, 2π)). The
+                    length of the returned array, is the length of __stalst__.
                     Note that the β angles are **not in correspondance** with 
                     the __stalst__ list (aka, β[0] is not the angle between
                     __stalst__[0] and __stalst__[1]).
         """
-        ##  Note that this->azimouths() returns a dictionary, sorted on the
-        ##+ the azimouth value. Hence, azimouths[0]['az'] may not be the
-        ##+ azimouth of the line from the centre to station[0].
-        azimouths = self.azimouths()
-        n = len(azimouths)
-        betas = []
-        betas.append(2e0*pi+(azimouths[0]['az'] - azimouths[n-1]['az']))
-        for j in range(0, n-1):
-            betas.append(azimouths[j+1]['az'] - azimouths[j]['az'])
+        ##  Note that this->azimouth_array() returns the azimouths sorted.
+        ##+ Hence, az[0] may not be the azimouth of the line from the centre
+        ##+ to station[0].
+        az, _ = self.azimouth_array()
+        n = len(az)
+        betas = numpy.empty(n)
+        betas[0]  = 2e0*pi+(az[0] - az[n-1])
+        betas[1:] = az[1:] - az[:n-1]
         ##  Double-check !! All theta angles must be in the range [0, 2*π)
         if DEBUG_MODE:
-            for angle in betas: assert angle >= 0 and angle <= 2*pi
+            assert (betas >= 0).all() and (betas <= 2*pi).all()
         assert len(betas) == n
         return betas
 
@@ -693,90 +1110,15 @@ class ShenStrain:
             Note:
                 Normaly, the user should call the funtion with self.__vcv__ as
                 the (input) params_cov parameter.
+                To compute the parameters of many tensors at once, use the
+                (vectorized) function cmp_strain_batch.
 
             Refs:
                 The functions to compute the strain parameters, are taken from
                 Shen's VISR fortran code.
         '''
-        x1  = self.__parameters__['taux']   ## strain/yr
-        x2  = self.__parameters__['tauxy']  ## strain/yr
-        x3  = self.__parameters__['tauy']   ## strain/yr
-        cov = pi / 180e0
-        ##  estimate principle strain rates emax, emin, maximum shear tau_max, 
-        ##+ and dextral tau_max azimuth
-        emean = (x1+x3) / 2e0               ## strain/yr
-        ediff = (x1-x3) / 2e0               ## strain/yr
-        taumax= sqrt(x2**2 + ediff**2)      ## strain/yr
-        emax  = emean+taumax                ## strain/yr
-        emin  = emean-taumax                ## strain/yr
-        azim  = -atan2(x2, ediff) / cov / 2.0e0 ## degrees
-        azim  = 90e0+azim
-        dexazim = azim+45e0-180e0
-        dilat = x1+x3                       ## strain/yr
-        sec_inv = sqrt(x1*x1+2e0*x2*x2+x3*x3)
-        if params_cov is None:
-            staumax, semax, semin, sazim, sdilat, ssec_inv = [None] * 6
-        else:
-            nv, mv = params_cov.shape
-            assert nv == mv and nv == 6
-            """
-            # cut the part of vcv that holds tau* info
-            vcv = params_cov[2:5, 2:5]
-            v   = numpy.zeros(shape=(3,1))
-            # estimate sigma of tau_max
-            v[0,:] = (x1-x3)/4e0/taumax
-            v[1,:] = x2/taumax
-            v[2,:] = -v[0,:]
-            staumax = sqrt(numpy.dot(v.T, numpy.dot(vcv, v)))
-            # estimate sigma of emax
-            v[0,:] = 0.5e0*(1+(x1-x3)/2e0/taumax)
-            v[1,:] = x2/taumax
-            v[2,:] = 0.5e0*(1-(x1-x3)/2e0/taumax)
-            semax = sqrt(numpy.dot(v.T, numpy.dot(vcv, v)))
-            # estimate sigma of emin
-            v[0,:] = 0.5e0*(1-(x1-x3)/2e0/taumax)
-            v[1,:] = -x2/taumax
-            v[2,:] = 0.5e0*(1+(x1-x3)/2e0/taumax)
-            semin = sqrt(numpy.dot(v.T, numpy.dot(vcv, v)))
-            # estimate sigma of azimuth
-            cf = 1e0/((x1-x3)**2e0+4e0*x2**2e0)
-            v[0,:] = cf*x2
-            v[1,:] = -cf*(x1-x3)
-            v[2,:] = -v[0,:]
-            sazim = sqrt(numpy.dot(v.T, numpy.dot(vcv, v)))
-            # estimate sigma of dilatation
-            sdilat = sqrt(vcv[0,0]+vcv[2,2]+2e0*vcv[0,2])
-            """
-            ## Error propagation for non-linear functions, aka V <- J*VcV*J^T
-            ## where J is the Jacobian matrix and VcV the var-covar matrix of
-            ## the parameter vector: [Ux, Uy, τx, τxy, τy, ω]
-            ## rows of the Jacobian are:
-            ## [τ_max, e_max, e_min, Azim, dilatation, sec_inv]
-            ## first row is:
-            ## [ dτ_max/dUx, dτ_max/dUy, dτ_max/dτx, dτ_max/dτxy, dτ_max/dτy, dτ_max/dω ]
-            J = numpy.zeros(shape=(6,6))
-            _tmp = ediff/(2e0*taumax)
-            J[0, :] = [ 0e0, 0e0, _tmp,           x2/taumax,        -_tmp,          0e0 ]
-            J[1, :] = [ 0e0, 0e0, .5e0+_tmp,      x2/taumax,         .5e0-_tmp,     0e0 ]
-            J[2, :] = [ 0e0, 0e0, .5e0-_tmp,     -x2/taumax,         .5e0+_tmp,     0e0 ]
-            _tmp = ediff*ediff + x2*x2
-            J[3, :] = [ 0e0, 0e0, x2/(4e0*_tmp), -ediff/(4e0*_tmp), -x2/(4e0*_tmp), 0e0 ]
-            J[4, :] = [ 0e0, 0e0, 1e0,            0e0,               1e0,           0e0 ]
-            J[5, :] = [ 0e0, 0e0, x1/sec_inv,     2e0*x2/sec_inv,    x3/sec_inv,    0e0 ]
-            Vy = numpy.dot(J, numpy.dot(params_cov, J.T))
-            staumax = sqrt(Vy[0,0])
-            semax   = sqrt(Vy[1,1])
-            semin   = sqrt(Vy[2,2])
-            sazim   = sqrt(Vy[3,3])
-            sdilat  = sqrt(Vy[4,4])
-            ssec_inv= sqrt(Vy[5,5])
-        return emean, ediff, \
-            taumax, staumax, \
-            emax, semax, \
-            emin, semin, \
-            azim, sazim, \
-            dilat, sdilat, \
-            sec_inv, ssec_inv
+        return _cmp_strain(self.__parameters__['taux'], \
+            self.__parameters__['tauxy'], self.__parameters__['tauy'], params_cov)
 
     def info(self):
         return __strain_info__(self.__parameters__)
@@ -796,84 +1138,59 @@ class ShenStrain:
             Args:
                 fout (output stream): the (already opened) output stream where
                     the details will be written
-                utm_zone (int): If given, then the instance's __xcmp__ and 
-                    __ycmp__ will be considered UTM Easting and Northing
-                    coordinates in the given Zone, and will be transformed to
-                    longtitude and latitude before the actual writting takes
-                    place.
+                utm_zone (int or UTMProjection): If given, then the
+                    instance's __xcmp__ and __ycmp__ will be considered UTM
+                    Easting and Northing coordinates in the given Zone (or
+                    projection), and will be transformed to longtitude and
+                    latitude before the actual writting takes place. Pass in
+                    a UTMProjection when printing many tensors, so that the
+                    projection constants are only computed once.
             Note:
                 if the instance's __vcv__ is None (aka we have no var-covar
                 matrix), then the sigmas will be printed as '-'
         """
-        if utm_zone:
-            cy, cx = [ degrees(c) for c in utm2ell(self.__xcmp__, self.__ycmp__ , utm_zone) ]
-        else:
-            cx, cy = self.__xcmp__,  self.__ycmp__
-        emean, ediff, taumax, staumax, emax, semax, emin, semin, azim, sazim, \
-            dilat, sdilat, sec_inv, ssec_inv =  self.cmp_strain(self.__vcv__)
-        if self.__vcv__ is not None:
-            print('{:9.5f} {:9.5f} {:+7.1f} {:7.1f} {:+7.1f} '\
-            '{:7.1f} {:+7.1f} {:7.1f} {:+7.1f} {:7.1f} {:+7.1f} {:7.1f} '\
-            '{:+7.1f} {:7.1f} {:+7.1f} {:7.1f} {:+7.1f} {:7.1f} {:+7.1f} '\
-            '{:7.1f} {:+7.1f} {:7.1f} {:+7.1f} {:7.1f} {:+7.1f} {:7.1f}'.format(cy, cx, \
-            self.value_of('Ux')*1e3, sqrt(self.__vcv__[0,0])*1e3, \
-            self.value_of('Uy')*1e3, sqrt(self.__vcv__[1,1])*1e3, \
-            self.value_of('omega')*1e9*0.206e0/3.6e0, sqrt(self.__vcv__[5,5])*1e9*0.206e0/3.6e0, \
-            self.value_of('taux')*1e9, sqrt(self.__vcv__[2,2])*1e9, \
-            self.value_of('tauxy')*1e9, sqrt(self.__vcv__[3,3])*1e9, \
-            self.value_of('tauy')*1e9, sqrt(self.__vcv__[4,4])*1e9, \
-            emax*1e9, semax*1e9, emin*1e9, semin*1e9, taumax*1e9, \
-            staumax*1e9, azim, sazim, dilat*1e9, sdilat*1e9, sec_inv*1e9, ssec_inv*1e9), file=fout)
-        else:
-            novar = '-'
-            print('{:9.5f} {:9.5f} {:+7.1f} {:7s} {:+7.1f} '\
-            '{:7s} {:+7.1f} {:7s} {:+7.1f} {:7s} {:+7.1f} {:7s} '\
-            '{:+7.1f} {:7s} {:+7.1f} {:7s} {:+7.1f} {:7s} {:+7.1f} '\
-            '{:7s} {:+7.1f} {:7s} {:+7.1f} {:7s} {:+7.1f} {:7s}'.format(cy, cx, \
-            self.value_of('Ux')*1e3, novar, \
-            self.value_of('Uy')*1e3, novar, \
-            self.value_of('omega')*1e9*0.206e0/3.6e0, novar, \
-            self.value_of('taux')*1e9, novar, \
-            self.value_of('tauxy')*1e9, novar, \
-            self.value_of('tauy')*1e9, novar, \
-            emax*1e9, novar, emin*1e9, novar, taumax*1e9, \
-            novar, azim, novar, dilat*1e9, novar, sec_inv*1e9, novar), file=fout)
-    
+        ## missing sigmas are printed left-aligned here
+        fout.write(format_details(self.details(utm_zone), novar='{:7s}'.format('-')))
+
     def print_details_v2(self, fout, utm_zone=None):
-        if utm_zone:
-            cy, cx = [ degrees(c) for c in utm2ell(self.__xcmp__, self.__ycmp__ , utm_zone) ]
-        else:
-            cx, cy = self.__xcmp__,  self.__ycmp__
-        emean, ediff, taumax, staumax, emax, semax, emin, semin, azim, sazim, \
-            dilat, sdilat, sec_inv, ssec_inv =  self.cmp_strain(self.__vcv__)
-        if self.__vcv__ is not None:
-            lstr = '%9.5f %9.5f %+7.1f %7.1f %+7.1f '\
-            '%7.1f %+7.1f %7.1f %+7.1f %7.1f %+7.1f %7.1f '\
-            '%+7.1f %7.1f %+7.1f %7.1f %+7.1f %7.1f %+7.1f '\
-            '%7.1f %+7.1f %7.1f %+7.1f %7.1f %+7.1f %7.1f\n' %(cy, cx, \
-            self.value_of('Ux')*1e3, sqrt(self.__vcv__[0,0])*1e3, \
-            self.value_of('Uy')*1e3, sqrt(self.__vcv__[1,1])*1e3, \
-            self.value_of('omega')*1e9*0.206e0/3.6e0, sqrt(self.__vcv__[5,5])*1e9*0.206e0/3.6e0, \
-            self.value_of('taux')*1e9, sqrt(self.__vcv__[2,2])*1e9, \
-            self.value_of('tauxy')*1e9, sqrt(self.__vcv__[3,3])*1e9, \
-            self.value_of('tauy')*1e9, sqrt(self.__vcv__[4,4])*1e9, \
-            emax*1e9, semax*1e9, emin*1e9, semin*1e9, taumax*1e9, \
-            staumax*1e9, azim, sazim, dilat*1e9, sdilat*1e9, sec_inv*1e9, ssec_inv*1e9)
-        else:
-            novar = '-'
-            lstr = '%9.5f %9.5f %+7.1f %7s %+7.1f '\
-            '%7s %+7.1f %7s %+7.1f %7s %+7.1f %7s '\
-            '%+7.1f %7s %+7.1f %7s %+7.1f %7s %+7.1f '\
-            '%7s %+7.1f %7s %+7.1f %7s %+7.1f %7s\n' %(cy, cx, \
-            self.value_of('Ux')*1e3, novar, \
-            self.value_of('Uy')*1e3, novar, \
-            self.value_of('omega')*1e9*0.206e0/3.6e0, novar, \
-            self.value_of('taux')*1e9, novar, \
-            self.value_of('tauxy')*1e9, novar, \
-            self.value_of('tauy')*1e9, novar, \
-            emax*1e9, novar, emin*1e9, novar, taumax*1e9, \
-            novar, azim, novar, dilat*1e9, novar, sec_inv*1e9, novar)
-        fout.write(lstr)
+        fout.write(format_details(self.details(utm_zone)))
+
+    def details(self, utm_zone=None):
+        """Strain Tensor details, as numbers.
+
+            Return the values printed by print_details, in the same order and
+            units (see STRAIN_DETAILS_COLUMNS), i.e. each parameter followed
+            by its std. deviation. If the instance's __vcv__ is None, the
+            std. deviations are NaN.
+
+            Args:
+                utm_zone (int or UTMProjection): see print_details.
+
+            Returns:
+                tuple (float): the 26 values.
+        """
+        return _strain_details(self.__xcmp__, self.__ycmp__, [ self.__parameters__[k] \
+            for k in ('Ux', 'Uy', 'taux', 'tauxy', 'tauy', 'omega') ], self.__vcv__, utm_zone)
+
+    def result(self, utm_zone=None):
+        """Estimation result as a NODE_RESULT_DTYPE record (tuple).
+
+            The record holds the status (NODE_ESTIMATED), the number of
+            stations used, the optimal D, the cut-off distance, the
+            a-posteriori std. deviation (any of these not available is NaN)
+            and the Strain Tensor details (see details).
+
+            Args:
+                utm_zone (int or UTMProjection): see print_details.
+
+            Returns:
+                tuple: the record fields.
+        """
+        stats = (self.__options__['d_coef'], self.__options__['cutoff_dis'],
+            getattr(self, '__sigma0__', None))
+        return (NODE_ESTIMATED, len(self.__stalst__)) \
+            + tuple(float('nan') if v is None else v for v in stats) \
+            + self.details(utm_zone)
 
     def value_of(self, key):
         """Kinda getter.
@@ -914,7 +1231,7 @@ class ShenStrain:
         """
         self.__xcmp__, self.__ycmp__ = barycenter(self.__stalst__)
 
-    def estimate(self):
+    def estimate(self, d_hint=None):
         """ Estimate fundamental parameters of the Strain Tensor.
 
             This function will (try to) estimate the Strain Tensor's fundamental
@@ -954,6 +1271,18 @@ class ShenStrain:
                 self.__lweights__
                 self.__stalst__
 
+            Args:
+                d_hint (float): Only relevant for the "shen" weighting function
+                    and if __options__['d_coef'] is not set. A first guess for
+                    the optimal D (km), e.g. the optimal D of a neighbouring
+                    point. It speeds up the search but does not change the
+                    optimal D found (see find_optimal_d_incremental).
+
+            If __options__['ls_solver'] is 'cholesky', steps 4 and 5 are
+            performed via ShenStrain.solve_normal_equations (i.e. without
+            forming A and b); if the normal equations can not be solved (or
+            only 3 stations are available), the lstsq solution is used.
+
             Returns:
                 numpy.array (6x1): The least squares solution (or if num. of
                     stations is 3 the 'exact' solution) for the Strain.
@@ -965,55 +1294,927 @@ class ShenStrain:
                 a-priori std. deviation). I think i need this here to compute
                 the a-posteriori std. deviation.
         """
-        ##  If we are using Shen's weighting sheme, the find D, lweights and
-        ##+ zweights.
+        solver = ShenSolver(self.__stalst__, station_index=self._index, **self.__options__)
+        sel, lwghts, zwghts, d, estim, sigma0, vcv = solver.estimate(self.__xcmp__, self.__ycmp__, d_hint)
         if self.__options__['weighting_function'] == 'shen':
-            if not self.__options__['d_coef']:
+            self.__options__['d_coef'] = d
+            self.__stalst__ = self.__stalst__[sel]
+            self.__zweights__ = zwghts
+            self.__lweights__ = lwghts
+        if sigma0 is not None: self.__sigma0__ = sigma0
+        self.__vcv__ = vcv
+        self.__parameters__['Ux']    = float(estim[0,0])
+        self.__parameters__['Uy']    = float(estim[1,0])
+        self.__parameters__['taux']  = float(estim[2,0])
+        self.__parameters__['tauxy'] = float(estim[3,0])
+        self.__parameters__['tauy']  = float(estim[4,0])
+        self.__parameters__['omega'] = float(estim[5,0])
+        return estim
+
+class ShenSolver:
+    """A reusable Strain Tensor estimator (Shen's algorithm).
+
+        A ShenSolver is configured once, with the stations and the options
+        (see ShenStrain), and then estimates Strain Tensors at any number of
+        points (see solve). Unlike ShenStrain, it keeps no per-point state:
+        the per-station quantities (distances and azimouths from the point)
+        are computed in scratch arrays allocated once, and the stations used
+        at each point are handled as indexes, not new StationArrays. All
+        quantities are computed exactly as in ShenStrain, so that results are
+        identical; ShenStrain.estimate is actually performed by a ShenSolver.
+
+        Attributes:
+            _stalst (StationArray): the stations.
+            _index (StationIndex): spatial index of the stations (or None).
+            _options (dictionary): the options (see ShenStrain).
+            _xcmp, _ycmp (float): the point last estimated.
+            utm_zone (int or UTMProjection): see solve.
+            max_beta_angle (float): see solve.
+            vprint (function): print() in verbose mode, else a noop.
+    """
+
+    def __init__(self, station_list, station_index=None, utm_zone=None, max_beta_angle=None, **kwargs):
+        """ ShenSolver constructor.
+
+            Args:
+                station_list (list of Station or StationArray): the stations;
+                    coordinates must be cartesian (e.g. UTM), in meters.
+                station_index (StationIndex): a spatial index built from
+                    station_list (optional, used in the incremental D search).
+                utm_zone (int or UTMProjection): the projection of the
+                    points; used to report the points' latitude and
+                    longtitude in results (see ShenStrain.details).
+                max_beta_angle (float): if not None, points where the max β
+                    angle (see max_beta) is larger than this limit (degrees)
+                    are not estimated.
+                **kwargs: any of the ShenStrain options (unknown keys are
+                    ignored).
+        """
+        self._stalst = as_station_array(station_list)
+        self._index = station_index
+        self._options = _shen_options(**kwargs)
+        self._xcmp, self._ycmp = 0e0, 0e0
+        self.utm_zone = utm_zone
+        self.max_beta_angle = max_beta_angle
+        self.vprint = print if self._options['verbose_mode'] else lambda *a, **k: None
+        ##  scratch arrays; Δx, Δy, squared distance (km^2), distance (km) and
+        ##+ azimouth of each station from the current point
+        n = len(self._stalst)
+        self._dx, self._dy = numpy.empty(n), numpy.empty(n)
+        self._sqd, self._dr = numpy.empty(n), numpy.empty(n)
+        self._az, self._tmp = numpy.empty(n), numpy.empty(n)
+        self._ready = False
+
+    def _centre(self, x, y):
+        """ Set the current point and fill in the scratch arrays; every
+            quantity is computed as in the respective ShenStrain method.
+        """
+        if self._ready and x == self._xcmp and y == self._ycmp:
+            return
+        sta, dx, dy, tmp = self._stalst, self._dx, self._dy, self._tmp
+        self._xcmp, self._ycmp = x, y
+        numpy.subtract(sta.lon, x, out=dx)
+        numpy.subtract(sta.lat, y, out=dy)
+        ## as in filter_sta_wrt_distance
+        numpy.divide(dy, 1e3, out=self._sqd)
+        numpy.multiply(self._sqd, self._sqd, out=self._sqd)
+        numpy.divide(dx, 1e3, out=tmp)
+        numpy.multiply(tmp, tmp, out=tmp)
+        numpy.add(self._sqd, tmp, out=self._sqd)
+        ## as in l_weights
+        numpy.multiply(dx, dx, out=self._dr)
+        numpy.multiply(dy, dy, out=tmp)
+        numpy.add(self._dr, tmp, out=self._dr)
+        numpy.sqrt(self._dr, out=self._dr)
+        numpy.divide(self._dr, 1000e0, out=self._dr)
+        ## as in azimouth_array
+        numpy.arctan2(dx, dy, out=self._az)
+        numpy.add(self._az, 2e0*pi, out=self._az, where=self._az<0e0)
+        self._ready = True
+
+    def max_beta(self, x, y):
+        """ The max β angle (see ShenStrain.beta_angles) at (x, y), in
+            degrees; all stations are considered.
+        """
+        self._centre(x, y)
+        az = self._tmp
+        az[:] = self._az
+        az.sort()
+        beta = 2e0*pi+(az[0] - az[-1])
+        if len(az) > 1: beta = max(beta, numpy.diff(az).max())
+        return degrees(beta)
+
+    def _within(self, d):
+        """ Indexes of the stations within the cut-off distance for D=d. """
+        limit = self._options['cutoff_dis'] * d
+        return numpy.flatnonzero(self._sqd <= limit*limit)
+
+    def _optimal_d(self, d_hint=None):
+        """ Search for the optimal D at the current point, as in
+            ShenStrain.find_optimal_d; returns the indexes of the stations
+            within the cut-off distance, their L- and Z-weights and D.
+
+            The linear search sorts the stations by distance once; the
+            stations within the cut-off distance for each D are then a
+            prefix of the sorted stations (and Z-weights only change when
+            their number does).
+        """
+        options = self._options
+        if d_hint is not None or options['d_search'] == 'incremental':
+            assert options['dmin'] < options['dmax']
+            search = _OptimalDSearch(self._stalst, self._index, options, self._xcmp, self._ycmp)
+            found = search.sweep() if d_hint is None else search.from_hint(d_hint)
+            self.vprint('[DEBUG] Tested {:} D values in search for optimal D'.format(search.tests))
+            if found is not None:
+                lwghts, zwghts, d = found
+                return self._within(d), lwghts, zwghts, d
+        elif options['d_search'] != 'linear':
+            raise RuntimeError("[ERROR] Invalid D search option")
+        else:
+            assert options['dmin'] < options['dmax']
+            l_i = _l_function(options['ltype'])
+            d_range = numpy.arange(options['dmin'], options['dmax'], options['dstep'])
+            limits = options['cutoff_dis']*d_range
+            ##  only the stations within the cut-off distance of D(wj) are
+            ##+ sorted; the window wj is doubled as needed
+            n, wj = 0, -1
+            for j, d in enumerate(d_range):
+                if j > wj:
+                    wj = min(2*wj+2, len(d_range)-1)
+                    cand = numpy.flatnonzero(self._sqd <= limits[wj]*limits[wj])
+                    order = cand[numpy.argsort(self._sqd[cand], kind='stable')]
+                    nsta = numpy.searchsorted(self._sqd[order], limits[:wj+1]*limits[:wj+1], side='right')
+                nd = nsta[j]
+                if nd != n:
+                    n = nd
+                    if n > 3:
+                        sel = numpy.sort(order[:n])
+                        zwghts = _z_weights(self._az[sel])
+                        drs = self._dr[sel]
+                if n > 3:
+                    lwghts = l_i(drs, float(d))
+                    w = (lwghts*zwghts).sum()*2 # w(i) = l(i)*z(i)
+                    if int(round(w)) >= int(options['Wt']):
+                        return sel, lwghts, zwghts, d
+        self.vprint('[ERROR] Cannot compute optimal D in weighting scheme')
+        raise RuntimeError
+
+    def _weights(self, d_hint=None):
+        """ Stations (indexes) used at the current point and their square
+            root weights (see ShenStrain.make_weight_matrix), along with the
+            L- and Z-weights and D (these are None if not using Shen's
+            weighting scheme).
+        """
+        options = self._options
+        if options['weighting_function'] == 'shen':
+            if not options['d_coef']:
                 self.vprint('[DEBUG] Searching for optimal D parameter.')
-                if self.__options__['dmin'] >= self.__options__['dmax'] or self.__options__['dstep'] < 0:
+                if options['dmin'] >= options['dmax'] or options['dstep'] < 0:
                     raise RuntimeError
-                lwghts, zwghts, d = self.find_optimal_d()
-                self.__stalst__ = self.filter_sta_wrt_distance(d)
+                sel, lwghts, zwghts, d = self._optimal_d(d_hint)
             else:
-                d = self.__options__['d_coef']
+                d = options['d_coef']
                 self.vprint('[DEBUG] Using optimal D parameter {}km.'.format(d))
-                self.__stalst__ = self.filter_sta_wrt_distance(d)
-                lwghts,_ = self.l_weights()
-                zwghts   = self.z_weights()
-            self.__zweights__ = zwghts
-            self.__lweights__ = lwghts
-        ## Formulate the LS matrices A and b (or AW, bW if shen).
-        A, b = self.ls_matrices()
-        ## Var-Covar matrix
-        VcV  = numpy.dot(A.T, A)
-        m, n = A.shape
-        if m < 6:
-            raise RuntimeError('[ERROR] Too few obs to perform LS.')
-        elif m == 6:
-            self.vprint('[DEBUG] Only 3 stations available; computing NOT estimating strain.')
-            self.__vcv__ = None
-        ##  Note: To silence warning in versions > 1.14.0, use a third argument,
-        ##+ rcond=None; see https://docs.scipy.org/doc/numpy/reference/generated/numpy.linalg.lstsq.html
-        estim, res, rank, sing_vals = numpy.linalg.lstsq(A, b)
-        # Parameter variance-covariance matrix
-        if m > 6:
+                sel = self._within(d)
+                if len(sel) < 3:
+                    raise RuntimeError('[ERROR] Too few obs to perform LS.')
+                lwghts = _l_function(options['ltype'])(self._dr[sel], float(d))
+                zwghts = _z_weights(self._az[sel])
+            zl = numpy.sqrt(numpy.asarray(zwghts)*numpy.asarray(lwghts))
+            wx = (1e0/self._stalst.se[sel])*zl
+            wy = (1e0/self._stalst.sn[sel])*zl
+            return sel, wx, wy, lwghts, zwghts, d
+        elif options['weighting_function'] == 'equal_weights':
+            self.vprint('[DEBUG] Using equal-weight covar matrix!')
+            sel = numpy.arange(len(self._stalst))
+            return sel, numpy.ones(len(sel)), numpy.ones(len(sel)), None, None, options['d_coef']
+        raise RuntimeError("[ERROR] Invalid weighting function option")
+
+    def _fit(self, sel, wx, wy):
+        """ Least squares fit (see _ls_fit) using the stations sel. """
+        return _ls_fit(wx, wy, self._dx[sel], self._dy[sel],
+            self._stalst.ve[sel], self._stalst.vn[sel],
+            self._options['ls_solver'], self.vprint)
+
+    def estimate(self, x, y, d_hint=None):
+        """ Estimate the fundamental parameters of the Strain Tensor at
+            (x, y), as ShenStrain.estimate does.
+
+            Args:
+                x (float): x coordinate (or easting) of the point.
+                y (float): y coordinate (or northing) of the point.
+                d_hint (float): a first guess for the optimal D (km); see
+                    ShenStrain.estimate.
+
+            Returns:
+                tuple: (sel, lweights, zweights, D, estim, sigma0, vcv) where
+                    sel are the indexes of the stations used, lweights and
+                    zweights their L- and Z-weights (None if not using Shen's
+                    weighting scheme), D the (optimal) D coefficient, estim
+                    the estimates [Ux, Uy, τx, τxy, τy, ω] (6x1), sigma0 the
+                    a-posteriori std. deviation and vcv the parameter VcV
+                    matrix (the latter two may be None).
+
+            Raises:
+                RuntimeError: if no optimal D is found, too few stations are
+                    available or an option is invalid.
+        """
+        self._centre(x, y)
+        sel, wx, wy, lwghts, zwghts, d = self._weights(d_hint)
+        estim, sigma0, vcv = self._fit(sel, wx, wy)
+        return sel, lwghts, zwghts, d, estim, sigma0, vcv
+
+    def solve(self, x, y, d_hint=None):
+        """ Estimate the Strain Tensor at (x, y).
+
+            Args:
+                x (float): x coordinate (or easting) of the point.
+                y (float): y coordinate (or northing) of the point.
+                d_hint (float): a first guess for the optimal D (km); see
+                    ShenStrain.estimate.
+
+            Returns:
+                tuple: the fields of a NODE_RESULT_DTYPE record, aka status,
+                    number of stations used, D, cut-off distance, sigma0 and
+                    the Strain Tensor details (see ShenStrain.details); all
+                    but the first two are NaN if the status is not
+                    NODE_ESTIMATED.
+        """
+        nan = float('nan')
+        self._centre(x, y)
+        nsta = len(self._stalst)
+        if nsta < 3:
+            return (NODE_TOO_FEW_OBS, nsta) + (nan,)*(3+len(STRAIN_DETAILS_COLUMNS))
+        if self.max_beta_angle is not None and self.max_beta(x, y) > self.max_beta_angle:
+            return (NODE_LIMITED_COVER, nsta) + (nan,)*(3+len(STRAIN_DETAILS_COLUMNS))
+        try:
+            sel, wx, wy, _, _, d = self._weights(d_hint)
+        except RuntimeError:
+            search = self._options['weighting_function'] == 'shen' and not self._options['d_coef']
+            return (NODE_NO_OPTIMAL_D if search else NODE_TOO_FEW_OBS, nsta) + (nan,)*(3+len(STRAIN_DETAILS_COLUMNS))
+        try:
+            estim, sigma0, vcv = self._fit(sel, wx, wy)
+            details = _strain_details(x, y, estim[:,0].tolist(), vcv, self.utm_zone)
+        except RuntimeError:
+            return (NODE_TOO_FEW_OBS, len(sel)) + (nan,)*(3+len(STRAIN_DETAILS_COLUMNS))
+        except ArithmeticError:
+            return (NODE_NO_VCV, len(sel)) + (nan,)*(3+len(STRAIN_DETAILS_COLUMNS))
+        stats = (d, self._options['cutoff_dis'], sigma0)
+        return (NODE_ESTIMATED, len(sel)) + tuple(nan if v is None else float(v) for v in stats) + details
+
+class _OptimalDSearch:
+    """ Search for the optimal D coefficient at a point (the centre).
+
+        The search is performed on the lattice [dmin:dmax:dstep] (as in
+        ShenStrain.find_optimal_d), using the stations within the cut-off
+        distance of the centre, sorted by distance (a "window").
+        Since stations are only added as D grows, the stations within the
+        cut-off distance for any D in the window are a prefix of the window.
+        All quantities (squared distances, distances, azimouths, weights) are
+        computed exactly as in the linear search, so that the same D and
+        weights are found. See ShenStrain.find_optimal_d_incremental.
+
+        Attributes:
+            x, y (float): the centre.
+            d_range (numpy.array): the D lattice (km)
+            idx (numpy.array): indexes (in stalst) of the stations in the
+                window, sorted by distance
+            dr (numpy.array): distances (km) of the window stations
+            az (numpy.array): azimouths of the window stations
+            nsta (numpy.array): number of stations within the cut-off
+                distance, for every D up to the window's limit
+            tests (int): number of D values tested (i.e. W computed)
+    """
+
+    def __init__(self, stalst, index, options, x, y):
+        """ _OptimalDSearch constructor.
+
+            Args:
+                stalst (StationArray): the stations.
+                index (StationIndex): spatial index of stalst (or None).
+                options (dictionary): the ShenStrain options.
+                x, y (float): the centre.
+        """
+        self.x, self.y = x, y
+        self.options = options
+        self.d_range = numpy.arange(options['dmin'], options['dmax'], options['dstep'])
+        self.limits = options['cutoff_dis']*self.d_range
+        self.l_i = _l_function(options['ltype'])
+        self.wt = int(options['Wt'])
+        ##  int(round(W)) >= Wt can only hold if W >= Wt-.5; allow for some
+        ##+ roundoff in the bounds.
+        self.w_low = (self.wt-0.5e0)*(1e0-1e-9)
+        self.stalst = stalst
+        self.index = index
+        if self.index is None or self.index.stations is not self.stalst:
+            self.index = None
+            ## squared distances, as in filter_sta_wrt_distance
+            dlon = (self.x - self.stalst.lon)/1e3
+            dlat = (self.y - self.stalst.lat)/1e3
+            self.sqd = dlat*dlat + dlon*dlon
+        self.nsta = numpy.empty(0, dtype=int)
+        self.tests = 0
+
+    def within(self, j):
+        """ Indexes of stations within the cut-off distance for D(j). """
+        if self.index is not None:
+            return self.index.within(self.x, self.y, self.limits[j])
+        return numpy.flatnonzero(self.sqd <= self.limits[j]*self.limits[j])
+
+    def distances(self, sel):
+        """ Distances (km) of stations sel from the centre, as in l_weights. """
+        dx = self.stalst.lon[sel] - self.x
+        dy = self.stalst.lat[sel] - self.y
+        return numpy.sqrt(dx*dx + dy*dy)/1000e0
+
+    def may_converge(self, dr, j):
+        """ Check if W could satisfy the criterion for D(j); dr are the
+            distances of the stations within the cut-off distance. Uses the
+            bound U(D) = 2 * (0.5*n*Lmax*720 + 90*Σ{L(i)}) / 450.
+        """
+        if len(dr) <= 3: return False
+        lw = self.l_i(dr, float(self.d_range[j]))
+        return 2e0*(0.5e0*len(dr)*lw.max()*720e0 + 90e0*lw.sum())/450e0 >= self.w_low
+
+    def window(self, wmax):
+        """ Set the window to the stations within the cut-off distance for
+            D(wmax). A window for a larger wmax holds the arrays of a smaller
+            one as a prefix.
+        """
+        wmax = min(wmax, len(self.d_range)-1)
+        if wmax < len(self.nsta): return
+        sel = self.within(wmax)
+        dlon = (self.x - self.stalst.lon[sel])/1e3
+        dlat = (self.y - self.stalst.lat[sel])/1e3
+        sq = dlat*dlat + dlon*dlon
+        o = numpy.argsort(sq, kind='stable')
+        self.idx = sel[o]
+        self.dr = self.distances(self.idx)
+        az = numpy.arctan2(self.stalst.lon[self.idx]-self.x, self.stalst.lat[self.idx]-self.y)
+        self.az = numpy.where(az<0e0, az+2e0*pi, az)
+        lim = self.limits[:wmax+1]
+        self.nsta = numpy.searchsorted(sq[o], lim*lim, side='right')
+
+    def lower_bound(self):
+        """ First D (index) that could satisfy the criterion, or None. The D
+            range is first galloped through (to bracket the D) and then
+            bisected; the window is set accordingly.
+        """
+        nd = len(self.d_range)
+        if not nd: return None
+        lo, hi, step = -1, 0, 1
+        while not self.may_converge(self.distances(self.within(hi)), hi):
+            if hi == nd-1: return None
+            lo, hi, step = hi, min(hi+step, nd-1), step*2
+        self.window(hi)
+        lo += 1
+        while lo < hi:
+            mid = (lo+hi)//2
+            if self.may_converge(self.dr[:self.nsta[mid]], mid):
+                hi = mid
+            else:
+                lo = mid+1
+        return lo
+
+    def sweep(self):
+        """ Test all D's (in ascending order) starting from lower_bound(). New
+            stations are inserted in an azimouth-sorted array (saz) so that
+            θ angles and Z-weights are only re-computed when the number of
+            stations changes.
+
+            Returns:
+                (lweights, zweights, D) or None if no D is found.
+        """
+        lo = self.lower_bound()
+        if lo is None: return None
+        ##  saz holds the (sorted) azimouths of the stations within the cut-off
+        ##+ distance, snr their index in the window.
+        n = 0
+        saz = numpy.empty(0)
+        snr = numpy.empty(0, dtype=int)
+        for j in range(lo, len(self.d_range)):
+            self.window(2*j-lo+1 if j >= len(self.nsta) else j)
+            d = self.d_range[j]
+            if self.nsta[j] != n:
+                naz = self.az[n:self.nsta[j]]
+                nnr = numpy.arange(n, self.nsta[j])
+                o = numpy.argsort(naz, kind='stable')
+                pos = numpy.searchsorted(saz, naz[o], side='right')
+                saz = numpy.insert(saz, pos, naz[o])
+                snr = numpy.insert(snr, pos, nnr[o])
+                ##  equal azimouths are ordered by station index (as in
+                ##+ azimouth_array); this is rare, so just re-sort
+                if (saz[1:] == saz[:-1]).any():
+                    o = numpy.lexsort((self.idx[snr], saz))
+                    saz, snr = saz[o], snr[o]
+                n = self.nsta[j]
+                if n > 3:
+                    zw = _z_weights_sorted(saz)
+                    ## back to station order (i.e. as filtered)
+                    perm = numpy.argsort(self.idx[snr], kind='stable')
+                    zwghts = zw[perm]
+                    drs = self.dr[snr[perm]]
+            if n > 3:
+                self.tests += 1
+                lwghts = self.l_i(drs, float(d))
+                w = (lwghts*zwghts).sum()*2
+                if int(round(w)) >= self.wt:
+                    return lwghts, zwghts, d
+        return None
+
+    def test(self, j):
+        """ Test the criterion for D(j), computing the weights exactly as
+            ShenStrain.find_optimal_d does.
+
+            Returns:
+                (lweights, zweights, D) if the criterion is satisfied, else
+                None.
+        """
+        n = self.nsta[j]
+        if n <= 3: return None
+        self.tests += 1
+        ## stations in filtered (i.e. station index) order
+        o = numpy.argsort(self.idx[:n], kind='stable')
+        az = self.az[:n][o]
+        nr = numpy.argsort(az, kind='stable')
+        zwghts = numpy.empty(n)
+        zwghts[nr] = _z_weights_sorted(az[nr])
+        d = self.d_range[j]
+        lwghts = self.l_i(self.dr[:n][o], float(d))
+        w = (lwghts*zwghts).sum()*2
+        if int(round(w)) >= self.wt:
+            return lwghts, zwghts, d
+        return None
+
+    def range_bound(self, a, b):
+        """ Upper bound of W for any D in the range [D(a), D(b)].
+
+            For D(a) <= D <= D(b), the stations within the cut-off distance
+            are a subset of the ones for D(b) and a superset of the ones for
+            D(a) (the "base" stations). Adding stations can only narrow θ
+            angles; hence θ(i) is bounded by the θ angle of station i wrt the
+            base stations, or (for stations not in the base) by the width of
+            the base azimouth gap the station falls in. Z-weights grow with
+            n and L-weights grow with D, so both are bounded using D(b).
+        """
+        na, nb = self.nsta[a], self.nsta[b]
+        if nb <= 3: return -1e0
+        az = self.az[:nb]
+        theta = numpy.full(nb, 2e0*pi)
+        if na >= 2:
+            o = numpy.argsort(az[:na], kind='stable')
+            saz = az[:na][o]
+            thetas = numpy.empty(na)
+            thetas[1:na-1] = saz[2:] - saz[:na-2]
+            thetas[0]      = 2e0*pi+(saz[1] - saz[na-1])
+            thetas[na-1]   = 2e0*pi+(saz[0] - saz[na-2])
+            theta[o] = thetas
+            ## gaps of the base stations, for stations not in the base
+            ext = numpy.concatenate((saz[-1:]-2e0*pi, saz, saz[:1]+2e0*pi))
+            pos = numpy.searchsorted(saz, az[na:], side='right')
+            gap = ext[pos+1] - ext[pos]
+            ## an azimouth equal to one of the base; could be on either side
+            theta[na:] = numpy.where(ext[pos] == az[na:], 2e0*pi, gap)
+            theta = numpy.minimum(theta, 2e0*pi)
+        lw = self.l_i(self.dr[:nb], float(self.d_range[b]))
+        bound = 2e0*(lw*(0.5e0*numpy.degrees(theta)*nb+90e0)/450e0).sum()
+        return bound*(1e0+1e-9)
+
+    def first_in(self, a, b):
+        """ First D (index) in [a, b] satisfying the criterion, found via
+            branch-and-bound: ranges with range_bound below the criterion are
+            discarded, others are split in two.
+
+            Returns:
+                (lweights, zweights, D) or None if no D is found.
+        """
+        if a > b: return None
+        self.window(b)
+        if a == b: return self.test(a)
+        if self.range_bound(a, b) < self.w_low: return None
+        mid = (a+b)//2
+        found = self.first_in(a, mid)
+        return found if found is not None else self.first_in(mid+1, b)
+
+    def from_hint(self, d_hint):
+        """ Search for the first D satisfying the criterion, starting from a
+            hint D. The criterion is tested at the hint; then D's smaller than
+            the hint are searched (branch-and-bound) and, if needed, larger
+            D's in ranges of increasing size.
+
+            Returns:
+                (lweights, zweights, D) or None if no D is found.
+        """
+        lo = self.lower_bound()
+        if lo is None: return None
+        nd = len(self.d_range)
+        options = self.options
+        jh = int(round((d_hint-options['dmin'])/float(options['dstep'])))
+        jh = min(max(jh, lo), nd-1)
+        self.window(jh)
+        at_hint = self.test(jh)
+        found = self.first_in(lo, jh-1)
+        if found is not None or at_hint is not None:
+            return found if found is not None else at_hint
+        a, step = jh+1, 1
+        while a < nd:
+            b = min(a+step-1, nd-1)
+            found = self.first_in(a, b)
+            if found is not None: return found
+            a, step = b+1, step*2
+        return None
+
+def _z_weights_sorted(az):
+    """ Z-weights (as in ShenStrain.z_weights) for azimouths sorted in
+        ascending order; the weights are returned in the same order.
+    """
+    n = len(az)
+    thetas = numpy.empty(n)
+    thetas[1:n-1] = az[2:] - az[:n-2]
+    thetas[0]   = 2e0*pi+(az[1] - az[n-1])
+    thetas[n-1] = 2e0*pi+(az[0] - az[n-2])
+    wt_az = 0.25e0
+    azi_avrg = wt_az * 360e0 / n
+    azi_tot = (1e0+wt_az)*360e0
+    return (0.5e0*numpy.degrees(thetas)+azi_avrg)*n/azi_tot
+
+def shen_estimate_batch(x, y, station_list, station_index=None, max_beta_angle=None, chunk_size=256, **kwargs):
+    """ Estimate Strain Tensors on a batch of points, using Shen's algorithm.
+
+        This function is a vectorized alternative to constructing one
+        ShenStrain instance per point and calling ShenStrain.estimate(). The
+        points are processed in chunks of (at most) chunk_size points. For
+        each point, the stations used and their weights are found as in
+        ShenStrain (via a ShenSolver, i.e. the optimal D search, the L- and
+        Z-weights); the (weighted) 6x6 normal equations of all points of a
+        chunk are then formed as stacked arrays (see _ls_matrices) and solved
+        in one go. Results match the ones of ShenStrain.estimate()
+        point-by-point, up to roundoff errors. Points with exactly three
+        stations, or (nearly) singular normal equations, are solved via
+        lstsq, as ShenStrain does.
+
+        Args:
+            x (numpy.array): x coordinates of the points (could also be
+                             eastings), in meters.
+            y (numpy.array): y coordinates of the points (could also be
+                             northings), in meters.
+            station_list (list of Station or StationArray): the stations to
+                             be used for the estimation; coordinates must be
+                             in the same (cartesian) reference frame as x and y.
+            station_index (StationIndex): a spatial index built from
+                             station_list (optional; see ShenSolver).
+            max_beta_angle (float): if not None, points where the max β
+                             angle (see ShenStrain.beta_angles) is larger
+                             than this limit (in degrees) are skipped, as in
+                             StrainTensor.py.
+            chunk_size (int): max number of points solved at once.
+            **kwargs: any of the ShenStrain options (unknown keys are
+                             ignored); ls_solver is not used.
+
+        Returns:
+            dictionary: A dictionary with the following keys (K is the number
+            of points):
+                * 'x', 'y' (numpy.array, (K,)): the points
+                * 'parameters' (numpy.array, (K,6)): the estimated parameters
+                  [Ux, Uy, τx, τxy, τy, ω] for each point
+                * 'vcv' (numpy.array, (K,6,6)): the parameter var-covar
+                  matrices (NaN where not available)
+                * 'sigma0' (numpy.array, (K,)): a-posteriori std. deviations
+                  (NaN where not available)
+                * 'd_coef' (numpy.array, (K,)): the (optimal) D coefficient
+                  (km) used for each point
+                * 'nsta' (numpy.array, (K,)): number of stations used
+                * 'cutoff_dis' (float): the cut-off distance coefficient
+                * 'status' (numpy.array, (K,)): one of NODE_ESTIMATED,
+                  NODE_LIMITED_COVER, NODE_NO_OPTIMAL_D or NODE_TOO_FEW_OBS
+                  for each point. Results are only valid for points with
+                  status NODE_ESTIMATED.
+
+        Raises:
+            RuntimeError: if an option is invalid.
+    """
+    options = _shen_options(**kwargs)
+    x = numpy.atleast_1d(numpy.asarray(x, dtype=float))
+    y = numpy.atleast_1d(numpy.asarray(y, dtype=float))
+    K = x.shape[0]
+    solver = ShenSolver(station_list, station_index, None, max_beta_angle, **options)
+    result = {
+        'x': x,
+        'y': y,
+        'parameters': numpy.full((K,6), numpy.nan),
+        'vcv': numpy.full((K,6,6), numpy.nan),
+        'sigma0': numpy.full(K, numpy.nan),
+        'd_coef': numpy.full(K, numpy.nan),
+        'nsta': numpy.zeros(K, dtype=int),
+        'cutoff_dis': options['cutoff_dis'],
+        'status': numpy.full(K, NODE_TOO_FEW_OBS, dtype=int)
+    }
+    for start in range(0, K, max(1, int(chunk_size))):
+        _shen_batch_chunk(solver, range(start, min(start+chunk_size, K)), result)
+    return result
+
+def _shen_batch_chunk(solver, points, result):
+    """ Process one chunk of points (indexes into result) for
+        shen_estimate_batch; results are written in the result dictionary.
+    """
+    options, sta = solver._options, solver._stalst
+    search = options['weighting_function'] == 'shen' and not options['d_coef']
+    systems = []
+    for k in points:
+        x, y = float(result['x'][k]), float(result['y'][k])
+        solver._centre(x, y)
+        result['nsta'][k] = len(sta)
+        if len(sta) < 3:
+            continue
+        if solver.max_beta_angle is not None and solver.max_beta(x, y) > solver.max_beta_angle:
+            result['status'][k] = NODE_LIMITED_COVER
+            continue
+        try:
+            sel, wx, wy, _, _, d = solver._weights()
+        except RuntimeError:
+            result['status'][k] = NODE_NO_OPTIMAL_D if search else NODE_TOO_FEW_OBS
+            continue
+        result['status'][k], result['nsta'][k] = NODE_ESTIMATED, len(sel)
+        if d is not None: result['d_coef'][k] = d
+        args = (wx, wy, solver._dx[sel], solver._dy[sel], sta.ve[sel], sta.vn[sel])
+        if len(sel) > 3:
+            systems.append((k, args))
+        else:
+            ##  exactly determined; as in ShenStrain (no sigma0, VcV)
+            estim, _, _ = _ls_fit(*(args + ('lstsq', solver.vprint)))
+            result['parameters'][k] = estim[:,0]
+    if not systems: return
+    ##  Stacked (weighted) design matrices and observation vectors; rows of
+    ##+ points with less stations are zero (and do not contribute).
+    rows = numpy.array([ k for k, _ in systems ])
+    m = numpy.array([ 2*len(args[0]) for _, args in systems ])
+    A = numpy.zeros(shape=(len(systems), m.max(), 6))
+    b = numpy.zeros(shape=(len(systems), m.max()))
+    for i, (_, args) in enumerate(systems):
+        Ai, bi = _ls_matrices(*args)
+        A[i,:m[i]], b[i,:m[i]] = Ai, bi[:,0]
+    ##  Normal equations, aka N = AᵀPA and u = AᵀPb, (Jacobi) scaled; one
+    ##+ (batched) solve gives both the estimates and N^(-1).
+    N = numpy.einsum('kmi,kmj->kij', A, A)
+    u = numpy.einsum('kmi,km->ki', A, b)
+    diag = numpy.einsum('kii->ki', N)
+    ok = (diag > 0e0).all(axis=1)
+    s = 1e0/numpy.sqrt(numpy.where(ok[:,None], diag, 1e0))
+    Ns = N*s[:,:,None]*s[:,None,:]
+    rhs = numpy.concatenate(((u*s)[:,:,None], numpy.broadcast_to(numpy.eye(6), Ns.shape)), axis=2)
+    X = numpy.full(rhs.shape, numpy.nan)
+    try:
+        X[ok] = numpy.linalg.solve(Ns[ok], rhs[ok])
+    except numpy.linalg.LinAlgError:
+        for i in numpy.flatnonzero(ok):
             try:
-                ##  A-posteriori std. deviation. res[0] is the sum of residuals;
-                ##+ squared Euclidean 2-norm for each column in b - a*x, aka
-                ##+ u^T * P * u,
-                ##+ or (b - A*estim)^T * (b - A*estim)
-                sigma0_post = float(res[0])
-                self.__sigma0__ = sqrt(sigma0_post / (float(m) - 6e0))
-                bvar = linalg.inv(VcV) * (sigma0_post/float(m-n))
-                ## A-posteriri VcV matrix = σ0^2 * (A^T P A)^-1
-                self.__vcv__ = bvar
-            except:
-                self.vprint('[DEBUG] Cannot compute var-covar matrix! Probably singular.')
-                self.__vcv__ = None
-        self.__parameters__['Ux']    = float(estim[0])
-        self.__parameters__['Uy']    = float(estim[1])
-        self.__parameters__['taux']  = float(estim[2])
-        self.__parameters__['tauxy'] = float(estim[3])
-        self.__parameters__['tauy']  = float(estim[4])
-        self.__parameters__['omega'] = float(estim[5])
-        return estim
+                X[i] = numpy.linalg.solve(Ns[i], rhs[i])
+            except numpy.linalg.LinAlgError:
+                ok[i] = False
+    estim = X[:,:,0]*s
+    Ninv = X[:,:,1:]*s[:,:,None]*s[:,None,:]
+    ##  reject (nearly) singular systems, as _solve_normal_equations does
+    with numpy.errstate(invalid='ignore'):
+        cond = abs(Ns).sum(axis=1).max(axis=1) * abs(X[:,:,1:]).sum(axis=1).max(axis=1)
+        ok &= cond <= 1e12
+    ##  a-posteriori std. deviation (u^T * P * u) and VcV matrix
+    r = b - numpy.einsum('kmi,ki->km', A, estim)
+    red = (r*r).sum(axis=1) / (m - 6e0)
+    result['parameters'][rows[ok]] = estim[ok]
+    result['sigma0'][rows[ok]] = numpy.sqrt(red[ok])
+    result['vcv'][rows[ok]] = Ninv[ok]*red[ok,None,None]
+    ##  the rest via lstsq
+    for i in numpy.flatnonzero(~ok):
+        k, args = systems[i]
+        estim, sigma0, vcv = _ls_fit(*(args + ('lstsq', solver.vprint)))
+        result['parameters'][k] = estim[:,0]
+        if sigma0 is not None: result['sigma0'][k] = sigma0
+        if vcv is not None: result['vcv'][k] = vcv
+
+def cmp_strain_batch(params, params_cov=None):
+    """ Compute strain tensor parameters and sigmas for a batch of tensors.
+
+        Array version of ShenStrain.cmp_strain; given the "fundamental"
+        parameters [Ux, Uy, τx, τxy, τy, ω] of K tensors (and optionaly their
+        var-covar matrices), compute the parameters emean, ediff, taumax,
+        emax, emin, azim, dilat and sec_inv (and their std. deviations) of all
+        tensors in one go. The formulas (and the Jacobian used for error
+        propagation) are the same as in ShenStrain.cmp_strain; results match
+        up to roundoff errors.
+        The input can be the 'parameters' and 'vcv' arrays returned by
+        shen_estimate_batch or veis_estimate_batch.
+
+        Args:
+            params (numpy.array): a (K,6) array; each row holds the parameters
+                [Ux, Uy, τx, τxy, τy, ω] of a tensor (a (6,) vector is
+                treated as K=1).
+            params_cov (numpy.array): a (K,6,6) array with the var-covar
+                matrices of the parameters (a (6,6) matrix is treated as K=1),
+                or None. Matrices filled with NaN (i.e. not available) result
+                in NaN sigmas.
+
+        Returns:
+            a tuple, holding the (K,) arrays:
+            (emean, ediff, taumax, staumax, emax, semax, emin, semin, \
+            azim, sazim, dilat, sdilat, sec_inv, ssec_inv)
+            If params_cov is None, then the sigmas (staumax, semax, semin,
+            sazim, sdilat and ssec_inv) are all set to 'None'.
+            All units are strain/year (azim and sazim are in degrees).
+    """
+    params = numpy.asarray(params, dtype=float).reshape(-1, 6)
+    x1  = params[:,2]  ## strain/yr
+    x2  = params[:,3]  ## strain/yr
+    x3  = params[:,4]  ## strain/yr
+    cov = pi / 180e0
+    emean = (x1+x3) / 2e0
+    ediff = (x1-x3) / 2e0
+    taumax= numpy.sqrt(x2**2 + ediff**2)
+    emax  = emean+taumax
+    emin  = emean-taumax
+    azim  = 90e0 + (-numpy.arctan2(x2, ediff) / cov / 2.0e0) ## degrees
+    dilat = x1+x3
+    sec_inv = numpy.sqrt(x1*x1+2e0*x2*x2+x3*x3)
+    if params_cov is None:
+        staumax, semax, semin, sazim, sdilat, ssec_inv = [None] * 6
+    else:
+        params_cov = numpy.asarray(params_cov, dtype=float).reshape(-1, 6, 6)
+        assert params_cov.shape[0] == params.shape[0]
+        ##  Jacobian (see ShenStrain.cmp_strain); only the columns of τx, τxy
+        ##+ and τy are non-zero, so use a (K,6,3) array and the respective
+        ##+ (3x3) sub-matrices of the var-covar matrices.
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            J = numpy.zeros(shape=(params.shape[0],6,3))
+            _tmp = ediff/(2e0*taumax)
+            J[:,0,0], J[:,0,1], J[:,0,2] = _tmp,      x2/taumax, -_tmp
+            J[:,1,0], J[:,1,1], J[:,1,2] = .5e0+_tmp, x2/taumax, .5e0-_tmp
+            J[:,2,0], J[:,2,1], J[:,2,2] = .5e0-_tmp,-x2/taumax, .5e0+_tmp
+            _tmp = ediff*ediff + x2*x2
+            J[:,3,0], J[:,3,1], J[:,3,2] = x2/(4e0*_tmp), -ediff/(4e0*_tmp), -x2/(4e0*_tmp)
+            J[:,4,0], J[:,4,2] = 1e0, 1e0
+            J[:,5,0], J[:,5,1], J[:,5,2] = x1/sec_inv, 2e0*x2/sec_inv, x3/sec_inv
+            ## diagonal of J*VcV*J^T, for each tensor
+            Vy = numpy.einsum('kij,kjl,kil->ki', J, params_cov[:,2:5,2:5], J)
+            staumax, semax, semin, sazim, sdilat, ssec_inv = numpy.sqrt(Vy).T
+    return emean, ediff, \
+        taumax, staumax, \
+        emax, semax, \
+        emin, semin, \
+        azim, sazim, \
+        dilat, sdilat, \
+        sec_inv, ssec_inv
+
+def veis_estimate_batch(station_list, simplices):
+    """ Estimate one Strain Tensor per triangle (aka the 'veis' method).
+
+        Vectorized alternative to constructing one ShenStrain instance per
+        triangle, with the triangle's three stations and the 'equal_weights'
+        weighting function, setting it at the triangle's barycentre and
+        calling ShenStrain.estimate(). Each triangle gives an exactly
+        determined system, which is solved in closed form for all triangles
+        at once: the velocity components are linear in Δx, Δy, i.e.
+        ve = Ux + τx*Δx + (τxy+ω)*Δy and vn = Uy + (τxy-ω)*Δx + τy*Δy, so
+        (Δx, Δy being relative to the barycentre) Ux and Uy are the mean
+        velocities and the gradients follow from a 2x2 system (Cramer's
+        rule). Results match the ones of ShenStrain.estimate()
+        triangle-by-triangle, up to roundoff errors. Degenerate triangles
+        (collinear stations) are solved via lstsq, as ShenStrain does.
+
+        Args:
+            station_list (list of Station or StationArray): the stations, in
+                             a cartesian reference frame (e.g. UTM).
+            simplices (numpy.array): a (K,3) array of indexes into the
+                             station_list; each row is a triangle (e.g. the
+                             simplices of a scipy.spatial.Delaunay).
+
+        Returns:
+            dictionary: A dictionary with the keys of the one returned by
+            shen_estimate_batch; 'x' and 'y' are the triangle barycentres,
+            'vcv' is None (no var-covar matrix for exactly determined
+            systems) and 'sigma0' and 'd_coef' are NaN. The 'status' of all
+            triangles is NODE_ESTIMATED.
+    """
+    sta_arr = as_station_array(station_list)
+    simplices = numpy.asarray(simplices, dtype=int).reshape(-1, 3)
+    K = simplices.shape[0]
+    sx, sy = sta_arr.lon[simplices], sta_arr.lat[simplices]
+    ve, vn = sta_arr.ve[simplices], sta_arr.vn[simplices]
+    ## triangle barycentres
+    x = (sx[:,0] + sx[:,1] + sx[:,2])/3e0
+    y = (sy[:,0] + sy[:,1] + sy[:,2])/3e0
+    ##  Edges (wrt the first vertex) and the respective velocity differences
+    ex, ey = sx[:,1:] - sx[:,:1], sy[:,1:] - sy[:,:1]
+    de, dn = ve[:,1:] - ve[:,:1], vn[:,1:] - vn[:,:1]
+    det = ex[:,0]*ey[:,1] - ex[:,1]*ey[:,0]
+    estim = numpy.zeros(shape=(K,6))
+    dx, dy = sx - x[:,None], sy - y[:,None]
+    ##  (nan's and inf's of degenerate triangles are replaced below)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        taux = (de[:,0]*ey[:,1] - de[:,1]*ey[:,0]) / det
+        a    = (ex[:,0]*de[:,1] - ex[:,1]*de[:,0]) / det
+        c    = (dn[:,0]*ey[:,1] - dn[:,1]*ey[:,0]) / det
+        tauy = (ex[:,0]*dn[:,1] - ex[:,1]*dn[:,0]) / det
+        estim[:,2], estim[:,3], estim[:,4], estim[:,5] = taux, (a+c)/2e0, tauy, (a-c)/2e0
+        estim[:,0] = (ve - taux[:,None]*dx - a[:,None]*dy).sum(axis=1)/3e0
+        estim[:,1] = (vn - c[:,None]*dx - tauy[:,None]*dy).sum(axis=1)/3e0
+    ##  Degenerate triangles; as in ShenStrain.ls_matrices (all weights 1)
+    for i in numpy.nonzero(~numpy.isfinite(estim).all(axis=1))[0]:
+        A = numpy.zeros(shape=(6,6))
+        A[0::2,0], A[0::2,2], A[0::2,3], A[0::2,5] = 1e0, dx[i], dy[i], dy[i]
+        A[1::2,1], A[1::2,3], A[1::2,4], A[1::2,5] = 1e0, dx[i], dy[i], -dx[i]
+        b = numpy.zeros(6)
+        b[0::2], b[1::2] = ve[i], vn[i]
+        estim[i] = numpy.linalg.lstsq(A, b, rcond=-1)[0]
+    return {
+        'x': x,
+        'y': y,
+        'parameters': estim,
+        'vcv': None,
+        'sigma0': numpy.full(K, numpy.nan),
+        'd_coef': numpy.full(K, numpy.nan),
+        'nsta': numpy.full(K, 3, dtype=int),
+        'cutoff_dis': 2.15e0,
+        'status': numpy.full(K, NODE_ESTIMATED, dtype=int)
+    }
+
+def match_simplices(old_points, old_simplices, points, simplices):
+    """ Find simplices that have not changed between two triangulations.
+
+        A simplex is unchanged if its vertices are (in the same order) points
+        that are also vertices, in the same order, of a simplex of the old
+        triangulation. Points are compared by value (e.g. the coordinates and
+        velocities of stations), so points may have been added, removed or
+        re-ordered between the two.
+
+        Args:
+            old_points (numpy.array): (N0,M) values of the old points.
+            old_simplices (numpy.array): (K0,3) indexes into old_points.
+            points (numpy.array): (N,M) values of the (new) points.
+            simplices (numpy.array): (K,3) indexes into points.
+
+        Returns:
+            numpy.array: (K,) for each simplex, the index of the same simplex
+                         in old_simplices, or -1 if it is new (or changed).
+    """
+    def keys(a):
+        a = numpy.ascontiguousarray(a, dtype='<f8')
+        return a.view('V{:}'.format(a.shape[1]*8)).ravel().tolist()
+    old_index = dict((k, i) for i, k in enumerate(keys(old_points)))
+    pidx = numpy.array([ old_index.get(k, -1) for k in keys(points) ], dtype=int)
+    old = dict((tuple(s), i) for i, s in enumerate(numpy.asarray(old_simplices).tolist()))
+    return numpy.array([ old.get(tuple(s), -1) for s in pidx[simplices].tolist() ], dtype=int)
+
+def node_results_batch(estimates, utm_zone=None):
+    """ Estimation results of a batch of points, as NODE_RESULT_DTYPE records.
+
+        Array version of ShenStrain.result (and ShenStrain.details); the
+        input is a dictionary as returned by shen_estimate_batch or
+        veis_estimate_batch.
+
+        Args:
+            estimates (dictionary): the batch estimates.
+            utm_zone (int or UTMProjection): If given, the points' x and y
+                             are considered UTM Easting and Northing in the
+                             given Zone (or projection), and are transformed
+                             to latitude and longtitude (see
+                             ShenStrain.print_details).
+
+        Returns:
+            numpy.array: a NODE_RESULT_DTYPE array, one record per point.
+                         Fields are NaN for points that were not estimated
+                         (and for sigmas not available).
+    """
+    K = estimates['x'].shape[0]
+    res = numpy.zeros(K, dtype=NODE_RESULT_DTYPE)
+    res['status'], res['nsta'] = estimates['status'], estimates['nsta']
+    res['d_coef'], res['sigma0'] = estimates['d_coef'], estimates['sigma0']
+    res['cutoff_dis'] = estimates['cutoff_dis']
+    if utm_zone:
+        utm_proj = utm_zone if isinstance(utm_zone, UTMProjection) else UTMProjection(utm_zone)
+        lat, lon = utm_proj.inverse(estimates['x'], estimates['y'])
+        res['lat'], res['lon'] = numpy.degrees(lat), numpy.degrees(lon)
+    else:
+        res['lat'], res['lon'] = estimates['y'], estimates['x']
+    p, vcv = estimates['parameters'], estimates['vcv']
+    emean, ediff, taumax, staumax, emax, semax, emin, semin, azim, sazim, \
+        dilat, sdilat, sec_inv, ssec_inv = cmp_strain_batch(p, vcv)
+    res['vx'], res['vy'] = p[:,0]*1e3, p[:,1]*1e3
+    res['w'] = p[:,5]*1e9*0.206e0/3.6e0
+    res['exx'], res['exy'], res['eyy'] = p[:,2]*1e9, p[:,3]*1e9, p[:,4]*1e9
+    res['emax'], res['emin'], res['shr'] = emax*1e9, emin*1e9, taumax*1e9
+    res['azi'], res['dilat'], res['sec_inv'] = azim, dilat*1e9, sec_inv*1e9
+    if vcv is not None:
+        with numpy.errstate(invalid='ignore'):
+            res['dvx'], res['dvy'] = numpy.sqrt(vcv[:,0,0])*1e3, numpy.sqrt(vcv[:,1,1])*1e3
+            res['dw'] = numpy.sqrt(vcv[:,5,5])*1e9*0.206e0/3.6e0
+            res['dexx'], res['dexy'] = numpy.sqrt(vcv[:,2,2])*1e9, numpy.sqrt(vcv[:,3,3])*1e9
+            res['deyy'] = numpy.sqrt(vcv[:,4,4])*1e9
+        res['demax'], res['demin'], res['dshr'] = semax*1e9, semin*1e9, staumax*1e9
+        res['dazi'], res['ddilat'], res['dsec_inv'] = sazim, sdilat*1e9, ssec_inv*1e9
+    else:
+        for c in ['dvx', 'dvy', 'dw', 'dexx', 'dexy', 'deyy', 'demax', 'demin', 'dshr', 'dazi', 'ddilat', 'dsec_inv']:
+            res[c] = numpy.nan
+    ##  Points not estimated hold nothing
+    skipped = res['status'] != NODE_ESTIMATED
+    for c in ['d_coef', 'cutoff_dis', 'sigma0'] + STRAIN_DETAILS_COLUMNS:
+        res[c][skipped] = numpy.nan
+    return res
@@ -0,0 +1,59 @@
+#-*- coding: utf-8 -*-
+
+##  Shared fixtures of the pystrain tests; run the tests from the top-level
+##+ directory, e.g. 'python -m pytest test'.
+
+import os
+import sys
+import numpy
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from pystrain.station import StationArray
+from pystrain.geodesy.utm import UTMProjection
+from pystrain.geodesy.ellipsoid import Ellipsoid
+
+##  UTM zone of the synthetic stations (see make_stations)
+UTM_ZONE = 35
+
+def make_stations(n=120, seed=0):
+    """ A (fixed) synthetic set of n stations, over the region 20/29/35/41
+        (deg.), as a StationArray with ellipsoidal coordinates (radians) and
+        velocities (and std. deviations) in m/yr, as parse_ascii_input
+        returns them. Velocities are a smooth (rotation plus strain) field,
+        with some noise.
+    """
+    rng = numpy.random.RandomState(seed)
+    lon = rng.uniform(20e0, 29e0, n)
+    lat = rng.uniform(35e0, 41e0, n)
+    ve = 12e0 + 1.5e0*(lat-38e0) - 0.8e0*(lon-24.5e0) + rng.normal(0e0, .5e0, n)
+    vn = -9e0 + 0.7e0*(lon-24.5e0) + 1.1e0*(lat-38e0) + rng.normal(0e0, .5e0, n)
+    se = rng.uniform(.1e0, .9e0, n)
+    sn = rng.uniform(.1e0, .9e0, n)
+    return StationArray(name=numpy.array([ 's{:03d}'.format(i) for i in range(n) ]),
+        lon=numpy.radians(lon), lat=numpy.radians(lat), ve=ve/1e3, vn=vn/1e3,
+        se=se/1e3, sn=sn/1e3, rho=numpy.zeros(n), t=numpy.full(n, 5e0))
+
+def to_utm(stations):
+    """ The stations (see make_stations) projected to UTM_ZONE. """
+    N, E = UTMProjection(UTM_ZONE, Ellipsoid("wgs84")).forward(stations.lat, stations.lon)
+    return stations.with_coordinates(E, N)
+
+def write_velocity_file(filename, stations):
+    """ Write the stations in the input file format of StrainTensor.py, aka
+        "name lon lat Ve Vn Se Sn RHO T" (deg. and mm/yr).
+    """
+    with open(filename, 'w') as fout:
+        for s in stations:
+            fout.write('{:} {:.9f} {:.9f} {:.3f} {:.3f} {:.3f} {:.3f} {:.3f} {:.2f}\n'.format(
+                s.name, numpy.degrees(s.lon), numpy.degrees(s.lat), s.ve*1e3,
+                s.vn*1e3, s.se*1e3, s.sn*1e3, s.rho*1e3, s.t))
+
+@pytest.fixture
+def stations():
+    return make_stations()
+
+@pytest.fixture
+def stations_utm():
+    return to_utm(make_stations())
@@ -0,0 +1,90 @@
+#-*- coding: utf-8 -*-
+
+##  Strain parameters (and their sigmas, propagated via the Jacobian) of
+##+ stacked tensors (cmp_strain_batch) against ShenStrain.cmp_strain, one
+##+ tensor at a time; including degenerate tensors.
+
+import numpy
+import pytest
+from pystrain.strain import ShenStrain, cmp_strain_batch
+
+PARAMETERS = ['Ux', 'Uy', 'taux', 'tauxy', 'tauy', 'omega']
+##  indexes of the values and of the sigmas in the cmp_strain tuple
+VALUES, SIGMAS = (0, 1, 2, 4, 6, 8, 10, 12), (3, 5, 7, 9, 11, 13)
+
+def tensors(k=40, seed=11):
+    """ k random parameter vectors (strain/yr) and VcV matrices. """
+    rng = numpy.random.RandomState(seed)
+    params = rng.normal(0e0, 1e-7, (k,6))
+    params[:,:2] = rng.normal(0e0, 1e-2, (k,2))
+    m = rng.normal(0e0, 1e-9, (k,6,6))
+    return params, numpy.einsum('kij,klj->kil', m, m)
+
+def cmp_strain(p, vcv=None):
+    sstr = ShenStrain(0e0, 0e0, [])
+    sstr.__parameters__ = dict(zip(PARAMETERS, p.tolist()))
+    return sstr.cmp_strain(vcv)
+
+def assert_close(batch, k, expected):
+    for i, (b, e) in enumerate(zip(batch, expected)):
+        if e is None:
+            assert b is None
+        else:
+            assert abs(b[k] - e) <= 1e-12*abs(e) + 1e-30, i
+
+def test_matches_cmp_strain():
+    params, vcv = tensors()
+    batch = cmp_strain_batch(params, vcv)
+    nosig = cmp_strain_batch(params)
+    for k in range(len(params)):
+        assert_close(batch, k, cmp_strain(params[k], vcv[k]))
+        assert_close(nosig, k, cmp_strain(params[k]))
+
+def test_single_tensor():
+    params, vcv = tensors(1)
+    batch = cmp_strain_batch(params[0], vcv[0])
+    assert all(len(v) == 1 for v in batch)
+    assert_close(batch, 0, cmp_strain(params[0], vcv[0]))
+
+def test_isotropic_tensor():
+    ##  τx == τy, τxy == 0: no shear, the azimouth is undefined; the scalar
+    ##+ propagation fails (ZeroDivisionError, reported as NODE_NO_VCV), the
+    ##+ batch gives NaN for the sigmas that depend on the azimouth
+    params, vcv = tensors(3)
+    params[1,2:5] = [3e-8, 0e0, 3e-8]
+    emean, ediff, taumax, staumax, emax, semax, emin, semin, azim, sazim, \
+        dilat, sdilat, sec_inv, ssec_inv = cmp_strain_batch(params, vcv)
+    with pytest.raises(ZeroDivisionError):
+        cmp_strain(params[1], vcv[1])
+    expected = cmp_strain(params[1])
+    for v, e in zip((emean, ediff, taumax, emax, emin, azim, dilat, sec_inv), [ expected[i] for i in VALUES ]):
+        assert v[1] == e
+    assert taumax[1] == 0e0 and emax[1] == emin[1] == 3e-8
+    for s in (staumax, semax, semin, sazim):
+        assert numpy.isnan(s[1])
+    c = vcv[1]
+    assert abs(sdilat[1] - numpy.sqrt(c[2,2]+2e0*c[2,4]+c[4,4])) <= 1e-12*sdilat[1]
+    assert numpy.isfinite(ssec_inv[1])
+    ##  other tensors are not affected
+    for k in (0, 2):
+        assert_close(cmp_strain_batch(params, vcv), k, cmp_strain(params[k], vcv[k]))
+
+def test_zero_tensor():
+    ##  no strain at all; only the dilatation's sigma can be propagated
+    params, vcv = tensors(2)
+    params[0,2:5] = 0e0
+    batch = cmp_strain_batch(params, vcv)
+    expected = cmp_strain(params[0])
+    for i in VALUES:
+        assert batch[i][0] == expected[i]
+    assert all(numpy.isnan(batch[i][0]) for i in SIGMAS if i != 11)
+    assert numpy.isfinite(batch[11][0])
+    assert_close(batch, 1, cmp_strain(params[1], vcv[1]))
+
+def test_missing_vcv():
+    ##  VcV matrices filled with NaN give NaN sigmas
+    params, vcv = tensors(2)
+    vcv[0] = numpy.nan
+    batch = cmp_strain_batch(params, vcv)
+    assert all(numpy.isnan(batch[i][0]) for i in SIGMAS)
+    assert_close(batch, 1, cmp_strain(params[1], vcv[1]))
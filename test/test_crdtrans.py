@@ -0,0 +1,101 @@
+#-*- coding: utf-8 -*-
+
+##  Coordinate conversions against reference values, computed by the original
+##+ (scalar, math based) implementation; single points must give exactly the
+##+ same values (and plain floats), arrays the same within roundoff. Points
+##+ include both poles (handled by a separate branch in car2ell).
+
+import numpy
+import pytest
+from pystrain.geodesy.crdtrans import car2ell, ell2car, car2top, top2daz, vcar2top
+from pystrain.geodesy.ellipsoid import Ellipsoid
+
+B = Ellipsoid("wgs84").semi_minor()
+POINTS = [(4595220.002, 2039434.077, 3912625.997), (-2100000.0, 4300000.0, -4200000.0),
+    (6378137.0, 0.0, 0.0), (-1234.5, -6378000.0, 2.5), (0.0, 0.0, B), (0.0, 0.0, -B-100.0)]
+VELOCITY = (5e-3, -3e-3, 1e-3)
+
+CAR2ELL = [
+    (0.6645961310057938, 0.4176997721436837, 510.55644628568507),
+    (-0.723672923067617, 2.025098413488213, -1702.5217427679834),
+    (0.0, 0.0, 0.0),
+    (3.9461415157477605e-07, -1.570989882766139, -136.88052708250558),
+    (1.5707963267948966, 0.0, 0.0),
+    (-1.5707963267948966, 0.0, 100.0),
+]
+ELL2CAR = [
+    (4595220.001999999, 2039434.0769999993, 3912625.997),
+    (-2100000.0000000005, 4300000.000000001, -4200000.000000001),
+    (6378137.0, 0.0, 0.0),
+    (-1234.500000000594, -6378000.000000001, 2.500000000000001),
+    (3.9186209248144716e-10, 0.0, 6356752.314245179),
+    (3.918682157154429e-10, 0.0, -6356852.314245179),
+]
+CAR2TOP = [
+    (-1.280857062998892, -4.770368715302306, 3.2562228892124194),
+    (-2.488413257145366, -3.1763316844171543, -4.326513202595235),
+    (1.0, -3.0, 5.0),
+    (0.9999988165393893, 5.000580574250317, 2.999032558567878),
+    (-5.0, -3.0, 1.0000000000000002),
+    (5.0, -3.0, -0.9999999999999997),
+]
+TOP2DAZ = [
+    (5.916079783099615, 4.450073198719778, 0.9879505196681313),
+    (5.916079783099616, 4.047837632396435, 2.391043168743244),
+    (5.916079783099616, 5.034139534781332, 0.5639426413606289),
+    (5.916079783099616, 1.3734233217952518, 1.0391779501346639),
+    (5.916079783099616, 3.682012153860377, 1.4009500387112228),
+    (5.916079783099616, 5.742765806909002, 1.7406426148785703),
+]
+VCAR2TOP = [
+    (-0.0012808570629988924, -0.004770368715302306, 0.0032562228892124194),
+    (-0.0024884132571453663, -0.0031763316844171537, -0.0043265132025952354),
+    (0.001, -0.003, 0.005),
+    (0.0009999988165393893, 0.005000580574250317, 0.0029990325585678777),
+    (-0.005, -0.003, 0.0010000000000000002),
+    (0.005, -0.003, -0.0009999999999999998),
+]
+
+def conversions(x, y, z):
+    """ All conversions at (x, y, z), as in the reference values. """
+    vx, vy, vz = VELOCITY
+    return {
+        'car2ell': car2ell(x, y, z),
+        'ell2car': ell2car(*car2ell(x, y, z)),
+        'car2top': car2top(x, y, z, x+5e0, y-3e0, z+1e0),
+        'top2daz': top2daz(*car2top(x, y, z, x+5e0, y-3e0, z+1e0)),
+        'vcar2top': vcar2top(x, y, z, vx, vy, vz)
+    }
+
+REFERENCE = {'car2ell': CAR2ELL, 'ell2car': ELL2CAR, 'car2top': CAR2TOP,
+    'top2daz': TOP2DAZ, 'vcar2top': VCAR2TOP}
+
+@pytest.mark.parametrize('i', range(len(POINTS)))
+def test_scalar_matches_reference(i):
+    for name, values in conversions(*POINTS[i]).items():
+        assert values == REFERENCE[name][i], name
+        assert all(type(v) is float for v in values), name
+
+def test_array_matches_reference():
+    x, y, z = [ numpy.array(c) for c in zip(*POINTS) ]
+    for name, values in conversions(x, y, z).items():
+        ref = numpy.array(REFERENCE[name]).T
+        for v, r in zip(values, ref):
+            assert isinstance(v, numpy.ndarray) and v.shape == (len(POINTS),)
+            assert numpy.allclose(v, r, rtol=1e-12, atol=1e-9), name
+
+def test_car2ell_poles():
+    phi, lamda, h = car2ell(numpy.zeros(3), numpy.zeros(3), numpy.array([B, -B, B+10e0]))
+    assert numpy.array_equal(phi, [numpy.pi/2e0, -numpy.pi/2e0, numpy.pi/2e0])
+    assert numpy.array_equal(lamda, numpy.zeros(3))
+    assert numpy.allclose(h, [0e0, 0e0, 10e0], rtol=0e0, atol=1e-6)
+
+def test_round_trip():
+    rng = numpy.random.RandomState(3)
+    lat = numpy.radians(rng.uniform(-89.9, 89.9, 50))
+    lon = numpy.radians(rng.uniform(-180., 180., 50))
+    hgt = rng.uniform(-100., 5000., 50)
+    phi, lamda, h = car2ell(*ell2car(lat, lon, hgt))
+    assert numpy.allclose(phi, lat, rtol=0e0, atol=1e-12)
+    assert numpy.allclose(lamda, lon, rtol=0e0, atol=1e-12)
+    assert numpy.allclose(h, hgt, rtol=0e0, atol=1e-6)
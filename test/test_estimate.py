@@ -0,0 +1,65 @@
+#-*- coding: utf-8 -*-
+
+##  Grid estimation (iter_grid, estimate_grid) with a pool of worker processes
+##+ must yield the very same batches, in grid order, as a serial run; nodes
+##+ must match one ShenStrain per node (as StrainTensor.py did).
+
+import os
+import tempfile
+from math import radians
+import numpy
+import pytest
+from pystrain.grid import Grid
+from pystrain.strain import ShenStrain, NODE_ESTIMATED, NODE_RESULT_DTYPE
+from pystrain.estimate import iter_grid, estimate_grid
+from pystrain.geodesy.utm import UTMProjection
+from pystrain.geodesy.ellipsoid import Ellipsoid
+from conftest import UTM_ZONE, to_utm
+
+GRID = Grid(20e0, 29e0, 1e0, 35e0, 41e0, 1e0)
+OPTIONS = dict(Wt=24, d_warm_start=True)
+
+def same(res1, res2):
+    return res1.tobytes() == res2.tobytes()
+
+@pytest.mark.parametrize('batch_size', [1, 7, 16, 1000])
+def test_pool_batches_match_serial(stations, batch_size):
+    serial = list(iter_grid(stations, GRID, batch_size, **OPTIONS))
+    done = []
+    pool = list(iter_grid(stations, GRID, batch_size, workers=2,
+        progress=lambda n, total: done.append((n, total)), **OPTIONS))
+    assert [ len(b) for b in pool ] == [ len(b) for b in serial ]
+    assert all(len(b) == batch_size for b in serial[:-1])
+    assert sum(len(b) for b in serial) == len(GRID)
+    for b1, b2 in zip(serial, pool):
+        assert same(b1, b2)
+    ##  progress is reported in order, up to the last node
+    assert [ n for n, _ in done ] == sorted(n for n, _ in done)
+    assert done[-1] == (len(GRID), len(GRID))
+
+def test_estimate_grid_matches_iter_grid(stations):
+    batches = numpy.concatenate(list(iter_grid(stations, GRID, 5, **OPTIONS)))
+    assert same(estimate_grid(stations, GRID, **OPTIONS), batches)
+    assert same(estimate_grid(stations, GRID, workers=2, **OPTIONS), batches)
+
+def test_nodes_match_shenstrain(stations):
+    results = estimate_grid(stations, GRID, utm_zone=UTM_ZONE)
+    assert (results['status'] == NODE_ESTIMATED).sum() > len(GRID)//2
+    utm_proj = UTMProjection(UTM_ZONE, Ellipsoid("wgs84"))
+    sta_list_utm = to_utm(stations)
+    xs, ys = GRID.centres()
+    for node in numpy.flatnonzero(results['status'] == NODE_ESTIMATED)[::5]:
+        N, E = utm_proj.forward(radians(ys[node]), radians(xs[node]))
+        sstr = ShenStrain(E, N, sta_list_utm)
+        sstr.estimate()
+        expected = numpy.array(sstr.result(utm_proj), dtype=NODE_RESULT_DTYPE)
+        for c in NODE_RESULT_DTYPE.names:
+            assert numpy.allclose(results[c][node], expected[c], rtol=1e-9, atol=0e0, equal_nan=True)
+
+def test_closed_early_cleans_up(stations, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    batches = iter_grid(stations, GRID, 4, workers=2, **OPTIONS)
+    first = next(batches)
+    assert len(first) == 4 and any(f.startswith('pystrain-') for f in os.listdir(str(tmp_path)))
+    batches.close()
+    assert not [ f for f in os.listdir(str(tmp_path)) if f.startswith('pystrain-') ]
@@ -0,0 +1,71 @@
+#-*- coding: utf-8 -*-
+
+##  Layout of the GMT native binary float grids (aka '=bf') and streaming
+##+ writes (GmtGridWriter) against the all-at-once write_gmt_grid.
+
+import struct
+import numpy
+import pytest
+from pystrain.grid import Grid
+from pystrain.iotools.gmtgrid import GmtGridWriter, write_gmt_grid, read_gmt_grid, \
+    GMT_GRID_HEADER_SIZE, GMT_GRID_PIXEL_REG
+
+GRID = Grid(20e0, 22e0, .5e0, 35e0, 36.5e0, .5e0)
+
+def values():
+    v = numpy.arange(len(GRID), dtype=float) - 3e0
+    v[1] = numpy.nan
+    return v
+
+def test_header_layout(tmp_path):
+    filename = str(tmp_path / 'a.grd')
+    write_gmt_grid(filename, GRID, values(), 'dilat', 'nstrain/yr', 'cmd', 'remark')
+    with open(filename, 'rb') as fin:
+        raw = fin.read()
+    assert GMT_GRID_HEADER_SIZE == 892
+    assert len(raw) == 892 + 4*len(GRID)
+    ##  nx, ny and registration, then 10 doubles, with no padding
+    assert struct.unpack_from('<3i', raw, 0) == (GRID.xpts, GRID.ypts, GMT_GRID_PIXEL_REG)
+    assert struct.unpack_from('<10d', raw, 12) == (20e0, 22e0, 35e0, 36.5e0,
+        -3e0, len(GRID)-4e0, .5e0, .5e0, 1e0, 0e0)
+    ##  x-, y-, z-units, title (80 chars), command (320) and remark (160)
+    for offset, text in [(92, b'longitude [degrees_east]'), (172, b'latitude [degrees_north]'),
+            (252, b'nstrain/yr'), (332, b'dilat'), (412, b'cmd'), (732, b'remark')]:
+        assert raw[offset:offset+len(text)+1] == text + b'\0'
+
+def test_rows_north_to_south(tmp_path):
+    filename = str(tmp_path / 'a.grd')
+    v = values()
+    write_gmt_grid(filename, GRID, v)
+    header, data = read_gmt_grid(filename)
+    expected = v.reshape(GRID.ypts, GRID.xpts)[::-1].astype('f4')
+    assert numpy.array_equal(data, expected, equal_nan=True)
+
+@pytest.mark.parametrize('step', [1, 3, 4, 5, 100])
+def test_writer_matches_write_gmt_grid(tmp_path, step):
+    f1, f2 = str(tmp_path / 'a.grd'), str(tmp_path / 'b.grd')
+    v = values()
+    write_gmt_grid(f1, GRID, v, 'test', 'nstrain/yr')
+    writer = GmtGridWriter(f2, GRID, 'test', 'nstrain/yr')
+    for start in range(0, len(GRID), step):
+        writer.write(start, v[start:start+step])
+    writer.close()
+    with open(f1, 'rb') as fin1, open(f2, 'rb') as fin2:
+        assert fin1.read() == fin2.read()
+
+def test_unwritten_and_all_nan(tmp_path):
+    filename = str(tmp_path / 'a.grd')
+    writer = GmtGridWriter(filename, GRID)
+    writer.write(2, [numpy.nan, numpy.nan])
+    writer.close()
+    header, data = read_gmt_grid(filename)
+    assert numpy.isnan(data).all()
+    assert numpy.isnan(header['z_min']) and numpy.isnan(header['z_max'])
+
+def test_out_of_range(tmp_path):
+    writer = GmtGridWriter(str(tmp_path / 'a.grd'), GRID)
+    with pytest.raises(RuntimeError):
+        writer.write(len(GRID)-1, [1e0, 2e0])
+    writer.close()
+    with pytest.raises(RuntimeError):
+        write_gmt_grid(str(tmp_path / 'b.grd'), GRID, values()[1:])
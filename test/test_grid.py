@@ -0,0 +1,82 @@
+#-*- coding: utf-8 -*-
+
+##  The array accessors of Grid (centres, nodes, split, flat/x-y indexes) must
+##+ agree with plain iteration over the grid.
+
+import numpy
+import pytest
+from pystrain.grid import Grid
+
+@pytest.fixture
+def grid():
+    ##  7 x 13 nodes (non-square, so that x and y indexes can not be mixed up)
+    return Grid(19.25e0, 22.75e0, 0.5e0, 34.25e0, 40.75e0, 0.5e0)
+
+def test_centres_match_iteration(grid):
+    assert (grid.xpts, grid.ypts) == (7, 13)
+    ref = list(grid)
+    x, y = grid.centres()
+    assert len(x) == len(y) == len(grid) == len(ref)
+    assert list(zip(x.tolist(), y.tolist())) == ref
+    ##  ranges (stop is clipped at the last node)
+    assert list(zip(*[ c.tolist() for c in grid.centres(3, 17) ])) == ref[3:17]
+    assert list(zip(*[ c.tolist() for c in grid.centres(80) ])) == ref[80:]
+    assert list(zip(*[ c.tolist() for c in grid.centres(80, 1000) ])) == ref[80:]
+    assert len(grid.centres(5, 5)[0]) == 0
+
+def test_nodes(grid):
+    ref = list(grid)
+    idx = numpy.array([90, 0, 6, 7, 45, 45, 84])
+    x, y = grid.nodes(idx)
+    assert list(zip(x.tolist(), y.tolist())) == [ ref[i] for i in idx ]
+    ##  any sequence of indexes
+    assert grid.nodes([1, 2])[0].tolist() == [ ref[1][0], ref[2][0] ]
+
+def test_index_round_trip(grid):
+    idx = numpy.arange(len(grid))
+    xidx, yidx = grid.idx2xyidx(idx)
+    assert (xidx == idx % grid.xpts).all() and (yidx == idx // grid.xpts).all()
+    assert xidx.max() == grid.xpts - 1 and yidx.max() == grid.ypts - 1
+    assert (grid.xyidx2idx(xidx, yidx) == idx).all()
+    ##  x-axis first, as in iteration
+    for i, (x, y) in enumerate(grid):
+        xi, yi = grid.idx2xyidx(i)
+        assert (grid.xidx2xval(xi), grid.yidx2yval(yi)) == (x, y)
+        assert grid.xyidx2idx(xi, yi) == i
+    ##  out of range
+    for i in (-1, len(grid)):
+        with pytest.raises(AssertionError):
+            grid.idx2xyidx(i)
+    with pytest.raises(AssertionError):
+        grid.xyidx2idx(grid.xpts, 0)
+    with pytest.raises(AssertionError):
+        grid.xyidx2idx(0, grid.ypts)
+
+@pytest.mark.parametrize('strided', [False, True])
+@pytest.mark.parametrize('n', [1, 2, 3, 7, 90, 91, 92, 200])
+def test_split_covers_every_node_once(grid, n, strided):
+    chunks = grid.split(n, strided)
+    assert len(chunks) == n
+    allidx = numpy.concatenate(chunks)
+    assert numpy.issubdtype(allidx.dtype, numpy.integer)
+    assert sorted(allidx.tolist()) == list(range(len(grid)))
+    sizes = [ len(c) for c in chunks ]
+    assert max(sizes) - min(sizes) <= 1
+    if n > len(grid):
+        assert sizes.count(0) == n - len(grid)
+    if strided:
+        for k, c in enumerate(chunks):
+            assert c.tolist() == list(range(k, len(grid), n))
+    else:
+        ##  contiguous ranges, in order
+        assert allidx.tolist() == list(range(len(grid)))
+        for c in chunks:
+            assert (numpy.diff(c) == 1).all()
+
+def test_split_chunks_give_all_centres(grid):
+    x, y = grid.centres()
+    for strided in (False, True):
+        cx, cy = numpy.full(len(grid), numpy.nan), numpy.full(len(grid), numpy.nan)
+        for c in grid.split(4, strided):
+            cx[c], cy[c] = grid.nodes(c)
+        assert (cx == x).all() and (cy == y).all()
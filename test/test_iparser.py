@@ -0,0 +1,83 @@
+#-*- coding: utf-8 -*-
+
+##  The bulk input parser (parse_ascii_input) against the original one, which
+##+ parsed (and checked) one line at a time: same stations, or the same error
+##+ (the one of the first invalid line).
+
+import numpy
+import pytest
+from pystrain.station import Station, StationArray, station_member_names
+from pystrain.iotools.iparser import parse_ascii_input
+
+def baseline_parse(filename, zero_std_is_error=False):
+    """ The original parse_ascii_input. """
+    stations = []
+    with open(filename) as fin:
+        for line in fin.readlines():
+            nSta=Station(line)
+            if zero_std_is_error and (nSta.sn==0e0 or nSta.se==0e0):
+                raise ValueError('[ERROR] Zero std. deviation not allowed! station is: {:}'.format(nSta.name))
+            for sta in stations:
+                if sta.name == nSta.name:
+                    raise ValueError('[ERROR] Duplicate record found in input file for station {:}'.format(sta.name))
+                if sta.lat==nSta.lat and sta.lon==nSta.lon:
+                    raise ValueError('[ERROR] Exact coordinate match for stations {:} and {:}. Possible duplicate!'.format(sta.name, nSta.name))
+            stations.append(nSta)
+    return stations if len(stations) else None
+
+def outcome(parse, filename, zero_std_is_error):
+    try:
+        return parse(filename, zero_std_is_error)
+    except (ValueError, RuntimeError) as err:
+        return type(err), str(err)
+
+LINES = ['akyr +24.91260690 +34.98083160 8.71244 -15.1236 0.00136367 0.000278371 0.5 2.5',
+    'ankr 32.75847 39.88752 -0.5 1.2 0.3 0.4 -0.01 8.1 extra fields',
+    'dyng  23.86425 38.07806 8.0 -11.5 0.2 0.2 0.0 12.0',
+    'noa1 23.86425 38.07807 8.5 -11.6 0.2 0.2 0.0 12.0',
+    'zero 22.0 37.0 8.0 -11.0 0.0 0.2 0.0 3.0']
+
+CASES = {
+    'valid': LINES,
+    'duplicate name': LINES[:3] + ['akyr 20.0 36.0 1 1 1 1 0 1'] + LINES[3:],
+    'duplicate coordinates': LINES[:3] + ['copy 32.75847 39.88752 1 1 1 1 0 1'],
+    ##  the first previous station matching the name or the coordinates wins
+    'duplicate both': LINES[:3] + ['dyng 32.75847 39.88752 1 1 1 1 0 1'],
+    'duplicate both, reversed': LINES[:3] + ['ankr 23.86425 38.07806 1 1 1 1 0 1'],
+    '-0 matches 0': LINES[:2] + ['eq1 0.0 -0.0 1 1 1 1 0 1', 'eq2 -0.0 0.0 1 1 1 1 0 1'],
+    'nan never matches': LINES[:2] + ['nan1 nan 10.0 1 1 1 1 0 1', 'nan2 nan 10.0 1 1 1 1 0 1'],
+    'short line after duplicate': LINES[:2] + ['akyr 20.0 36.0 1 1 1 1 0 1', 'short 1 2 3'],
+    'short line before duplicate': LINES[:2] + ['short 1 2 3', 'akyr 20.0 36.0 1 1 1 1 0 1'],
+    'not a number after duplicate': LINES[:2] + ['copy 32.75847 39.88752 1 1 1 1 0 1', 'bad 1 2 x 4 5 6 7 8'],
+    'not a number before duplicate': LINES[:2] + ['bad 1 2 x 4 5 6 7 8', 'copy 32.75847 39.88752 1 1 1 1 0 1'],
+    'zero std after duplicate': LINES[:3] + ['akyr 20.0 36.0 1 1 1 1 0 1'] + LINES[4:],
+    'blank line': LINES[:2] + [''] + LINES[2:],
+    'empty': [],
+}
+
+@pytest.mark.parametrize('case', sorted(CASES))
+@pytest.mark.parametrize('zero_std_is_error', [False, True])
+def test_matches_baseline(tmp_path, case, zero_std_is_error):
+    filename = str(tmp_path / 'vel.dat')
+    with open(filename, 'w') as fout:
+        fout.write(''.join(line + '\n' for line in CASES[case]))
+    expected = outcome(baseline_parse, filename, zero_std_is_error)
+    found = outcome(parse_ascii_input, filename, zero_std_is_error)
+    if expected is None or isinstance(expected, tuple):
+        assert found == expected
+        return
+    assert len(found) == len(expected)
+    for sta, ref in zip(found, expected):
+        for m in station_member_names:
+            assert getattr(sta, m) == getattr(ref, m) or (m == 'lon' and numpy.isnan(ref.lon))
+    ##  the same stations, as a StationArray
+    arr = parse_ascii_input(filename, zero_std_is_error, as_array=True)
+    assert isinstance(arr, StationArray) and len(arr) == len(expected)
+    assert arr.name.tolist() == [ s.name for s in expected ]
+    assert numpy.array_equal(arr.lat, [ s.lat for s in expected ])
+
+def test_empty_file(tmp_path):
+    filename = str(tmp_path / 'vel.dat')
+    open(filename, 'w').close()
+    assert parse_ascii_input(filename) is None
+    assert parse_ascii_input(filename, as_array=True) is None
@@ -0,0 +1,55 @@
+#-*- coding: utf-8 -*-
+
+##  Solving the normal equations (Cholesky) must agree with lstsq, and fall
+##+ back to lstsq where the normal equations can not be used.
+
+import numpy
+import pytest
+from pystrain.strain import ShenStrain, _ls_fit, _solve_normal_equations
+
+def noop(*args, **kwargs): pass
+
+def fit(dx, dy, ls_solver, seed=1):
+    rng = numpy.random.RandomState(seed)
+    n = len(dx)
+    ve = 1e-2 + 1e-8*dx + 2e-8*dy + rng.normal(0e0, 1e-4, n)
+    vn = -2e-2 - 1e-8*dx + 3e-8*dy + rng.normal(0e0, 1e-4, n)
+    wx, wy = rng.uniform(1e3, 5e3, n), rng.uniform(1e3, 5e3, n)
+    return _ls_fit(wx, wy, dx, dy, ve, vn, ls_solver, noop)
+
+def test_cholesky_matches_lstsq(stations_utm):
+    x, y = numpy.mean(stations_utm.lon), numpy.mean(stations_utm.lat)
+    results = {}
+    for ls_solver in ['lstsq', 'cholesky']:
+        sstr = ShenStrain(x, y, stations_utm, ls_solver=ls_solver)
+        estim = sstr.estimate()
+        results[ls_solver] = (estim, sstr.__sigma0__, sstr.__vcv__)
+    (e1, s1, v1), (e2, s2, v2) = results['lstsq'], results['cholesky']
+    assert numpy.allclose(e1, e2, rtol=1e-9, atol=1e-15)
+    assert abs(s1-s2) <= 1e-9*s1
+    ##  compare VcV matrices normalized by the std. deviations (i.e. within
+    ##+ roundoff of each element's scale)
+    scale = numpy.sqrt(numpy.outer(numpy.diag(v1), numpy.diag(v1)))
+    assert numpy.allclose(v1/scale, v2/scale, rtol=0e0, atol=1e-9)
+
+def test_three_stations_fall_back():
+    dx, dy = numpy.array([-1e4, 2e4, 5e3]), numpy.array([3e3, -1e4, 2e4])
+    e1, s1, v1 = fit(dx, dy, 'lstsq')
+    e2, s2, v2 = fit(dx, dy, 'cholesky')
+    assert numpy.array_equal(e1, e2)
+    assert s1 is None and s2 is None and v1 is None and v2 is None
+
+def test_rank_deficient_falls_back():
+    ##  collinear stations; the normal matrix is singular
+    dx = numpy.linspace(-3e4, 3e4, 8)
+    dy = 2e0*dx
+    with pytest.raises(numpy.linalg.LinAlgError):
+        _solve_normal_equations(numpy.ones(8), numpy.ones(8), dx, dy, numpy.zeros(8), numpy.zeros(8))
+    e1, s1, v1 = fit(dx, dy, 'lstsq')
+    e2, s2, v2 = fit(dx, dy, 'cholesky')
+    assert numpy.array_equal(e1, e2) and s1 == s2
+
+def test_invalid_solver():
+    dx, dy = numpy.array([-1e4, 2e4, 5e3, 1e3]), numpy.array([3e3, -1e4, 2e4, 1e3])
+    with pytest.raises(RuntimeError):
+        fit(dx, dy, 'qr')
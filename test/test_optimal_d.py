@@ -0,0 +1,73 @@
+#-*- coding: utf-8 -*-
+
+##  The incremental (and hinted) optimal D search must give exactly the D and
+##+ weights of the original, linear search (ShenStrain.find_optimal_d).
+
+import numpy
+import pytest
+from pystrain.strain import ShenStrain
+from pystrain.station import StationIndex
+from pystrain.geodesy.utm import UTMProjection
+from pystrain.geodesy.ellipsoid import Ellipsoid
+from conftest import UTM_ZONE
+
+##  Points (lon, lat in deg.) to search at: inside the network, near its
+##+ border and outside of it.
+CENTRES = [(24.5, 38.), (21., 36.), (28.5, 40.5), (25., 35.2), (30.5, 42.)]
+
+def utm_centres():
+    utm = UTMProjection(UTM_ZONE, Ellipsoid("wgs84"))
+    return [ utm.forward(numpy.radians(lat), numpy.radians(lon))[::-1] for lon, lat in CENTRES ]
+
+def search(stations_utm, x, y, d_hint=None, **options):
+    """ (lweights, zweights, D) of the search, or None if no D is found. """
+    sstr = ShenStrain(x, y, stations_utm, **options)
+    try:
+        return sstr.find_optimal_d(d_hint)
+    except RuntimeError:
+        return None
+
+def assert_same(found, expected):
+    if expected is None:
+        assert found is None
+    else:
+        assert found is not None
+        assert found[2] == expected[2]
+        assert numpy.array_equal(found[0], expected[0])
+        assert numpy.array_equal(found[1], expected[1])
+
+@pytest.mark.parametrize('options', [{}, {'ltype': 'quadratic', 'dstep': 3},
+    {'Wt': 10, 'dmin': 5, 'dmax': 300}, {'Wt': 40}])
+def test_incremental_matches_linear(stations_utm, options):
+    for x, y in utm_centres():
+        linear = search(stations_utm, x, y, d_search='linear', **options)
+        assert_same(search(stations_utm, x, y, d_search='incremental', **options), linear)
+
+def test_station_index_matches_scan(stations_utm):
+    index = StationIndex(stations_utm)
+    for x, y in utm_centres():
+        linear = search(stations_utm, x, y, d_search='linear')
+        assert_same(search(stations_utm, x, y, d_search='incremental', station_index=index), linear)
+
+def test_no_optimal_d(stations_utm):
+    x, y = utm_centres()[0]
+    assert search(stations_utm, x, y, d_search='linear', Wt=10000) is None
+    assert search(stations_utm, x, y, d_search='incremental', Wt=10000) is None
+
+@pytest.mark.parametrize('options', [{}, {'ltype': 'quadratic', 'dstep': 3}, {'Wt': 10}])
+def test_hint_matches_linear(stations_utm, options):
+    for x, y in utm_centres():
+        linear = search(stations_utm, x, y, d_search='linear', **options)
+        d = 100 if linear is None else linear[2]
+        ##  at, just around and far from the optimal D, and out of range
+        for d_hint in [d, d-1, d+1, d-30, d+30, 1, 499, -50, 1000, 7.3]:
+            assert_same(search(stations_utm, x, y, d_hint=d_hint, **options), linear)
+
+def test_solver_hint_matches_linear(stations_utm):
+    from pystrain.strain import ShenSolver
+    solver = ShenSolver(stations_utm)
+    for x, y in utm_centres():
+        expected = solver.solve(x, y)
+        for d_hint in [1, 60, 117, 300]:
+            found = solver.solve(x, y, d_hint)
+            assert numpy.array_equal(numpy.array(found), numpy.array(expected), equal_nan=True)
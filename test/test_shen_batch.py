@@ -0,0 +1,84 @@
+#-*- coding: utf-8 -*-
+
+##  The batched Shen estimation (shen_estimate_batch) against one ShenStrain
+##+ (or ShenSolver) per point.
+
+import numpy
+import pytest
+from pystrain.strain import ShenStrain, ShenSolver, shen_estimate_batch, \
+    node_results_batch, NODE_RESULT_DTYPE, NODE_ESTIMATED, NODE_LIMITED_COVER, \
+    NODE_TOO_FEW_OBS
+from conftest import UTM_ZONE
+
+def points(stations_utm, n=60, seed=1):
+    rng = numpy.random.RandomState(seed)
+    x = rng.uniform(stations_utm.lon.min(), stations_utm.lon.max(), n)
+    y = rng.uniform(stations_utm.lat.min(), stations_utm.lat.max(), n)
+    return x, y
+
+def assert_same_estimate(batch, k, sstr, estim):
+    """ Parameters within roundoff of their std. deviation; sigma0, VcV
+        (normalized by the std. deviations) within roundoff.
+    """
+    vcv = sstr.__vcv__
+    sigma = numpy.sqrt(numpy.diag(vcv))
+    assert numpy.all(abs(batch['parameters'][k] - estim[:,0]) <= 1e-6*sigma)
+    assert abs(batch['sigma0'][k] - sstr.__sigma0__) <= 1e-9*sstr.__sigma0__
+    scale = numpy.outer(sigma, sigma)
+    assert numpy.allclose(batch['vcv'][k]/scale, vcv/scale, rtol=0e0, atol=1e-8)
+    assert batch['nsta'][k] == len(sstr.__stalst__)
+    assert batch['d_coef'][k] == sstr.__options__['d_coef']
+
+@pytest.mark.parametrize('options', [{}, {'ltype': 'quadratic', 'Wt': 12},
+    {'d_coef': 80}, {'d_search': 'incremental'}])
+def test_batch_matches_shenstrain(stations_utm, options):
+    x, y = points(stations_utm)
+    batch = shen_estimate_batch(x, y, stations_utm, chunk_size=16, **options)
+    assert batch['cutoff_dis'] == ShenStrain(0e0, 0e0, stations_utm, **options).__options__['cutoff_dis']
+    estimated = 0
+    for k in range(len(x)):
+        sstr = ShenStrain(x[k], y[k], stations_utm, **options)
+        try:
+            estim = sstr.estimate()
+        except RuntimeError:
+            assert batch['status'][k] != NODE_ESTIMATED
+            continue
+        assert batch['status'][k] == NODE_ESTIMATED
+        assert_same_estimate(batch, k, sstr, estim)
+        estimated += 1
+    assert estimated > len(x)//2
+
+def test_results_match_solver(stations_utm):
+    ##  node results (incl. skipped points) as ShenSolver.solve gives them
+    x, y = points(stations_utm, 40, 3)
+    x[:5] -= 2e6
+    batch = shen_estimate_batch(x, y, stations_utm, max_beta_angle=180e0)
+    assert (batch['status'][:5] == NODE_LIMITED_COVER).all()
+    res = node_results_batch(batch, UTM_ZONE)
+    solver = ShenSolver(stations_utm, utm_zone=UTM_ZONE, max_beta_angle=180e0)
+    for k in range(len(x)):
+        expected = numpy.array(solver.solve(x[k], y[k]), dtype=NODE_RESULT_DTYPE)
+        for c in NODE_RESULT_DTYPE.names:
+            assert numpy.allclose(res[c][k], expected[c], rtol=1e-6, atol=1e-6, equal_nan=True)
+
+def test_few_stations(stations_utm):
+    ##  three stations: exactly determined (no sigma0, VcV); two: skipped
+    sta = stations_utm[[0, 1, 2]]
+    x, y = numpy.mean(sta.lon), numpy.mean(sta.lat)
+    batch = shen_estimate_batch([x], [y], sta, weighting_function='equal_weights')
+    estim = ShenStrain(x, y, sta, weighting_function='equal_weights').estimate()
+    assert batch['status'][0] == NODE_ESTIMATED and batch['nsta'][0] == 3
+    assert numpy.array_equal(batch['parameters'][0], estim[:,0])
+    assert numpy.isnan(batch['sigma0'][0]) and numpy.isnan(batch['vcv'][0]).all()
+    batch = shen_estimate_batch([x], [y], sta[:2])
+    assert batch['status'][0] == NODE_TOO_FEW_OBS
+
+def test_singular_falls_back_to_lstsq(stations_utm):
+    ##  collinear stations; the normal equations are singular
+    sta = stations_utm[:8]
+    sta.lat[:] = sta.lat[0]
+    x, y = numpy.mean(sta.lon), sta.lat[0] + 1e3
+    batch = shen_estimate_batch([x], [y], sta, weighting_function='equal_weights')
+    estim = ShenStrain(x, y, sta, weighting_function='equal_weights').estimate()
+    assert batch['status'][0] == NODE_ESTIMATED
+    assert numpy.allclose(batch['parameters'][0], estim[:,0], rtol=1e-9, atol=1e-15)
@@ -0,0 +1,106 @@
+#-*- coding: utf-8 -*-
+
+##  The vectorized haversine_distances must match Station.haversine_distance
+##+ (point by point), both when broadcasting and pairwise; see also the dump
+##+ tests at the end.
+
+import os
+import math
+import numpy
+import pytest
+from pystrain.station import Station, StationArray, station_member_names, haversine_distances, load_station_array
+from conftest import make_stations
+
+def stations(lon, lat):
+    return [ Station(lon=x, lat=y) for x, y in zip(lon, lat) ]
+
+def random_points(n, seed):
+    rng = numpy.random.RandomState(seed)
+    return rng.uniform(-math.pi, math.pi, n), rng.uniform(-math.pi/2e0, math.pi/2e0, n)
+
+def test_broadcast():
+    lon, lat = random_points(50, 1)
+    lon0, lat0 = .4e0, .65e0
+    ref = [ s.haversine_distance(Station(lon=lon0, lat=lat0)) for s in stations(lon, lat) ]
+    dist = haversine_distances(lon, lat, lon0, lat0)
+    assert dist.shape == (50,)
+    assert numpy.allclose(dist, ref, rtol=1e-12, atol=1e-6)
+    ##  the point may as well be given first
+    assert numpy.allclose(haversine_distances(lon0, lat0, lon, lat), ref, rtol=1e-12, atol=1e-6)
+    ##  equal-sized arrays are compared element by element
+    lon2, lat2 = random_points(50, 2)
+    ref = [ s.haversine_distance(t) for s, t in zip(stations(lon, lat), stations(lon2, lat2)) ]
+    assert numpy.allclose(haversine_distances(lon, lat, lon2, lat2), ref, rtol=1e-12, atol=1e-6)
+
+def test_scalar_and_radius():
+    s, t = Station(lon=.1e0, lat=.7e0), Station(lon=.3e0, lat=.6e0)
+    assert numpy.ndim(haversine_distances(s.lon, s.lat, t.lon, t.lat)) == 0
+    assert haversine_distances(s.lon, s.lat, t.lon, t.lat, R=1e0) == pytest.approx(s.haversine_distance(t, R=1e0), rel=1e-14)
+    assert haversine_distances(s.lon, s.lat, s.lon, s.lat) == 0e0
+
+def test_pairwise():
+    lon1, lat1 = random_points(7, 3)
+    lon2, lat2 = random_points(11, 4)
+    dist = haversine_distances(lon1, lat1, lon2, lat2, pairwise=True)
+    assert dist.shape == (7, 11)
+    for i, s in enumerate(stations(lon1, lat1)):
+        for j, t in enumerate(stations(lon2, lat2)):
+            assert dist[i, j] == pytest.approx(s.haversine_distance(t), rel=1e-12, abs=1e-6)
+    ##  symmetric
+    assert numpy.allclose(dist.T, haversine_distances(lon2, lat2, lon1, lat1, pairwise=True), rtol=1e-12, atol=1e-6)
+
+def test_near_antipodal():
+    R = 6372797.560856e0
+    lon = numpy.array([.3e0, -2.1e0, 1e0, 0e0])
+    lat = numpy.array([.5e0, -1.2e0, 0e0, math.pi/2e0])
+    alon, alat = lon + math.pi, -lat
+    ##  exactly antipodal: half a great circle; the argument of arcsin may
+    ##+ round to slightly above 1, which must not give NaN
+    dist = haversine_distances(lon, lat, alon, alat)
+    assert not numpy.isnan(dist).any()
+    assert numpy.allclose(dist, math.pi*R, rtol=1e-12)
+    ##  (almost) antipodal points, where Station.haversine_distance is defined
+    for eps in (1e-3, 1e-6, 1e-8):
+        dist = haversine_distances(lon, lat, alon + eps, alat)
+        assert not numpy.isnan(dist).any() and (dist <= math.pi*R).all()
+        for d, s, t in zip(dist, stations(lon, lat), stations(alon + eps, alat)):
+            try:
+                ref = s.haversine_distance(t)
+            except ValueError:
+                ##  math domain error (argument rounded above 1)
+                ref = math.pi*R
+            assert d == pytest.approx(ref, rel=1e-9)
+
+##  StationArray.dump / load_station_array must round-trip every column
+##+ bit-for-bit, memory-mapped or not.
+
+def assert_identical(sta1, sta2):
+    assert len(sta1) == len(sta2)
+    for m in station_member_names:
+        c1, c2 = getattr(sta1, m), getattr(sta2, m)
+        assert c1.dtype == c2.dtype and c1.tobytes() == c2.tobytes()
+
+@pytest.mark.parametrize('mmap_mode', ['r', None])
+def test_dump_load_round_trip(tmp_path, mmap_mode):
+    sta = make_stations(37)
+    ##  unicode and empty names, NaN/inf/-0 and extreme values
+    sta.name = numpy.array([ u'αβγδ', u'', u'Ζάκυνθος', u's 1', u'ünï' ] + sta.name[5:].tolist())
+    sta.ve[3], sta.vn[4], sta.se[5], sta.rho[6] = numpy.nan, numpy.inf, -0e0, 5e-324
+    sta.t[7] = numpy.finfo(float).max
+    sta.dump(str(tmp_path))
+    assert sorted(os.listdir(str(tmp_path))) == ['columns.npy', 'names.npy']
+    loaded = load_station_array(str(tmp_path), mmap_mode=mmap_mode)
+    assert_identical(loaded, sta)
+    assert loaded.name.tolist() == sta.name.tolist()
+    assert [ s.name for s in loaded ][:3] == [ u'αβγδ', u'', u'Ζάκυνθος' ]
+    ##  (mapped) columns are plain, read-only numpy arrays
+    for m in station_member_names:
+        col = getattr(loaded, m)
+        assert type(col) is numpy.ndarray
+        if mmap_mode == 'r':
+            assert not col.flags.writeable
+
+def test_dump_load_empty(tmp_path):
+    sta = StationArray(lon=numpy.array([]), lat=numpy.array([]))
+    sta.dump(str(tmp_path))
+    assert_identical(load_station_array(str(tmp_path), mmap_mode=None), sta)
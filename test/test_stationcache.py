@@ -0,0 +1,73 @@
+#-*- coding: utf-8 -*-
+
+##  Stations (and UTM coordinates) from the station cache must equal the ones
+##+ parsed (projected) from the input file; any change of the input file (or
+##+ of the parsing options) must lead to a new cache entry.
+
+import os
+import numpy
+from pystrain.station import station_member_names
+from pystrain.iotools.iparser import parse_ascii_input
+from pystrain.iotools.stationcache import StationCache
+from pystrain.geodesy.utm import UTMProjection
+from pystrain.geodesy.ellipsoid import Ellipsoid
+from conftest import UTM_ZONE, write_velocity_file
+
+def assert_same(sta1, sta2):
+    assert len(sta1) == len(sta2)
+    for m in station_member_names:
+        assert numpy.array_equal(getattr(sta1, m), getattr(sta2, m))
+
+def test_miss_then_hit(tmp_path, stations):
+    filename, cache_dir = str(tmp_path / 'vel.dat'), str(tmp_path / 'cache')
+    write_velocity_file(filename, stations)
+    parsed = parse_ascii_input(filename, as_array=True)
+    cache = StationCache(cache_dir, filename)
+    assert not os.path.isdir(cache.path)
+    assert_same(cache.stations(), parsed)
+    assert os.listdir(cache_dir) == [cache.key]
+    ##  a new run (same file) reads the stored entry
+    cache = StationCache(cache_dir, filename)
+    assert os.path.isdir(cache.path)
+    assert_same(cache.stations(), parsed)
+    assert os.listdir(cache_dir) == [cache.key]
+
+def test_modified_file_is_a_miss(tmp_path, stations):
+    filename, cache_dir = str(tmp_path / 'vel.dat'), str(tmp_path / 'cache')
+    write_velocity_file(filename, stations)
+    old = StationCache(cache_dir, filename)
+    old.stations()
+    stations.ve[7] += 1e-3
+    write_velocity_file(filename, stations)
+    cache = StationCache(cache_dir, filename)
+    assert cache.key != old.key and not os.path.isdir(cache.path)
+    assert_same(cache.stations(), parse_ascii_input(filename, as_array=True))
+    assert sorted(os.listdir(cache_dir)) == sorted([old.key, cache.key])
+
+def test_options_change_key(tmp_path, stations):
+    filename = str(tmp_path / 'vel.dat')
+    write_velocity_file(filename, stations)
+    cache_dir = str(tmp_path / 'cache')
+    assert StationCache(cache_dir, filename, False).key != StationCache(cache_dir, filename, True).key
+
+def test_cached_utm(tmp_path, stations):
+    filename, cache_dir = str(tmp_path / 'vel.dat'), str(tmp_path / 'cache')
+    write_velocity_file(filename, stations)
+    proj = UTMProjection(UTM_ZONE, Ellipsoid("wgs84"))
+    cache = StationCache(cache_dir, filename)
+    sta = cache.stations()
+    N0, E0 = proj.forward(sta.lat, sta.lon)
+    ##  computed (and stored), then read from the cache
+    for _ in range(2):
+        N, E = StationCache(cache_dir, filename).utm(sta, proj)
+        assert numpy.array_equal(N, N0) and numpy.array_equal(E, E0)
+    assert len([ f for f in os.listdir(cache.path) if f.startswith('utm-') ]) == 1
+    ##  another zone is another file
+    N, E = cache.utm(sta, UTMProjection(UTM_ZONE+1, Ellipsoid("wgs84")))
+    assert not numpy.array_equal(E, E0)
+    assert len([ f for f in os.listdir(cache.path) if f.startswith('utm-') ]) == 2
+    ##  and so is another ellipsoid (same zone)
+    grs80 = UTMProjection(UTM_ZONE, Ellipsoid("grs80"))
+    assert (grs80.a, grs80.f) != (proj.a, proj.f)
+    cache.utm(sta, grs80)
+    assert len([ f for f in os.listdir(cache.path) if f.startswith('utm-') ]) == 3
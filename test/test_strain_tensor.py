@@ -0,0 +1,53 @@
+#-*- coding: utf-8 -*-
+
+##  End-to-end runs of bin/StrainTensor.py: running with a pool of worker
+##+ processes ('--workers N') must write the very same output files as a
+##+ serial run, and leave no temporary files behind.
+
+import os
+import sys
+import subprocess
+import pytest
+from conftest import write_velocity_file
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+SCRIPT = os.path.join(ROOT, 'bin', 'StrainTensor.py')
+ARGS = ['-r', '20/29/35/41', '--x-grid-step', '0.5', '--y-grid-step', '0.5', '-g']
+
+def run(cwd, tmp_dir, *args):
+    """ Run StrainTensor.py (on ../vel.dat) in the (new) directory cwd, with
+        temporary files created under tmp_dir.
+    """
+    os.mkdir(cwd)
+    env = dict(os.environ, PYTHONPATH=ROOT, TMPDIR=tmp_dir)
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([sys.executable, '-W', 'ignore', SCRIPT, '-i',
+            os.path.join(os.pardir, 'vel.dat')] + list(args), cwd=cwd, env=env,
+            stdout=devnull, stderr=devnull)
+
+def read(filename, stats=False):
+    with open(filename) as fin:
+        lines = fin.readlines()
+    ##  statistics hold the command line, the run time and the options used
+    if stats:
+        lines = [ l for l in lines if not (l.startswith('Run at') or
+            'StrainTensor.py' in l or '->' in l) ]
+    return lines
+
+@pytest.mark.parametrize('workers', ['2', '3'])
+def test_workers_match_serial(tmp_path, stations, workers):
+    write_velocity_file(str(tmp_path / 'vel.dat'), stations)
+    tmp_dir = str(tmp_path / 'tmp')
+    os.mkdir(tmp_dir)
+    serial, pool = str(tmp_path / 'serial'), str(tmp_path / 'pool')
+    run(serial, tmp_dir, *ARGS)
+    run(pool, tmp_dir, *(ARGS + ['--workers', workers]))
+    assert sorted(os.listdir(pool)) == sorted(os.listdir(serial)) == \
+        ['station_info.dat', 'strain_info.dat', 'strain_stats.dat']
+    assert len(read(os.path.join(serial, 'strain_info.dat'))) > 100
+    for f in ('station_info.dat', 'strain_info.dat'):
+        assert read(os.path.join(pool, f)) == read(os.path.join(serial, f))
+    f = 'strain_stats.dat'
+    assert read(os.path.join(pool, f), True) == read(os.path.join(serial, f), True)
+    ##  the (memory-mapped) station and result files are removed
+    assert os.listdir(tmp_dir) == []
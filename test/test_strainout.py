@@ -0,0 +1,79 @@
+#-*- coding: utf-8 -*-
+
+##  The npz strain output must hold exactly the results of the text output;
+##+ converted back to text (strain_npz2txt), the files are identical.
+
+import io
+import os
+import numpy
+import pytest
+from pystrain.strain import NODE_RESULT_DTYPE, NODE_ESTIMATED, NODE_LIMITED_COVER, \
+    NODE_TOO_FEW_OBS, STRAIN_DETAILS_COLUMNS
+from pystrain.iotools.strainout import StrainResultsWriter, read_strain_npz, \
+    strain_npz2txt, write_strain_header, STRAIN_NPZ_COLUMNS, STRAIN_NPZ_UNITS
+
+def results(n=500, seed=5):
+    """ n (random) results; some are not estimated, some lack sigmas. """
+    rng = numpy.random.RandomState(seed)
+    res = numpy.zeros(n, dtype=NODE_RESULT_DTYPE)
+    res['status'] = rng.choice([NODE_ESTIMATED]*4 + [NODE_LIMITED_COVER, NODE_TOO_FEW_OBS], n)
+    res['nsta'] = rng.randint(3, 50, n)
+    for c in ['d_coef', 'cutoff_dis', 'sigma0'] + STRAIN_DETAILS_COLUMNS:
+        res[c] = rng.normal(0e0, 100e0, n)
+    res['dvx'][::7] = numpy.nan
+    res['dsec_inv'][::11] = numpy.nan
+    return res
+
+def write(filename, output_format, res, novar='-'):
+    """ Write res, partly one at a time and partly as arrays. """
+    fout = StrainResultsWriter(filename, output_format)
+    for r in res[:37].tolist():
+        fout.write(r, novar)
+    fout.write_array(res[37:300], novar)
+    for r in res[300:320].tolist():
+        fout.write(r, novar)
+    fout.write_array(res[320:], novar)
+    fout.close()
+
+@pytest.mark.parametrize('novar', ['-', '{:7s}'.format('-')])
+def test_npz_to_text_round_trip(tmp_path, novar):
+    res = results()
+    txt, npz, txt2 = [ str(tmp_path / f) for f in ['a.dat', 'a.npz', 'b.dat'] ]
+    write(txt, 'text', res, novar)
+    write(npz, 'npz', res)
+    assert strain_npz2txt(npz, txt2, novar) == (res['status'] == NODE_ESTIMATED).sum()
+    with open(txt) as f1, open(txt2) as f2:
+        assert f1.read() == f2.read()
+
+def test_npz_columns(tmp_path, monkeypatch):
+    res = results()
+    npz = str(tmp_path / 'a.npz')
+    ##  few rows per flush, to go through the row buffer
+    monkeypatch.setattr(StrainResultsWriter, 'ROWS_BUFFERED', 16)
+    write(npz, 'npz', res)
+    data = read_strain_npz(npz)
+    est = res[res['status'] == NODE_ESTIMATED]
+    assert list(data.dtype.names) == STRAIN_NPZ_COLUMNS
+    for c in STRAIN_NPZ_COLUMNS:
+        assert numpy.array_equal(data[c], est[c].astype(float), equal_nan=True)
+    ##  the (temporary) column files are removed
+    assert os.listdir(str(tmp_path)) == ['a.npz']
+
+def test_empty_npz(tmp_path):
+    npz = str(tmp_path / 'a.npz')
+    fout = StrainResultsWriter(npz, 'npz')
+    fout.write_array(results()[:0])
+    fout.close()
+    assert len(read_strain_npz(npz)) == 0
+    assert strain_npz2txt(npz, str(tmp_path / 'a.dat')) == 0
+
+def test_units_match_text_header():
+    buf = io.StringIO()
+    write_strain_header(buf)
+    units = buf.getvalue().splitlines()[1].split()
+    ##  one unit per value (and its std. deviation) in the text header
+    expected = units[:2] + [ u for u in units[2:] for _ in range(2) ]
+    assert STRAIN_NPZ_UNITS[:len(STRAIN_DETAILS_COLUMNS)] == expected
+    assert len(STRAIN_NPZ_UNITS) == len(STRAIN_NPZ_COLUMNS)
+    ##  the cut-off distance is a coefficient (see the statistics output)
+    assert STRAIN_NPZ_UNITS[STRAIN_NPZ_COLUMNS.index('cutoff_dis')] == '#'
@@ -0,0 +1,103 @@
+#-*- coding: utf-8 -*-
+
+##  The vectorized veis (Delaunay) estimation against one ShenStrain per
+##+ triangle, set at the triangle's barycentre (as StrainTensor.py did), and
+##+ reuse of cached triangles (match_simplices, the veis cache file).
+
+import os
+import numpy
+import pytest
+from scipy.spatial import Delaunay
+from pystrain.strain import ShenStrain, veis_estimate_batch, node_results_batch, \
+    match_simplices, NODE_RESULT_DTYPE
+from pystrain.iotools.strainout import write_veis_cache, read_veis_cache
+from conftest import UTM_ZONE
+
+def shen_estimate(sta):
+    cx, cy = sum(sta.lon.tolist())/3e0, sum(sta.lat.tolist())/3e0
+    sstr = ShenStrain(cx, cy, sta, weighting_function='equal_weights')
+    return cx, cy, sstr.estimate()[:,0]
+
+def triangles(stations_utm):
+    return Delaunay(numpy.column_stack((stations_utm.lon, stations_utm.lat))).simplices
+
+def test_batch_matches_shenstrain(stations_utm):
+    simplices = triangles(stations_utm)
+    batch = veis_estimate_batch(stations_utm, simplices)
+    for k, simplex in enumerate(simplices):
+        cx, cy, estim = shen_estimate(stations_utm[simplex])
+        assert abs(batch['x'][k] - cx) < 1e-6 and abs(batch['y'][k] - cy) < 1e-6
+        assert numpy.allclose(batch['parameters'][k], estim, rtol=1e-7, atol=1e-15)
+
+def test_degenerate_triangle(stations_utm):
+    ##  (exactly) collinear stations; solved via lstsq, as ShenStrain does
+    sta = stations_utm[[0, 1, 2]]
+    sta.lat[:] = sta.lat[0]
+    batch = veis_estimate_batch(sta, numpy.array([[0, 1, 2]]))
+    assert numpy.isfinite(batch['parameters']).all()
+    assert numpy.allclose(batch['parameters'][0], shen_estimate(sta)[2], rtol=1e-7, atol=1e-15)
+
+def points(sta):
+    """ Values identifying the stations, as in StrainTensor.py. """
+    return numpy.column_stack((sta.lon, sta.lat, sta.ve, sta.vn))
+
+def veis_results(sta, simplices):
+    return node_results_batch(veis_estimate_batch(sta, simplices), UTM_ZONE)
+
+def test_match_same_triangulation(stations_utm):
+    simplices = triangles(stations_utm)
+    pts = points(stations_utm)
+    assert numpy.array_equal(match_simplices(pts, simplices, pts, simplices), numpy.arange(len(simplices)))
+
+def test_match_reordered_points(stations_utm):
+    simplices = triangles(stations_utm)
+    perm = numpy.random.RandomState(7).permutation(len(stations_utm))
+    ##  the same triangles, in terms of the re-ordered points
+    new_of_old = numpy.argsort(perm)
+    new_simplices = new_of_old[simplices][::-1]
+    idx = match_simplices(points(stations_utm), simplices, points(stations_utm[perm]), new_simplices)
+    assert numpy.array_equal(idx, numpy.arange(len(simplices))[::-1])
+
+def test_match_changed_and_removed_points(stations_utm):
+    old_simplices = triangles(stations_utm)
+    old = veis_results(stations_utm, old_simplices)
+    ##  station 5 moves (velocity), station 9 is removed
+    sta = stations_utm[numpy.arange(len(stations_utm)) != 9]
+    sta.ve[5] += 1e-3
+    simplices = triangles(sta)
+    idx = match_simplices(points(stations_utm), old_simplices, points(sta), simplices)
+    assert (idx >= 0).any() and (idx < 0).any()
+    assert (idx[(simplices == 5).any(axis=1)] == -1).all()
+    assert not numpy.isin(old_simplices[idx[idx >= 0]], [5, 9]).any()
+    ##  reused results are the ones a fresh estimation gives
+    fresh = veis_results(sta, simplices)
+    reused = old[idx[idx >= 0]]
+    for c in NODE_RESULT_DTYPE.names:
+        assert numpy.array_equal(reused[c], fresh[c][idx >= 0], equal_nan=True)
+
+def test_cache_file_name(tmp_path, stations_utm):
+    ##  no '.npz' suffix is added; a later run finds the file by its name
+    filename = str(tmp_path / 'mycache')
+    simplices = triangles(stations_utm)
+    results = veis_results(stations_utm, simplices)
+    write_veis_cache(filename, points(stations_utm), simplices, results, UTM_ZONE)
+    assert os.listdir(str(tmp_path)) == ['mycache']
+    cache = read_veis_cache(filename)
+    assert cache['utm_zone'] == UTM_ZONE
+    assert numpy.array_equal(cache['simplices'], simplices)
+    assert numpy.array_equal(cache['stations'], points(stations_utm))
+    assert cache['results'].tobytes() == results.tobytes()
+
+def test_cache_write_is_atomic(tmp_path, stations_utm):
+    filename = str(tmp_path / 'cache.npz')
+    simplices = triangles(stations_utm)
+    results = veis_results(stations_utm, simplices)
+    write_veis_cache(filename, points(stations_utm), simplices, results, UTM_ZONE)
+    with open(filename, 'rb') as fin:
+        before = fin.read()
+    ##  a failed write leaves the previous cache (and nothing else) behind
+    with pytest.raises(ValueError):
+        write_veis_cache(filename, [['not', 'a', 'number']], simplices, results, UTM_ZONE)
+    assert os.listdir(str(tmp_path)) == ['cache.npz']
+    with open(filename, 'rb') as fin:
+        assert fin.read() == before